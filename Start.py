@@ -2,12 +2,13 @@ import streamlit as st
 import pandas as pd
 from utils.data_manager import DataManager
 from utils.login_manager import LoginManager
+from utils.assets import show_logo
 
 
 # Titel der App
 st.set_page_config(page_title="Blood Cell Data & Reference Values", layout="wide")
 
-st.sidebar.image("images/logo.png", use_container_width=True)
+show_logo()
 
 # Initialize the data manager
 data_manager = DataManager(fs_protocol='webdav', fs_root_folder="WBC_Data")  # switch drive
@@ -16,10 +17,14 @@ data_manager = DataManager(fs_protocol='webdav', fs_root_folder="WBC_Data")  # s
 login_manager = LoginManager(data_manager)
 login_manager.login_register()
 
-data_manager.load_user_data(
+data_manager.load_user_records(
     session_state_key='data_df', 
     file_name='data.csv', 
     initial_value=pd.DataFrame(),
+    snapshot_format='parquet',
+    partition_by='patient_id',
+    order_by='timestamp',
+    statistics_file='data_statistics.json',
     parse_dates=['timestamp']
 )
 
@@ -1,17 +1,17 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
 import datetime
 from utils.data_manager import DataManager
 from utils.login_manager import LoginManager
-from PIL import Image
+from utils.assets import show_logo
+from utils.keyboard_counter import keyboard_counter
+from utils.cell_counter import CellCounter
 
 # Seitenkonfiguration 
 st.set_page_config(page_title="Weisses Blutbild", layout="wide")
 
 # Sidebar Logo
-st.sidebar.image("images/logo.png", use_container_width=True)
+show_logo()
 
 # --- Zugriffsschutz ---
 data_manager = DataManager(fs_protocol="webdav", fs_root_folder="WBC_Data")
@@ -34,17 +34,17 @@ if "data_df" not in st.session_state:
     )
 
 # --- Session-State-Initialisierung ---
-st.session_state.setdefault("counts", {
-    "Segmentkernige Neutrophile": 0,
-    "Stabkernige Neutrophile": 0,
-    "Eosinophile": 0,
-    "Basophile": 0,
-    "Monozyten": 0,
-    "Lymphozyten": 0,
-    "Plasmazellen": 0,
-    "Vorstufen": 0
-})
-st.session_state.setdefault("action_history", [])
+if "counts" not in st.session_state:
+    st.session_state["counts"] = CellCounter([
+        "Segmentkernige Neutrophile",
+        "Stabkernige Neutrophile",
+        "Eosinophile",
+        "Basophile",
+        "Monozyten",
+        "Lymphozyten",
+        "Plasmazellen",
+        "Vorstufen"
+    ])
 st.session_state.setdefault("previous_total_cells", 0)
 st.session_state.setdefault("toast_shown_100", False)  # Toast für 100 Zellen
 st.session_state.setdefault("toast_shown_200", False)  # Toast für 200 Zellen
@@ -59,14 +59,37 @@ def reset_patient_data():
 
 def reset_cell_counts():
     """Setzt die Zellzählung zurück."""
-    for cell in st.session_state["counts"]:
-        st.session_state["counts"][cell] = 0
-    st.session_state["action_history"].clear()
+    st.session_state["counts"].reset()
     st.session_state["previous_total_cells"] = 0
     st.session_state["toast_shown_100"] = False
     st.session_state["toast_shown_200"] = False
     st.success("Alle Zählungen wurden zurückgesetzt.")
-    st.rerun()
+    st.rerun(scope="fragment")
+
+def cell_distribution_chart(cell_types, cell_counts, colors):
+    """Vega-Lite-Spezifikation des Balkendiagramms der Zellverteilung, wird im Browser gezeichnet."""
+    max_count = max(cell_counts, default=0)
+    return {
+        "title": "Verteilung der Blutzellen",
+        "height": 400,
+        "encoding": {
+            "x": {"field": "Zelltyp", "type": "nominal", "sort": list(cell_types), "title": "Blutzelltypen",
+                  "axis": {"labelAngle": -30}},
+            "y": {"field": "Anzahl", "type": "quantitative", "title": "Anzahl der Zellen",
+                  "scale": {"domain": [0, max(max_count * 1.2, 5)]}},
+        },
+        "layer": [
+            {"mark": {"type": "bar", "stroke": "black", "opacity": 0.8},
+             "encoding": {"color": {"field": "Zelltyp", "type": "nominal", "legend": None,
+                                    "scale": {"domain": list(cell_types), "range": list(colors)}}}},
+            {"mark": {"type": "text", "baseline": "bottom", "dy": -5, "fontSize": 11},
+             "encoding": {"text": {"field": "Anzahl", "type": "quantitative"}}},
+        ],
+    }
+
+def count_cell(cell):
+    """Zählt eine Zelle des angegebenen Typs."""
+    st.session_state["counts"].increment(cell)
 
 # --- Patientendaten ---
 st.subheader("Patientendaten 📋")
@@ -95,91 +118,86 @@ if st.button("Patientendaten zurücksetzen", use_container_width=True):
 st.markdown("---")
 st.subheader("Zellen zählen 🔬")
 
-total_cells = sum(st.session_state["counts"].values())
-previous_total = st.session_state["previous_total_cells"]
-st.session_state["previous_total_cells"] = total_cells
-
-st.info(f"**Gesamtanzahl der gezählten Zellen:** {total_cells}")
-
-# --- Hinweise bei 100 und 200 Zellen als Toast ---
-if total_cells >= 100 and not st.session_state["toast_shown_100"]:
-    st.toast("Es wurden 100 Zellen gezählt!", icon="🔔")
-    st.session_state["toast_shown_100"] = True
-
-if total_cells >= 200 and not st.session_state["toast_shown_200"]:
-    st.toast("Es wurden 200 Zellen gezählt!", icon="🔔")
-    st.session_state["toast_shown_200"] = True
-
-# Rücksetzen der Toast-Flags bei Undo
-if total_cells < 100:
-    st.session_state["toast_shown_100"] = False
-if total_cells < 200:
-    st.session_state["toast_shown_200"] = False
-
-# --- Zelltypen-Buttons ---
-wbc_types = list(st.session_state["counts"].keys())
-button_colors = ["#1f77b4", "#1f77b4", "#d62728", "#9467bd", "#2ca02c", "#ff7f0e", "#8c564b", "#e377c2"]
-
-clicked_cell = None
-for i in range(0, len(wbc_types), 3):
-    cols = st.columns(3)
-    for idx, cell in enumerate(wbc_types[i:i+3]):
-        with cols[idx]:
-            if st.button(f"➕ {cell} ({st.session_state['counts'][cell]})", key=f"btn_{cell}", use_container_width=True):
-                clicked_cell = cell
-
-if clicked_cell:
-    st.session_state["counts"][clicked_cell] += 1
-    st.session_state["action_history"].append(clicked_cell)
-    st.rerun()
-
-# --- Steuerung: Undo und Reset ---
-st.markdown("---")
-st.subheader("Steuerung")
-
-col_undo, col_reset = st.columns(2, gap="small")
-
-with col_undo:
-    if st.button("Rückgängig", key="undo_button", use_container_width=True):
-        if st.session_state["action_history"]:
-            last_cell = st.session_state["action_history"].pop()
-            if st.session_state["counts"][last_cell] > 0:
-                st.session_state["counts"][last_cell] -= 1
+# Zähler, Steuerung und Diagramm als Fragment: ein Klick führt nur diesen Teil der Seite erneut aus
+@st.fragment
+def cell_counter():
+    # Zählen per Tastatur im Browser, die Zählungen werden gesammelt übertragen
+    st.caption("⌨️ Tastatur-Zählung: Tasten 1–8 entsprechen den Zelltypen in der Reihenfolge der Buttons.")
+    keyboard_counter(st.session_state["counts"], key="keyboard_counter")
+
+    total_cells = sum(st.session_state["counts"].values())
+    previous_total = st.session_state["previous_total_cells"]
+    st.session_state["previous_total_cells"] = total_cells
+
+    st.info(f"**Gesamtanzahl der gezählten Zellen:** {total_cells}")
+    throughput = st.session_state["counts"].throughput()
+    if throughput:
+        st.caption(f"⏱️ Zähltempo der letzten Zellen: {throughput:.0f} Zellen/min")
+
+    # --- Hinweise bei 100 und 200 Zellen als Toast ---
+    if total_cells >= 100 and not st.session_state["toast_shown_100"]:
+        st.toast("Es wurden 100 Zellen gezählt!", icon="🔔")
+        st.session_state["toast_shown_100"] = True
+
+    if total_cells >= 200 and not st.session_state["toast_shown_200"]:
+        st.toast("Es wurden 200 Zellen gezählt!", icon="🔔")
+        st.session_state["toast_shown_200"] = True
+
+    # Rücksetzen der Toast-Flags bei Undo
+    if total_cells < 100:
+        st.session_state["toast_shown_100"] = False
+    if total_cells < 200:
+        st.session_state["toast_shown_200"] = False
+
+    # --- Zelltypen-Buttons ---
+    wbc_types = list(st.session_state["counts"].keys())
+    button_colors = ["#1f77b4", "#1f77b4", "#d62728", "#9467bd", "#2ca02c", "#ff7f0e", "#8c564b", "#e377c2"]
+
+    # Zählen im Callback, damit der Klick ohne zusätzlichen Rerun angezeigt wird
+    for i in range(0, len(wbc_types), 3):
+        cols = st.columns(3)
+        for idx, cell in enumerate(wbc_types[i:i+3]):
+            with cols[idx]:
+                st.button(f"➕ {cell} ({st.session_state['counts'][cell]})", key=f"btn_{cell}", use_container_width=True,
+                          on_click=count_cell, args=(cell,))
+
+    # --- Steuerung: Undo und Reset ---
+    st.markdown("---")
+    st.subheader("Steuerung")
+
+    col_undo, col_redo, col_reset = st.columns(3, gap="small")
+
+    with col_undo:
+        if st.button("Rückgängig", key="undo_button", use_container_width=True):
+            last_cell = st.session_state["counts"].undo()
+            if last_cell:
                 st.success(f"Letzte Aktion rückgängig gemacht: {last_cell}")
+                st.rerun(scope="fragment")
             else:
-                st.warning(f"{last_cell} ist bereits 0.")
-            st.rerun()
-        else:
-            st.info("Keine Aktion vorhanden zum Rückgängigmachen.")
+                st.info("Keine Aktion vorhanden zum Rückgängigmachen.")
 
-with col_reset:
-    if st.button("Zellzählung zurücksetzen", key="reset_button", use_container_width=True):
-        reset_cell_counts()
-
-# --- Zellverteilung Diagramm ---
-st.markdown("---")
-st.subheader("Zellverteilung 📊")
-
-fig, ax = plt.subplots(figsize=(12, 6))
-cell_counts = [st.session_state["counts"][cell] for cell in wbc_types]
+    with col_redo:
+        if st.button("Wiederholen", key="redo_button", use_container_width=True):
+            redone_cell = st.session_state["counts"].redo()
+            if redone_cell:
+                st.rerun(scope="fragment")
+            else:
+                st.info("Keine Aktion vorhanden zum Wiederholen.")
 
-bars = ax.bar(wbc_types, cell_counts, color=button_colors, edgecolor='black', alpha=0.8)
-ax.set_ylabel("Anzahl der Zellen")
-ax.set_xlabel("Blutzelltypen")
-ax.set_title("Verteilung der Blutzellen")
-ax.set_xticks(np.arange(len(wbc_types)))
-ax.set_xticklabels(wbc_types, rotation=30, ha="right")
+    with col_reset:
+        if st.button("Zellzählung zurücksetzen", key="reset_button", use_container_width=True):
+            reset_cell_counts()
 
-if cell_counts:
-    max_count = max(cell_counts)
-    ax.set_ylim(0, max(max_count * 1.2, 5))
+    # --- Zellverteilung Diagramm ---
+    st.markdown("---")
+    st.subheader("Zellverteilung 📊")
 
-for bar in bars:
-    height = bar.get_height()
-    ax.annotate(f'{int(height)}', xy=(bar.get_x() + bar.get_width() / 2, height),
-                xytext=(0, 5), textcoords="offset points", ha='center', va='bottom', fontsize=9)
+    # native Vega-Lite-Grafik: pro Klick werden nur die Zählwerte übertragen, kein Bild gerendert
+    cell_counts = [st.session_state["counts"][cell] for cell in wbc_types]
+    st.vega_lite_chart(pd.DataFrame({"Zelltyp": wbc_types, "Anzahl": cell_counts}),
+                       cell_distribution_chart(wbc_types, cell_counts, button_colors), use_container_width=True)
 
-st.pyplot(fig)
+cell_counter()
 
 # --- Navigation ---
 st.markdown("---")
@@ -1,15 +1,14 @@
 import streamlit as st
-import pandas as pd
 import datetime
 from utils.data_manager import DataManager
 from utils.login_manager import LoginManager
-from PIL import Image
+from utils.assets import show_logo
 
 # App Setup
 st.set_page_config(page_title="Morphologische Beurteilung", layout="wide")
 
 # Sidebar Logo 
-st.sidebar.image("images/logo.png", use_container_width=True)
+show_logo()
 
 # --- DataManager und LoginManager initialisieren ---
 data_manager = DataManager()
@@ -92,26 +91,11 @@ special_behaviors = ["Erythroblasten", "Geldrollenbildung"]
 
 morphological_changes = form_changes + color_changes + inclusions + special_behaviors
 
-results = {}
-
 st.markdown("---")
 st.subheader("Morphologische Auffälligkeiten 🔬")
 
 st.markdown("Bitte bewerten Sie die morphologischen Veränderungen:")
 
-for change in morphological_changes:
-    with st.container():
-        col1, col2 = st.columns([2, 5])
-        with col1:
-            st.markdown(f"**{change}:**")
-        with col2:
-            results[change] = st.select_slider(
-                label="",
-                options=["Keine", "Leicht", "Mittel", "Stark"],
-                value="Keine",
-                key=change
-            )
-
 # Farbliche Darstellung je nach Schweregrad
 def style_severity(severity):
     if severity == "Stark":
@@ -123,17 +107,42 @@ def style_severity(severity):
     else:
         return ":gray[Keine]"
 
+# Ergebnisse im Session State, in der Reihenfolge der Parameter
+st.session_state['morphology_results'] = {change: st.session_state.get(change, "Keine") for change in morphological_changes}
+
+# Jeder Schieberegler ist ein eigenes Fragment: eine Änderung führt nur diesen Parameter erneut aus
+@st.fragment
+def morphology_parameter(change):
+    col1, col2, col3 = st.columns([2, 4, 1])
+    with col1:
+        st.markdown(f"**{change}:**")
+    with col2:
+        severity = st.select_slider(
+            label=change,
+            label_visibility="collapsed",
+            options=["Keine", "Leicht", "Mittel", "Stark"],
+            value="Keine",
+            key=change
+        )
+    with col3:
+        st.markdown(style_severity(severity))
+
+    # Ergebnisse nur intern im Session State speichern
+    st.session_state['morphology_results'] = {**st.session_state['morphology_results'], change: severity}
+
+for change in morphological_changes:
+    morphology_parameter(change)
+
 # --- Zusammenfassung der morphologischen Beurteilung ---
-auffaelligkeiten = {param: severity for param, severity in results.items() if severity != "Keine"}
+# liest die Ergebnisse aus dem Session State; der Schweregrad steht sofort neben jedem Schieberegler,
+# die Zusammenfassung wird bei der nächsten Ausführung der ganzen Seite aktualisiert
+auffaelligkeiten = {param: severity for param, severity in st.session_state['morphology_results'].items() if severity != "Keine"}
 
 if auffaelligkeiten:
     st.markdown("---")
     st.subheader("Zusammenfassung der morphologischen Beurteilung")
     for param, severity in auffaelligkeiten.items():
         st.markdown(f"**{param}**: {style_severity(severity)}")
-
-# Ergebnisse nur intern im Session State speichern
-st.session_state['morphology_results'] = results
    
 
 # Navigation 
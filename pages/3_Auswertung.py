@@ -1,20 +1,20 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
 import datetime
-import io
 import re
-from fpdf import FPDF
 from utils.data_manager import DataManager
 from utils.login_manager import LoginManager
-from PIL import Image
+from utils.assets import show_logo
+from utils.report import build_report
+from utils.cell_counter import CellCounter
+from utils.reference_ranges import CELL_TYPES, evaluate_records, reference_ranges
 
 # Seitenkonfiguration
 st.set_page_config(page_title="Datenübersicht", layout="wide")
 
 # Siedebar Logo 
-st.sidebar.image("images/logo.png", use_container_width=True)
+show_logo()
 
 # Zugriffsschutz
 LoginManager().go_to_login('Start.py')
@@ -24,6 +24,8 @@ st.title("Datenübersicht")
 
 # DataManager initialisieren
 data_manager = DataManager()
+data_manager.show_write_status()
+data_manager.refresh_user_records("data_df")
 
 # Daten beim Start laden
 if "data_df" not in st.session_state:
@@ -50,99 +52,24 @@ else:
     age = None
 
 # Zellzählung vorbereiten
-wbc_types = [
-    "Segmentkernige Neutrophile",
-    "Stabkernige Neutrophile",
-    "Eosinophile",
-    "Basophile",
-    "Monozyten",
-    "Lymphozyten",
-    "Plasmazellen",
-    "Vorstufen"
-]
+wbc_types = list(CELL_TYPES)
 
-def get_reference_values(age, gender):
-    if age is None:
-        return {
-            "Segmentkernige Neutrophile": (40, 75),
-            "Stabkernige Neutrophile": (3, 6),
-            "Eosinophile": (1, 6),
-            "Basophile": (0, 1),
-            "Monozyten": (2, 10),
-            "Lymphozyten": (15, 45),
-            "Plasmazellen": (0, 2),
-            "Vorstufen": (0, 1)
-        }
-    elif age < 1:
-        return {
-            "Segmentkernige Neutrophile": (35, 65),
-            "Stabkernige Neutrophile": (5, 15),
-            "Eosinophile": (2, 8),
-            "Basophile": (0, 1),
-            "Monozyten": (5, 12),
-            "Lymphozyten": (20, 50),
-            "Plasmazellen": (0, 2),
-            "Vorstufen": (0, 2)
-        }
-    elif age < 5:
-        return {
-            "Segmentkernige Neutrophile": (30, 60),
-            "Stabkernige Neutrophile": (3, 8),
-            "Eosinophile": (1, 6),
-            "Basophile": (0, 1),
-            "Monozyten": (2, 10),
-            "Lymphozyten": (30, 55),
-            "Plasmazellen": (0, 2),
-            "Vorstufen": (0, 1)
-        }
-    elif age < 12:
-        return {
-            "Segmentkernige Neutrophile": (40, 65),
-            "Stabkernige Neutrophile": (2, 6),
-            "Eosinophile": (1, 5),
-            "Basophile": (0, 1),
-            "Monozyten": (2, 8),
-            "Lymphozyten": (25, 45),
-            "Plasmazellen": (0, 2),
-            "Vorstufen": (0, 1)
-        }
-    else:
-        return {
-            "Segmentkernige Neutrophile": (40, 75),
-            "Stabkernige Neutrophile": (3, 6),
-            "Eosinophile": (1, 6),
-            "Basophile": (0, 1),
-            "Monozyten": (2, 10),
-            "Lymphozyten": (15, 45),
-            "Plasmazellen": (0, 2),
-            "Vorstufen": (0, 1)
-        }
-
-reference_values = get_reference_values(age, gender)
+reference_values = reference_ranges(age, gender)
 
 if 'counts' not in st.session_state:
-    st.session_state['counts'] = {cell: 0 for cell in wbc_types}
-
-def calculate_percentages():
-    total = sum(st.session_state['counts'].values())
-    if total == 0:
-        return {cell: 0 for cell in wbc_types}
-    return {cell: round((count / total) * 100, 1) for cell, count in st.session_state['counts'].items()}
+    st.session_state['counts'] = CellCounter(wbc_types)
 
 def format_data():
-    data = []
-    percentages = calculate_percentages()
-    for cell, (low, high) in reference_values.items():
-        count = st.session_state['counts'].get(cell, 0)
-        percent = percentages.get(cell, 0)
-        if percent < low:
-            status = "⬇️"
-        elif percent > high:
-            status = "⬆️"
-        else:
-            status = ""
-        data.append([cell, count, f"{percent}%", f"{low}-{high}%", status])
-    return pd.DataFrame(data, columns=["Zelltyp", "Gezählte Zellen", "Gezählte %", "Referenzwerte (%)", "Status"])
+    # gleiche Auswertung wie für die gespeicherten Ergebnisse, hier für eine einzelne Probe
+    evaluation = evaluate_records(pd.DataFrame([{"counts": dict(st.session_state['counts']), "age": age, "gender": gender}]))
+    flags = evaluation["flags"][0]
+    return pd.DataFrame({
+        "Zelltyp": wbc_types,
+        "Gezählte Zellen": evaluation["counts"][0].astype(int),
+        "Gezählte %": [f"{percent}%" for percent in evaluation["percentages"][0]],
+        "Referenzwerte (%)": [f"{low}-{high}%" for low, high in reference_values.values()],
+        "Status": np.select([flags < 0, flags > 0], ["⬇️", "⬆️"], ""),
+    })
 
 # Zellzählung Anzeige
 st.subheader("Übersicht Zellzählungen")
@@ -170,6 +97,24 @@ if sum(st.session_state['counts'].values()) > 0:
 else:
     st.info("Noch keine Zellzählungen vorhanden.")
 
+# Frühere Ergebnisse des Patienten, Anzahl aus dem Manifest der Partitionen
+partitions = data_manager.get_record_partitions("data_df")
+if partitions is None and isinstance(st.session_state.get("data_df"), pd.DataFrame):
+    partitions = data_manager.get_record_index("data_df", "patient_id").counts()
+previous_count = (partitions or {}).get(patient_id, 0) if patient_id else 0
+if previous_count:
+    st.caption(f"Für die Patienten-ID {patient_id} sind bereits {previous_count} Ergebnisse gespeichert.")
+    # die Partition des Patienten wird erst geladen, wenn die Ergebnisse angezeigt werden
+    if st.toggle("Frühere Ergebnisse anzeigen", key="show_previous_results"):
+        data_manager.load_record_partitions("data_df", [patient_id])
+        positions = data_manager.get_record_index("data_df", "patient_id").positions(patient_id)
+        previous_df = st.session_state["data_df"].iloc[positions]
+        previous_evaluation = data_manager.get_evaluation_index("data_df").take(positions)
+        previous_table = pd.DataFrame(previous_evaluation["percentages"], columns=[f"{cell} (%)" for cell in wbc_types])
+        previous_table.insert(0, "Datum", pd.to_datetime(previous_df["timestamp"], errors="coerce").dt.strftime("%d.%m.%Y %H:%M").to_numpy()
+                              if "timestamp" in previous_df.columns else "")
+        st.dataframe(previous_table, hide_index=True, use_container_width=True)
+
 # Morphologische Beurteilung
 st.markdown("---")
 st.subheader("Übersicht Morphologische Beurteilung")
@@ -200,44 +145,17 @@ comment = st.text_area(
     placeholder="Hier Kommentar eingeben..."
 )
 
-# PDF-Erstellung vorbereiten
-pdf = FPDF()
-pdf.add_page()
-pdf.set_font("Arial", "B", 10)
-pdf.cell(0, 8, "Ergebnisse der Zellzählung", ln=True, align="C")
-pdf.ln(4)
-pdf.set_font("Arial", "", 8)
-pdf.multi_cell(0, 6, f"Patienten-ID: {patient_id} | Geschlecht: {gender} | Geburtsdatum: {birth_date_str} | Alter: {age} Jahre")
-pdf.cell(0, 6, f"Zeitpunkt: {datetime.datetime.now().strftime('%d.%m.%Y %H:%M:%S')}", ln=True)
-pdf.ln(2)
-pdf.set_font("Arial", "B", 8)
-pdf.cell(60, 6, "Zelltyp", border=1)
-pdf.cell(30, 6, "Anzahl", border=1)
-pdf.cell(30, 6, "Referenz", border=1, ln=True)
-pdf.set_font("Arial", "", 8)
-for cell, (low, high) in reference_values.items():
-    count = st.session_state['counts'].get(cell, 0)
-    ref = f"{low}-{high}%"
-    pdf.cell(60, 6, cell, border=1)
-    pdf.cell(30, 6, str(count), border=1)
-    pdf.cell(30, 6, ref, border=1, ln=True)
-pdf.ln(3)
-pdf.set_font("Arial", "B", 8)
-pdf.cell(0, 6, "Morphologische Beurteilung:", ln=True)
-pdf.ln(2)
-pdf.cell(60, 6, "Parameter", border=1)
-pdf.cell(30, 6, "Schweregrad", border=1, ln=True)
-pdf.set_font("Arial", "", 8)
-for param, severity in morpho_results.items():
-    pdf.cell(60, 6, param, border=1)
-    pdf.cell(30, 6, severity, border=1, ln=True)
-pdf.ln(3)
-pdf.set_font("Arial", "B", 8)
-pdf.cell(0, 6, "Kommentar:", ln=True)
-pdf.set_font("Arial", "", 8)
-pdf.multi_cell(0, 6, comment)
-
-pdf_bytes = pdf.output(dest='S').encode('latin-1', 'replace')
+# PDF-Erstellung vorbereiten, unveränderte Berichte kommen aus dem Cache
+pdf_bytes = build_report({
+    "patient_id": patient_id,
+    "gender": gender,
+    "birth_date": birth_date_str,
+    "age": age,
+    "timestamp": pd.Timestamp.now().floor("min"),
+    "counts": dict(st.session_state['counts']),
+    "morphology_results": morpho_results,
+    "comment": comment
+}, reference_values)
 timestamp_str = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
 safe_patient_id = re.sub(r'[^a-zA-Z0-9_-]', '_', patient_id or 'unbekannt')
 filename = f"Zellzählung_{safe_patient_id}_{timestamp_str}.pdf"
@@ -253,7 +171,7 @@ with col1:
             "gender": gender,
             "birth_date": birth_date_str,
             "age": age if age is not None else "Nicht angegeben",
-            "counts": st.session_state['counts'],
+            "counts": dict(st.session_state['counts']),
             "morphology_results": morpho_results,
             "comment": comment,
             "timestamp": datetime.datetime.now()
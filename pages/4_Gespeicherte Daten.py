@@ -1,18 +1,24 @@
 import streamlit as st
 import pandas as pd
-from fpdf import FPDF
+import numpy as np
 from utils.data_manager import DataManager
 from utils.login_manager import LoginManager
+from utils.assets import show_logo
+from utils.reference_ranges import CELL_TYPES, summarize
+from utils.lazy_import import lazy_import
 import datetime
 import ast
 import re
-from PIL import Image
+import tempfile
+
+# fpdf wird erst geladen, wenn ein Bericht erstellt wird
+report = lazy_import("utils.report")
 
 # Seitenkonfiguration
 st.set_page_config(page_title="Gespeicherte Ergebnisse", layout="wide")
 
 # Sidebar Logo
-st.sidebar.image("images/logo.png", use_container_width=True)
+show_logo()
 
 # Zugriffsschutz
 LoginManager().go_to_login('Start.py')
@@ -22,6 +28,8 @@ st.title("Übersicht der gespeicherten Ergebnisse")
 
 # DataManager initialisieren
 data_manager = DataManager()
+data_manager.show_write_status()
+data_manager.refresh_user_records("data_df")
 
 # Daten laden
 if "data_df" not in st.session_state:
@@ -34,39 +42,143 @@ def safe_eval(value, fallback):
             return ast.literal_eval(value)
         except (ValueError, SyntaxError):
             return fallback
+    elif isinstance(value, dict):
+        # Struct-Spalten aus Parquet enthalten None für Felder, die der Eintrag nicht hat
+        return {k: v for k, v in value.items() if v is not None}
     elif isinstance(value, type(fallback)):
         return value
     else:
         return fallback
 
 # Funktion zum Löschen
-def delete_entry(timestamp):
-    df = st.session_state["data_df"]
-    df = df[df["timestamp"] != timestamp]
-    st.session_state["data_df"] = df
-    data_manager.save_data("data_df")
+def delete_entry(record_id, timestamp):
+    data_manager.delete_records("data_df", [record_id])
     st.success(f"Eintrag vom {timestamp} wurde gelöscht.")
 
+# Eintrag mit ausgewerteten Zählungen, Morphologie und Kommentar für den PDF-Bericht
+def report_record(row):
+    comment_raw = row.get("comment", "")
+    return {
+        **row.to_dict(),
+        "counts": safe_eval(row.get("counts", {}), {}),
+        "morphology_results": safe_eval(row.get("morphology_results", {}), {}),
+        "comment": str(comment_raw).strip() if not pd.isna(comment_raw) else ""
+    }
+
+# Patienten-IDs aus dem Manifest der Partitionen, ohne Einträge zu laden
+partitions = data_manager.get_record_partitions("data_df")
+if partitions is None and isinstance(st.session_state.get("data_df"), pd.DataFrame) and not st.session_state["data_df"].empty:
+    partitions = data_manager.get_record_index("data_df", "patient_id").counts()
+
 # Anzeige
-if 'data_df' in st.session_state and not st.session_state["data_df"].empty:
+if partitions:
 
-    patient_ids = st.session_state["data_df"]["patient_id"].dropna().unique()
     selected_patient_id = st.selectbox(
         "🔍 Ergebnisse filtern nach Patienten-ID (optional)",
-        options=["Alle"] + list(patient_ids)
+        options=["Alle"] + list(partitions),
+        format_func=lambda pid: pid if pid == "Alle" else f"{pid or 'ohne ID'} ({partitions[pid]})"
     )
 
+    # Nur die benötigten Partitionen laden: die des gewählten Patienten oder alle
+    data_manager.load_record_partitions("data_df", None if selected_patient_id == "Alle" else [selected_patient_id])
+    patient_index = data_manager.get_record_index("data_df", "patient_id")
+
+    # Zeitraum über den sortierten Zeitstempel-Index, ohne die Zeitstempel jeder Zeile neu zu lesen
+    timestamp_index = data_manager.get_timestamp_index("data_df")
+    first_time, last_time = timestamp_index.bounds
+    period = st.radio("📅 Zeitraum", ["Alle", "Letzte 7 Tage", "Letzte 30 Tage", "Benutzerdefiniert"], horizontal=True)
+    start = end = None
+    if period == "Letzte 7 Tage":
+        start = pd.Timestamp.now().normalize() - pd.Timedelta(days=6)
+    elif period == "Letzte 30 Tage":
+        start = pd.Timestamp.now().normalize() - pd.Timedelta(days=29)
+    elif period == "Benutzerdefiniert":
+        today = datetime.date.today()
+        date_range = st.date_input(
+            "Von – Bis",
+            value=(first_time.date() if first_time is not None else today, last_time.date() if last_time is not None else today),
+            format="DD.MM.YYYY"
+        )
+        if len(date_range) == 2:
+            start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1]) + pd.Timedelta(days=1)
+        elif len(date_range) == 1:
+            start = pd.Timestamp(date_range[0])
+
     if selected_patient_id != "Alle":
-        filtered_df = st.session_state["data_df"][st.session_state["data_df"]["patient_id"] == selected_patient_id]
+        positions = patient_index.positions(selected_patient_id)
     else:
-        filtered_df = st.session_state["data_df"]
-
-    for idx, row in filtered_df.iterrows():
-        timestamp = pd.to_datetime(row.get("timestamp"), errors="coerce")
+        positions = np.arange(len(st.session_state["data_df"]))
+    if period != "Alle":
+        positions = np.intersect1d(positions, timestamp_index.range(start, end), assume_unique=True)
+
+    # Stichwortsuche über den gespeicherten Suchindex, ohne jeden Kommentar zu durchsuchen
+    query = st.text_input("🔎 Kommentare und Patienten-IDs durchsuchen", placeholder="z. B. Linksverschiebung")
+    if query.strip():
+        positions = np.intersect1d(positions, data_manager.get_search_index("data_df").search(query), assume_unique=True)
+    filtered_df = st.session_state["data_df"].iloc[positions]
+    timestamps = pd.Series(timestamp_index.times(positions), index=filtered_df.index)
+
+    # Prozente und Abweichungen vom Referenzbereich aus dem Index des DataManagers, nicht bei jedem Aufruf neu berechnet
+    evaluation = data_manager.get_evaluation_index("data_df").take(positions)
+    flags_df = pd.DataFrame(evaluation["flags"], index=filtered_df.index, columns=CELL_TYPES)
+
+    abnormal_only = st.checkbox("Nur Einträge mit auffälligen Werten anzeigen", key="abnormal_only")
+    st.caption(f"{int(evaluation['any_abnormal'].sum())} von {len(filtered_df)} gefilterten Einträgen mit auffälligen Werten")
+    if abnormal_only:
+        abnormal_mask = evaluation["any_abnormal"]
+        filtered_df, flags_df, timestamps = filtered_df[abnormal_mask], flags_df[abnormal_mask], timestamps[abnormal_mask]
+        evaluation = {name: values[abnormal_mask] for name, values in evaluation.items()}
+
+    with st.expander("📊 Statistik der gefilterten Einträge"):
+        st.dataframe(summarize(evaluation), use_container_width=True)
+
+    # Sammelexport der gefilterten Einträge
+    with st.expander(f"📦 Alle {len(filtered_df)} gefilterten Berichte exportieren"):
+        export_format = st.radio("Format", ["ZIP (ein PDF pro Eintrag)", "Ein PDF mit allen Einträgen"], horizontal=True)
+        if st.button("Export erstellen", use_container_width=True):
+            records = [report_record(row) for _, row in filtered_df.iterrows()]
+            progress_bar = st.progress(0.0, text="Berichte werden erstellt …")
+            def show_progress(done, total):
+                progress_bar.progress(done / total, text=f"{done} von {total} Berichten erstellt")
+            export_name = f"Zellberichte_{selected_patient_id}_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+            # Das ZIP-Archiv wird in eine temporäre Datei geschrieben statt im Speicher aufgebaut
+            with tempfile.TemporaryFile() as export_file:
+                if export_format.startswith("ZIP"):
+                    report.export_zip(records, export_file, progress=show_progress)
+                    export_file.flush()
+                    export_data = export_file.raw  # ungepufferte Datei, die st.download_button direkt liest
+                    export_name, export_mime = export_name + ".zip", "application/zip"
+                else:
+                    export_data = report.export_pdf(records, progress=show_progress)
+                    export_name, export_mime = export_name + ".pdf", "application/pdf"
+                st.download_button(
+                    label="⬇️ Export herunterladen",
+                    data=export_data,
+                    file_name=re.sub(r'[^a-zA-Z0-9_.-]', '_', export_name),
+                    mime=export_mime,
+                    use_container_width=True
+                )
+
+    # Seitenweise Anzeige, damit nur die sichtbaren Einträge aufgebaut werden
+    page_size_col, page_col = st.columns(2)
+    page_size = page_size_col.selectbox("Einträge pro Seite", options=[10, 25, 50], index=0)
+    page_count = max((len(filtered_df) - 1) // page_size + 1, 1)
+    page = page_col.number_input(f"Seite (von {page_count})", min_value=1, max_value=page_count, value=1, step=1,
+                            key=f"page_{selected_patient_id}_{period}_{start}_{end}_{query}_{page_size}")
+    page_df = filtered_df.iloc[(page - 1) * page_size:page * page_size]
+    st.caption(f"Einträge {(page - 1) * page_size + 1}–{(page - 1) * page_size + len(page_df)} von {len(filtered_df)}")
+
+    pdf_requests = st.session_state.setdefault("pdf_requests", set())
+
+    for idx, row in page_df.iterrows():
+        timestamp = timestamps.loc[idx]
         timestamp_str = timestamp.strftime("%Y-%m-%d %H:%M:%S") if not pd.isnull(timestamp) else "kein Datum"
         patient_id = row.get("patient_id", "Unbekannt")
 
-        with st.expander(f"**Patienten-ID: {patient_id}** – {timestamp_str}"):
+        row_flags = flags_df.loc[idx]
+        abnormal = [("⬆️ " if flag > 0 else "⬇️ ") + cell for cell, flag in row_flags.items() if flag != 0]
+
+        with st.expander(f"{'⚠️ ' if abnormal else ''}**Patienten-ID: {patient_id}** – {timestamp_str}"):
 
             st.markdown(f"""
             **Patienten-ID:** {patient_id}  
@@ -74,16 +186,18 @@ if 'data_df' in st.session_state and not st.session_state["data_df"].empty:
             **Geburtsdatum:** {row.get('birth_date', 'Unbekannt')} | **Alter:** {row.get('age', 'Unbekannt')}
             """)
 
-            counts = safe_eval(row.get("counts", {}), {})
-            morpho = safe_eval(row.get("morphology_results", {}), {})
-            comment_raw = row.get("comment", "")
-            comment = str(comment_raw).strip() if not pd.isna(comment_raw) else ""
+            record = report_record(row)
+            counts = record["counts"]
+            morpho = record["morphology_results"]
+            comment = record["comment"]
 
             if counts and any(v > 0 for v in counts.values()):
                 st.markdown("**Weisses Blutbild:**")
                 for zelltyp, anzahl in counts.items():
                     if anzahl > 0:
                         st.markdown(f"- {zelltyp}: {anzahl}")
+                if abnormal:
+                    st.markdown(f"**Auffällige Werte:** {', '.join(abnormal)}")
             else:
                 st.info("Keine Zellzählung gespeichert.")
 
@@ -101,74 +215,23 @@ if 'data_df' in st.session_state and not st.session_state["data_df"].empty:
             else:
                 st.info("Kein Kommentar vorhanden.")
 
-            # PDF Export
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_font("Arial", "B", 10)
-            pdf.cell(0, 8, "Ergebnisse der Zellzählung", ln=True, align="C")
-            pdf.ln(4)
-
-            pdf.set_font("Arial", "", 8)
-            pdf.multi_cell(0, 6, f"Patienten-ID: {row.get('patient_id', '')} | Geschlecht: {row.get('gender', '')} | Geburtsdatum: {row.get('birth_date', '')} | Alter: {row.get('age', '')} Jahre")
-            pdf.cell(0, 6, f"Zeitpunkt: {timestamp_str}", ln=True)
-            pdf.ln(2)
-
-            pdf.set_font("Arial", "B", 8)
-            pdf.cell(60, 6, "Zelltyp", border=1)
-            pdf.cell(30, 6, "Anzahl", border=1)
-            pdf.cell(30, 6, "Referenz", border=1, ln=True)
-            pdf.set_font("Arial", "", 8)
-
-            reference_values = {
-                "Segmentkernige Neutrophile": (40, 75),
-                "Stabkernige Neutrophile": (3, 6),
-                "Eosinophile": (1, 6),
-                "Basophile": (0, 1),
-                "Monozyten": (2, 10),
-                "Lymphozyten": (15, 45),
-                "Plasmazellen": (0, 2),
-                "Vorstufen": (0, 1)
-            }
-
-            for cell, (low, high) in reference_values.items():
-                count = counts.get(cell, 0)
-                ref = f"{low}-{high}%"
-                pdf.cell(60, 6, cell, border=1)
-                pdf.cell(30, 6, str(count), border=1)
-                pdf.cell(30, 6, ref, border=1, ln=True)
-
-            pdf.ln(3)
-            pdf.set_font("Arial", "B", 8)
-            pdf.cell(0, 6, "Morphologische Beurteilung:", ln=True)
-            pdf.ln(2)
-            pdf.cell(60, 6, "Parameter", border=1)
-            pdf.cell(30, 6, "Schweregrad", border=1, ln=True)
-            pdf.set_font("Arial", "", 8)
-            for param, severity in morpho.items():
-                pdf.cell(60, 6, param, border=1)
-                pdf.cell(30, 6, severity, border=1, ln=True)
-
-            pdf.ln(3)
-            pdf.set_font("Arial", "B", 8)
-            pdf.cell(0, 6, "Kommentar:", ln=True)
-            pdf.set_font("Arial", "", 8)
-            pdf.multi_cell(0, 6, comment)
-
-            pdf_bytes = pdf.output(dest='S').encode('latin-1', 'replace')
-
-            safe_patient_id = re.sub(r'[^a-zA-Z0-9_-]', '_', str(patient_id))
-            safe_timestamp = timestamp_str.replace(":", "-").replace(" ", "_")
-
-            st.download_button(
-                label="📄 Bericht als PDF herunterladen",
-                data=pdf_bytes,
-                file_name=f"Zellbericht_{safe_patient_id}_{safe_timestamp}.pdf",
-                mime="application/pdf",
-                use_container_width=True
-            )
-
-            if st.button(f"Diesen Eintrag löschen", key=f"delete_{idx}", use_container_width=True):
-                delete_entry(row.get("timestamp"))
+            # PDF Export, erst wenn der Bericht angefordert wird
+            record_key = row.get('record_id', idx)
+            if record_key not in pdf_requests:
+                if st.button("📄 PDF-Bericht erstellen", key=f"pdf_{record_key}", use_container_width=True):
+                    pdf_requests.add(record_key)
+                    st.rerun()
+            else:
+                st.download_button(
+                    label="📄 Bericht als PDF herunterladen",
+                    data=report.build_report(record),
+                    file_name=report.report_file_name(record),
+                    mime="application/pdf",
+                    use_container_width=True
+                )
+
+            if st.button(f"Diesen Eintrag löschen", key=f"delete_{record_key}", use_container_width=True):
+                delete_entry(row.get("record_id"), timestamp_str)
                 st.rerun()
 
 else:
@@ -0,0 +1,55 @@
+import streamlit as st
+from utils.data_manager import DataManager
+from utils.login_manager import LoginManager
+from utils.assets import show_logo
+from utils.reference_ranges import CELL_TYPES
+
+# Seitenkonfiguration
+st.set_page_config(page_title="Statistik", layout="wide")
+
+# Sidebar Logo
+show_logo()
+
+# Zugriffsschutz
+LoginManager().go_to_login('Start.py')
+
+# Titel
+st.title("Statistik über alle gespeicherten Ergebnisse")
+
+# DataManager initialisieren
+data_manager = DataManager()
+data_manager.show_write_status()
+
+# Gespeicherte Statistik aller Benutzer, beim Speichern und Löschen nachgeführt statt bei jedem Aufruf neu berechnet
+statistics = data_manager.get_cohort_statistics("data_df")
+
+if not statistics.record_count:
+    st.info("Es sind noch keine Ergebnisse gespeichert.")
+    st.stop()
+
+col1, col2, col3 = st.columns(3)
+col1.metric("Gespeicherte Ergebnisse", statistics.record_count)
+col2.metric("Davon mit Zellzählung", statistics.counted)
+col3.metric("Benutzer", len(statistics.users))
+
+# Verteilung pro Zelltyp
+st.subheader("Weisses Blutbild")
+if statistics.counted:
+    st.dataframe(statistics.summary(), use_container_width=True)
+
+    cell_type = st.selectbox("Verteilung anzeigen für", CELL_TYPES)
+    histogram = statistics.histogram(cell_type)
+    histogram.index = [f"{lower}–{lower + 5}%" for lower in histogram.index]
+    filled = histogram.to_numpy().nonzero()[0]
+    st.bar_chart(histogram.iloc[filled[0]:filled[-1] + 1], x_label="Anteil", y_label="Anzahl Ergebnisse", sort=False)
+else:
+    st.info("Noch keine Zellzählungen gespeichert.")
+
+# Häufigste morphologische Befunde
+st.markdown("---")
+st.subheader("Häufigste morphologische Auffälligkeiten")
+findings = statistics.morphology_findings()
+if not findings.empty:
+    st.dataframe(findings, hide_index=True, use_container_width=True)
+else:
+    st.info("Keine morphologischen Auffälligkeiten gespeichert.")
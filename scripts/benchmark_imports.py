@@ -0,0 +1,88 @@
+"""
+Measures the first run of every page after a server restart.
+
+Every page is run with Streamlit's AppTest in a fresh Python process, so no cache is filled
+from a previous measurement. The measured time covers the imports of the page and everything
+its script does until the first paint is complete, e.g. creating the authenticator or drawing
+a chart. Only Streamlit itself is imported beforehand, as in a running server. Like every
+session, the measurement starts on Start.py, logged in with a DataManager on an empty local
+folder; for the other pages only their own first run after Start.py is measured.
+
+Usage (from the repository root):
+
+    python scripts/benchmark_imports.py [--runs 5] [--top 5]
+"""
+import argparse, glob, json, os, statistics, subprocess, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs Start.py (where every session begins) and then the page, and prints the run time of the page
+# and the top-level packages its run imported
+FIRST_RUN = """
+import json, os, sys, tempfile, time
+from streamlit.testing.v1 import AppTest
+
+sys.path.insert(0, {root!r})
+preloaded = set(sys.modules)
+start = time.perf_counter()
+
+import pandas as pd
+from utils.data_manager import DataManager
+
+app = AppTest.from_file(os.path.join({root!r}, "Start.py"), default_timeout=120)
+data_manager = object.__new__(DataManager)  # without a script run, the session state singleton is not available
+data_manager.__init__("file", tempfile.mkdtemp())
+app.session_state["data_manager"] = data_manager
+app.session_state["authentication_status"] = True
+app.session_state["username"] = "benchmark"
+app.session_state["name"] = "Benchmark"
+app.session_state["data_df"] = pd.DataFrame()
+app.run()
+
+if {page!r} != "Start.py":
+    preloaded = set(sys.modules)
+    app.switch_page({page!r})
+    start = time.perf_counter()
+    app.run()
+
+elapsed = (time.perf_counter() - start) * 1000
+packages = sorted({{name.split(".")[0] for name in set(sys.modules) - preloaded}})
+print(json.dumps({{"ms": elapsed, "errors": [str(e.message) for e in app.exception], "packages": packages}}))
+"""
+
+# packages whose import time is worth reporting
+HEAVY = ["fpdf", "matplotlib", "numpy", "pandas", "pyarrow", "streamlit_authenticator", "webdav4", "yaml"]
+
+
+def measure(path):
+    """
+    Runs the first script run of a page in a fresh interpreter, after the login on Start.py.
+
+    Returns:
+        dict: Run time in ms ('ms'), exceptions shown by the page ('errors') and imported packages ('packages')
+    """
+    result = subprocess.run([sys.executable, "-c", FIRST_RUN.format(root=ROOT, page=os.path.relpath(path, ROOT))], cwd=ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="measurements per page, the median is reported")
+    parser.add_argument("--top", type=int, default=5, help="number of heavy packages shown per page")
+    args = parser.parse_args()
+
+    pages = [os.path.join(ROOT, "Start.py")] + sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+    print(f"{'Seite':<30} {'Erster Lauf (ms)':>17}   geladene schwere Pakete")
+    for path in pages:
+        runs = [measure(path) for _ in range(args.runs)]
+        total = statistics.median(run["ms"] for run in runs)
+        heavy = [package for package in HEAVY if package in runs[-1]["packages"]][:args.top]
+        errors = f"   Fehler: {runs[-1]['errors'][0]}" if runs[-1]["errors"] else ""
+        print(f"{os.path.basename(path):<30} {total:>17.0f}   " + ", ".join(heavy) + errors)
+
+
+if __name__ == "__main__":
+    main()
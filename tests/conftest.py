@@ -0,0 +1,15 @@
+import os, sys
+import fsspec
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.data_handler import DataHandler
+
+
+@pytest.fixture
+def data_handler(tmp_path):
+    """
+    A DataHandler on the local filesystem in a temporary folder.
+    """
+    return DataHandler(fsspec.filesystem('file'), str(tmp_path))
@@ -0,0 +1,39 @@
+import os
+
+import fsspec
+
+from utils.cached_filesystem import CachedFileSystem
+from utils.data_handler import DataHandler
+
+
+def cached_handler(tmp_path):
+    filesystem = CachedFileSystem(fsspec.filesystem('file'), cache_dir=str(tmp_path / "cache"), info_ttl=60)
+    os.makedirs(tmp_path / "data")
+    return DataHandler(filesystem, str(tmp_path / "data")), filesystem
+
+
+def cached_files(filesystem):
+    return sorted(name for name in os.listdir(filesystem.cache_dir) if not name.startswith('.'))
+
+
+def test_reads_are_served_from_the_local_copy(tmp_path, monkeypatch):
+    data_handler, filesystem = cached_handler(tmp_path)
+    data_handler.save("settings.json", {"a": 1})
+    monkeypatch.setattr(filesystem.filesystem, "open", lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError))
+
+    assert data_handler.load("settings.json") == {"a": 1}
+
+
+def test_conditional_save_moves_the_local_copy_of_the_temporary_file(tmp_path):
+    data_handler, filesystem = cached_handler(tmp_path)
+    assert data_handler.save_if_version("manifest.json", {"version": 1}, None)
+    version = data_handler.version("manifest.json")
+    assert data_handler.load("manifest.json") == {"version": 1}
+
+    assert data_handler.save_if_version("manifest.json", {"version": 2}, version)
+
+    path = data_handler._resolve_path("manifest.json")
+    assert list(filesystem._index) == [path]
+    assert cached_files(filesystem) == sorted([os.path.basename(filesystem._local_path(path)),
+                                               os.path.basename(filesystem._local_path(path)) + '.meta'])
+    assert data_handler.load("manifest.json") == {"version": 2}  # despite the long info_ttl
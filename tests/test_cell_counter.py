@@ -0,0 +1,35 @@
+from utils.cell_counter import CellCounter
+
+
+def test_undo_and_redo_restore_the_counts():
+    counter = CellCounter(["Monozyten", "Lymphozyten"])
+    for cell in ["Monozyten", "Lymphozyten", "Lymphozyten"]:
+        counter.increment(cell)
+
+    assert counter.undo() == "Lymphozyten" and counter.undo() == "Lymphozyten"
+    assert dict(counter) == {"Monozyten": 1, "Lymphozyten": 0}
+    assert counter.redo() == "Lymphozyten"
+    counter.increment("Monozyten")  # a new count drops the counts that are left to redo
+
+    assert counter.redo() is None
+    assert dict(counter) == {"Monozyten": 2, "Lymphozyten": 1} and counter.total == 3
+    assert counter.recent() == ["Monozyten", "Lymphozyten", "Monozyten"]
+
+
+def test_event_log_keeps_only_the_last_counts():
+    counter = CellCounter(["Monozyten", "Lymphozyten"], capacity=3)
+    for cell in ["Monozyten"] * 2 + ["Lymphozyten"] * 3:
+        counter.increment(cell)
+
+    assert counter.recent() == ["Lymphozyten"] * 3
+    assert [counter.undo() for _ in range(4)] == ["Lymphozyten"] * 3 + [None]
+    assert dict(counter) == {"Monozyten": 2, "Lymphozyten": 0}
+
+
+def test_reset_clears_counts_and_log():
+    counter = CellCounter(["Monozyten"])
+    counter.increment("Monozyten")
+    counter.reset()
+
+    assert counter.total == 0 and counter.undo() is None and counter.recent() == []
+    assert counter.throughput() is None and len(counter.click_intervals()) == 0
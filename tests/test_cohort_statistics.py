@@ -0,0 +1,62 @@
+import json
+import pandas as pd
+
+from utils.cohort_statistics import CohortStatistics
+
+
+def records(count, start=0):
+    return pd.DataFrame([{"counts": {"Eosinophile": i, "Monozyten": 10 - i}, "age": 30 + i, "gender": "Weiblich",
+                          "morphology_results": {"Anisozytose": "Leicht" if i % 2 else "Keine"}}
+                         for i in range(start, start + count)])
+
+
+def test_adding_and_removing_records_equals_a_rebuild():
+    statistics = CohortStatistics()
+    statistics.include("alice", records(4))
+    statistics.add("alice", records(3, start=4))
+    statistics.add("alice", records(2), sign=-1)
+
+    rebuilt = CohortStatistics()
+    rebuilt.include("alice", records(5, start=2))
+
+    stored, expected = statistics.to_dict(), rebuilt.to_dict()
+    assert {key: value for key, value in stored.items() if key not in ("salt", "users")} == \
+        {key: value for key, value in expected.items() if key not in ("salt", "users")}
+    pd.testing.assert_frame_equal(statistics.summary(), rebuilt.summary())
+
+
+def test_records_of_users_that_are_not_included_are_ignored():
+    statistics = CohortStatistics()
+    statistics.include("alice", records(2))
+
+    assert not statistics.add("bob", records(1))
+    assert not statistics.include("alice", records(2))
+    assert statistics.record_count == 2
+
+
+def test_stored_statistics_hold_no_usernames():
+    statistics = CohortStatistics()
+    statistics.include("alice", records(2))
+    stored = json.loads(json.dumps(statistics.to_dict()))
+
+    assert "alice" not in json.dumps(stored)
+    reloaded = CohortStatistics.from_dict(stored)
+    assert reloaded.includes("alice") and not reloaded.includes("bob")
+    assert reloaded.add("alice", records(1)) and reloaded.record_count == 3
+
+
+def test_plain_usernames_of_older_files_are_hashed_on_load():
+    reloaded = CohortStatistics.from_dict({"record_count": 2, "users": ["alice"]})
+
+    assert reloaded.includes("alice")
+    assert "alice" not in reloaded.to_dict()["users"]
+
+
+def test_histogram_counts_100_percent_in_the_last_range():
+    statistics = CohortStatistics()
+    statistics.include("alice", pd.DataFrame({"counts": [{"Eosinophile": 5}, {"Eosinophile": 1, "Monozyten": 19}]}))
+
+    histogram = statistics.histogram("Eosinophile")
+
+    assert histogram.index[-1] == 95 and len(histogram) == 20
+    assert histogram[95] == 1 and histogram[5] == 1
@@ -0,0 +1,88 @@
+from utils.credential_store import CredentialStore
+from utils.data_handler import DataHandler
+
+
+def open_store(data_handler, **kwargs):
+    store = CredentialStore(data_handler, **kwargs)
+    store.load()
+    return store
+
+
+def other_process(data_handler, **kwargs):
+    return open_store(DataHandler(data_handler.filesystem, data_handler.root_path), **kwargs)
+
+
+def test_load_replays_journal_in_write_order(data_handler):
+    store = open_store(data_handler)
+    store.save_user("Alice", {"email": "alice@example.com"})
+    store.save_user("bob", {"email": "bob@example.com"})
+    store.save_user("alice", {"email": "alice@example.org"})
+    store.save_user("bob", None)
+
+    assert open_store(data_handler).usernames == {"alice": {"email": "alice@example.org"}}
+    assert len(data_handler.listdir(store.journal_folder)) == 4
+
+
+def test_refresh_reads_only_new_entries_of_other_processes(data_handler):
+    store, other = open_store(data_handler), other_process(data_handler)
+    other.save_user("bob", {"email": "bob@example.com"})
+
+    assert store.refresh(max_age=60) == {}  # checked on load just now
+    assert store.refresh() == {"bob": {"email": "bob@example.com"}}
+    assert store.journal_entries == other.journal_entries
+
+
+def test_compaction_keeps_users_of_other_processes(data_handler):
+    store, other = open_store(data_handler), other_process(data_handler)
+    other.save_user("bob", {"email": "bob@example.com"})
+    store.save_user("alice", {"email": "alice@example.com"})
+    store.compact()
+
+    assert data_handler.listdir(store.journal_folder) == []
+    assert sorted(open_store(data_handler).usernames) == ["alice", "bob"]
+    other.save_user("carol", {"email": "carol@example.com"})
+    assert sorted(other.refresh()) == ["alice", "bob", "carol"]
+
+
+def test_compaction_retries_when_snapshot_is_replaced_concurrently(data_handler, monkeypatch):
+    store, other = open_store(data_handler), other_process(data_handler)
+    store.save_user("alice", {"email": "alice@example.com"})
+    save_if_version = data_handler.save_if_version
+    calls = []
+
+    def compact_other_first(relative_path, content, version):
+        if not calls:  # another process compacts between the refresh and the write
+            other.save_user("bob", {"email": "bob@example.com"})
+            other.compact()
+        calls.append(version)
+        return save_if_version(relative_path, content, version)
+
+    monkeypatch.setattr(data_handler, "save_if_version", compact_other_first)
+    store.compact()
+
+    assert len(calls) == 2
+    assert sorted(open_store(data_handler).usernames) == ["alice", "bob"]
+
+
+def test_view_copies_only_the_users_it_reads(data_handler):
+    store = open_store(data_handler)
+    store.save_user("alice", {"email": "alice@example.com"})
+    store.save_user("bob", {"email": "bob@example.com"})
+    view = store.view()
+
+    view["Alice"]["failed_login_attempts"] = 1
+    view["carol"] = {"email": "carol@example.com"}
+
+    assert "failed_login_attempts" not in store.usernames["alice"]
+    assert list(view._users) == ["alice", "carol"]
+    assert any("bob@example.com" in credentials.values() for credentials in view.values())
+    assert sorted(view) == ["alice", "bob", "carol"] and "carol" not in store
+
+
+def test_view_finds_users_registered_by_other_processes(data_handler):
+    store = open_store(data_handler)
+    view = store.view(max_age=0)
+    other_process(data_handler).save_user("bob", {"email": "bob@example.com"})
+
+    assert "bob" in view
+    assert view["bob"] == {"email": "bob@example.com"}
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.data_handler import DataHandler
+from utils.reference_ranges import CELL_TYPES, counts_matrix
+
+
+def present(values):
+    """The dicts of a struct column without the fields a record does not have."""
+    return [{key: item for key, item in value.items() if item is not None} if isinstance(value, dict) else None
+            for value in values]
+
+
+def test_parquet_stores_dict_columns_as_typed_structs(data_handler):
+    data = pd.DataFrame({
+        "counts": [{"Eosinophile": 2, "Basophile": 0}, {}, None],
+        "morphology_results": ["{'Anisozytose': 'Leicht'}", "{}", "{'Poikilozytose': 'Keine'}"],
+        "age": [30, "unbekannt", None],
+    })
+    data_handler.save("data.parquet", data)
+
+    schema = pq.read_schema(data_handler._resolve_path("data.parquet"))
+    loaded = data_handler.load("data.parquet")
+
+    assert schema.field("counts").type == pa.struct([("Eosinophile", pa.int64()), ("Basophile", pa.int64())])
+    assert schema.field("morphology_results").type == pa.struct([("Anisozytose", pa.string()),
+                                                                 ("Poikilozytose", pa.string())])
+    assert DataHandler.is_struct(loaded["counts"])
+    assert loaded["counts"].struct.field("Eosinophile").isna().tolist() == [False, True, True]
+    assert present(loaded["counts"].tolist()) == [{"Eosinophile": 2, "Basophile": 0}, {}, None]
+    assert present(loaded["morphology_results"].tolist()) == [{"Anisozytose": "Leicht"}, {}, {"Poikilozytose": "Keine"}]
+    assert loaded["age"].tolist()[:2] == ["30", "unbekannt"]
+
+
+def test_parquet_keeps_a_column_of_empty_dicts(data_handler):
+    data_handler.save("data.parquet", pd.DataFrame({"counts": [{}, {}]}))
+
+    assert data_handler.load("data.parquet")["counts"].tolist() == [{}, {}]
+
+
+def test_parquet_migrates_dict_reprs_read_from_csv(data_handler):
+    data_handler.save("data.csv", pd.DataFrame({"counts": [{"Eosinophile": 1}, {"Monozyten": 3}]}))
+    data_handler.save("data.parquet", data_handler.load("data.csv"))
+
+    assert present(data_handler.load("data.parquet")["counts"].tolist()) == [{"Eosinophile": 1}, {"Monozyten": 3}]
+
+
+def test_parquet_reads_legacy_map_columns_as_dicts(data_handler):
+    counts = pa.array([[("Eosinophile", 1)], [("Monozyten", 2)]], type=pa.map_(pa.string(), pa.int64()))
+    pq.write_table(pa.table({"counts": counts}), data_handler._resolve_path("data.parquet"))
+
+    assert data_handler.load("data.parquet")["counts"].tolist() == [{"Eosinophile": 1}, {"Monozyten": 2}]
+
+
+def test_concat_records_widens_struct_columns(data_handler):
+    data_handler.save("data.parquet", pd.DataFrame({"record_id": ["r0"], "counts": [{"Eosinophile": 1}]}))
+    stored = data_handler.load("data.parquet")
+    appended = pd.DataFrame([{"record_id": "r1", "counts": {"Eosinophile": 2.5, "Monozyten": 3}, "comment": "x"}])
+
+    data = DataHandler.concat_records([stored, appended])
+
+    assert data.columns.tolist() == ["record_id", "counts", "comment"]
+    assert data["counts"].dtype.pyarrow_dtype == pa.struct([("Eosinophile", pa.float64()), ("Monozyten", pa.int64())])
+    assert present(data["counts"].tolist()) == [{"Eosinophile": 1.0}, {"Eosinophile": 2.5, "Monozyten": 3}]
+
+
+def test_counts_matrix_reads_struct_fields_like_dicts(data_handler):
+    counts = [{"Eosinophile": 2, "Monozyten": 3}, {"Basophile": 1}, None]
+    data_handler.save("data.parquet", pd.DataFrame({"counts": counts}))
+    stored = data_handler.load("data.parquet")["counts"]
+
+    expected = np.zeros((3, len(CELL_TYPES)))
+    expected[0, CELL_TYPES.index("Eosinophile")], expected[0, CELL_TYPES.index("Monozyten")] = 2, 3
+    expected[1, CELL_TYPES.index("Basophile")] = 1
+    assert np.array_equal(counts_matrix(stored), expected)
+    assert np.array_equal(counts_matrix(pd.Series(counts, dtype=object)), expected)
+
+
+def test_save_if_version_rejects_stale_versions(data_handler):
+    assert data_handler.save_if_version("manifest.json", {"version": 1}, None)
+    version = data_handler.version("manifest.json")
+    assert not data_handler.save_if_version("manifest.json", {"version": 1}, None)
+
+    assert data_handler.save_if_version("manifest.json", {"version": 2}, version)
+    assert not data_handler.save_if_version("manifest.json", {"version": 3}, version)
+    assert data_handler.load("manifest.json") == {"version": 2}
+    assert [name for name in data_handler.listdir("") if name.endswith(".tmp")] == []
+
+
+def test_load_reads_only_the_requested_columns(data_handler):
+    data = pd.DataFrame({"patient_id": ["P1", "P2"], "timestamp": ["2025-01-01", "2025-01-02"], "comment": ["a", "b"]})
+    data_handler.save("data.parquet", data)
+    data_handler.save("data.csv", data)
+
+    assert data_handler.load("data.parquet", usecols=["patient_id"], columns=["comment"]).columns.tolist() == ["patient_id"]
+    assert data_handler.load("data.parquet", columns=["comment"]).columns.tolist() == ["comment"]
+    assert data_handler.load("data.csv", usecols=["patient_id"]).columns.tolist() == ["patient_id"]
@@ -0,0 +1,169 @@
+import threading
+import pandas as pd
+
+from utils.data_handler import DataHandler
+from utils.record_store import PartitionedRecordStore, RecordStore
+
+
+def records(count, start=0):
+    return [{"record_id": f"r{i:03d}", "patient_id": f"P{i % 3}", "timestamp": f"2025-01-01 12:{i:02d}:00",
+             "counts": {"Eosinophile": i}}
+            for i in range(start, start + count)]
+
+
+def open_store(data_handler, **kwargs):
+    legacy_store = RecordStore(data_handler, "data.csv", snapshot_format="parquet", id_column="record_id")
+    return PartitionedRecordStore(data_handler, "data", "patient_id", snapshot_format="parquet", order_by="timestamp",
+                                  legacy_store=legacy_store, id_column="record_id", **kwargs)
+
+
+def manifest_counts(store):
+    _, partitions, _, _ = store._read_manifest()
+    return {entry["value"]: entry["count"] for entry in partitions.values()}
+
+
+def test_legacy_records_are_migrated_into_partitions(data_handler):
+    data_handler.save("data.csv", pd.DataFrame(records(6)).drop(columns="record_id"))
+
+    data = open_store(data_handler).load(pd.DataFrame(), parse_dates=["timestamp"])
+
+    assert len(data) == 6 and data["record_id"].is_unique
+    assert manifest_counts(open_store(data_handler)) == {"P0": 2, "P1": 2, "P2": 2}
+    assert data_handler.exists("data.csv")  # the legacy file is kept untouched
+    reloaded = open_store(data_handler).load(pd.DataFrame(), parse_dates=["timestamp"])
+    assert reloaded["record_id"].tolist() == data["record_id"].tolist()
+    assert reloaded["counts"].tolist() == [{"Eosinophile": i} for i in range(6)]
+
+
+def test_append_and_delete_update_only_their_partition(data_handler):
+    store = open_store(data_handler)
+    store.load(pd.DataFrame())
+    for record in records(5):
+        store.append(record)
+    store.delete_records(pd.DataFrame(records(1)))
+
+    assert manifest_counts(store) == {"P0": 1, "P1": 2, "P2": 1}
+    assert open_store(data_handler).load_partition("P1")["record_id"].tolist() == ["r001", "r004"]
+    assert sorted(open_store(data_handler).load(pd.DataFrame())["record_id"]) == ["r001", "r002", "r003", "r004"]
+
+
+def test_retried_append_is_counted_once(data_handler):
+    store = open_store(data_handler)
+    store.load(pd.DataFrame())
+    record = records(1)[0]
+    store.append(record)
+    store.append(record)
+
+    assert manifest_counts(store) == {"P0": 1}
+    assert len(open_store(data_handler).load(pd.DataFrame())) == 1
+
+
+def test_refresh_reads_partitions_changed_by_other_sessions(data_handler):
+    first, second = open_store(data_handler), open_store(data_handler)
+    for record in records(3):
+        first.append(record)
+    first_data = pd.DataFrame(records(3))
+    second_data = second.load(pd.DataFrame())
+
+    second.append(records(1, start=3)[0])
+    second.delete_records(pd.DataFrame(records(2)[1:]))
+    second_data = pd.concat([second_data[second_data["record_id"] != "r001"], pd.DataFrame(records(1, start=3))],
+                            ignore_index=True)
+
+    assert sorted(first.refresh(first_data)["record_id"]) == ["r000", "r002", "r003"]
+    assert second.refresh(second_data) is second_data  # own changes need no reload
+
+
+def test_compaction_keeps_records_of_other_sessions(data_handler):
+    first, second = open_store(data_handler, compaction_threshold=2), open_store(data_handler)
+    first.load(pd.DataFrame())
+    second.load(pd.DataFrame())
+    for record in records(3):
+        first.append(record)
+    second.append(records(1, start=3)[0])  # same partition as r000
+
+    first.compact(pd.DataFrame(records(3)))
+
+    assert sorted(open_store(data_handler).load(pd.DataFrame())["record_id"]) == ["r000", "r001", "r002", "r003"]
+    assert manifest_counts(first)["P0"] == 2
+
+
+def test_concurrent_manifest_updates_are_not_lost(data_handler):
+    def append_all(start):
+        # every session has its own handler and store, like separate Streamlit sessions
+        store = open_store(DataHandler(data_handler.filesystem, data_handler.root_path))
+        store.load(pd.DataFrame())
+        for record in records(10, start=start):
+            store.append(record)
+
+    threads = [threading.Thread(target=append_all, args=(start,)) for start in range(0, 60, 10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(manifest_counts(open_store(data_handler)).values()) == 60
+    assert len(open_store(data_handler).load(pd.DataFrame())) == 60
+
+
+def test_combined_snapshot_replaces_partition_reads(data_handler):
+    store = open_store(data_handler, combined_threshold=2)
+    store.load(pd.DataFrame())
+    for record in records(6):
+        store.append(record)
+    assert store.needs_compaction
+    store.compact(pd.DataFrame(records(6)))
+
+    reader = open_store(data_handler)
+    read_partitions = []
+    load_partitions = reader._load_partitions
+    reader._load_partitions = lambda keys: read_partitions.extend(keys) or load_partitions(keys)
+    data = reader.load(pd.DataFrame())
+
+    assert read_partitions == []
+
+    assert sorted(data["record_id"]) == [f"r{i:03d}" for i in range(6)]
+    assert len([name for name in data_handler.listdir("data") if name.startswith("combined_")]) == 1
+
+
+def test_open_reads_only_the_manifest(data_handler):
+    store = open_store(data_handler)
+    store.load(pd.DataFrame())
+    for record in records(6):
+        store.append(record)
+
+    reader = open_store(data_handler)
+    read_partitions = []
+    load_partitions = reader._load_partitions
+    reader._load_partitions = lambda keys: read_partitions.extend(keys) or load_partitions(keys)
+
+    assert reader.open() == {"P0": 2, "P1": 2, "P2": 2}
+    assert read_partitions == []
+    data = reader.load_partitions(pd.DataFrame(), ["P1"])
+    assert data["record_id"].tolist() == ["r001", "r004"]
+    assert read_partitions == [reader.partition_key("P1")]
+    assert reader.load_partitions(data, ["P1"]) is data
+
+
+def test_partially_loaded_store_keeps_the_other_partitions(data_handler):
+    writer = open_store(data_handler)
+    writer.load(pd.DataFrame())
+    for record in records(6):
+        writer.append(record)
+
+    store = open_store(data_handler, compaction_threshold=1)
+    store.open()
+    data = store.load_partitions(pd.DataFrame(), ["P0"])
+    writer.append(records(1, start=7)[0])  # P1, not loaded
+    writer.append(records(1, start=9)[0])  # P0
+    data = store.refresh(data)
+    assert data["record_id"].tolist() == ["r000", "r003", "r009"]
+
+    store.delete_records(data[data["record_id"] == "r003"])
+    store.compact(data[data["record_id"] != "r003"])
+
+    assert manifest_counts(store) == {"P0": 2, "P1": 3, "P2": 2}
+    assert sorted(open_store(data_handler).load(pd.DataFrame())["record_id"]) == \
+        ["r000", "r001", "r002", "r004", "r005", "r007", "r009"]
+    assert store.load_partitions(data, None)["record_id"].tolist() == ["r000", "r001", "r002", "r004", "r005", "r007", "r009"]
+    assert store.complete
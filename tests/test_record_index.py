@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+from utils.record_index import EvaluationIndex, RecordIndex, TextIndex, TimestampIndex
+from utils.reference_ranges import evaluate_records
+
+
+def records(count, start=0):
+    return [{"record_id": f"r{i:03d}", "patient_id": f"P{i % 3}", "timestamp": f"2025-01-{i + 1:02d} 12:00:00",
+             "comment": f"Befund {i}", "counts": {"Eosinophile": i, "Monozyten": 5}, "age": 30, "gender": "Weiblich"}
+            for i in range(start, start + count)]
+
+
+def test_evaluation_index_follows_appends_and_deletes():
+    index = EvaluationIndex()
+    index.build(pd.DataFrame(records(3)))
+    index.append(records(1, start=3)[0], 3)
+    index.delete([0, 2])
+
+    expected = evaluate_records(pd.DataFrame([records(4)[1], records(4)[3]]))
+    taken = index.take([0, 1])
+    assert taken.keys() == expected.keys()
+    assert all(np.array_equal(taken[name], expected[name]) for name in expected)
+    assert len(index.take([])["flags"]) == 0
+
+
+def test_record_index_follows_appends_and_deletes():
+    data = pd.DataFrame(records(5))
+    index = RecordIndex("patient_id")
+    index.build(data)
+    index.append({"patient_id": "P9"}, 5)
+    index.append({"patient_id": None}, 6)
+    index.delete([0, 3])  # the only records of P0
+
+    assert index.values == ["P1", "P2", "P9"]
+    assert index.counts() == {"P1": 2, "P2": 1, "P9": 1}
+    assert index.positions("P1").tolist() == [0, 2] and index.positions("P9").tolist() == [3]
+    assert index.positions("P0").tolist() == []
+
+
+def test_record_index_compares_values_as_strings():
+    index = RecordIndex("patient_id")
+    index.build(pd.DataFrame({"patient_id": [1, "1", None, 2]}))
+
+    assert index.values == ["1", "2"]
+    assert index.select(pd.DataFrame({"x": range(4)}), 1)["x"].tolist() == [0, 1]
+
+
+def test_timestamp_index_finds_ranges_after_appends_and_deletes():
+    data = pd.DataFrame(records(5))
+    data.loc[1, "timestamp"] = "kein Datum"
+    index = TimestampIndex("timestamp")
+    index.build(data)
+    index.append({"timestamp": pd.Timestamp("2025-01-02 08:00")}, 5)  # out of order
+    index.delete([0])
+
+    assert index.range(pd.Timestamp("2025-01-02"), pd.Timestamp("2025-01-04")).tolist() == [1, 4]
+    assert index.range(end=pd.Timestamp("2025-01-02")).tolist() == []
+    assert index.range().tolist() == [1, 2, 3, 4]  # every row with a valid timestamp
+    assert index.bounds == (pd.Timestamp("2025-01-02 08:00"), pd.Timestamp("2025-01-05 12:00"))
+    assert index.times([0, 4]).isna().tolist() == [True, False]
+
+
+def test_text_index_matches_all_query_tokens_by_prefix():
+    data = pd.DataFrame(records(3))
+    data.loc[1, "comment"] = "Toxische Granulation, Leukozytose"
+    index = TextIndex(("comment", "patient_id"))
+    index.build(data)
+
+    assert index.search("leuko").tolist() == [1]
+    assert index.search("TOXISCH granul").tolist() == [1]
+    assert index.search("befund p2").tolist() == [2]
+    assert index.search("leuko p0").tolist() == []
+    assert index.search("  ").tolist() == [0, 1, 2]
+
+
+def test_text_index_tokenizes_only_records_missing_from_the_stored_documents():
+    data = pd.DataFrame(records(3))
+    index = TextIndex(("comment",))
+    index.build(data.iloc[:2])
+    stored = index.documents
+
+    rebuilt = TextIndex(("comment",))
+    rebuilt.build(data, {**stored, "r000": ["gespeichert"]})
+    assert rebuilt.search("gespeichert").tolist() == [0]
+    assert rebuilt.pop_changes() == {"r002": ["befund", "2"]}
+
+    rebuilt.append(records(1, start=3)[0], 3)
+    rebuilt.delete([1])
+    assert rebuilt.pop_changes() == {"r003": ["befund", "3"], "r001": None}
+    assert rebuilt.search("befund").tolist() == [1, 2] and not rebuilt.changed
@@ -0,0 +1,180 @@
+import pandas as pd
+import pytest
+
+from utils.data_handler import DataHandler
+from utils.record_store import RecordStore
+
+
+def records(count, start=0):
+    return [{"record_id": f"r{i:03d}", "patient_id": f"P{i % 3}", "timestamp": f"2025-01-01 12:{i:02d}:00"}
+            for i in range(start, start + count)]
+
+
+def open_store(data_handler, **kwargs):
+    return RecordStore(data_handler, "data.csv", snapshot_format="parquet", id_column="record_id", **kwargs)
+
+
+def test_load_replays_journal_in_write_order(data_handler):
+    store = open_store(data_handler)
+    store.load(pd.DataFrame())
+    for record in records(3):
+        store.append(record)
+
+    data = open_store(data_handler).load(pd.DataFrame(), parse_dates=["timestamp"])
+
+    assert data["record_id"].tolist() == ["r000", "r001", "r002"]
+    assert pd.api.types.is_datetime64_any_dtype(data["timestamp"])
+
+
+def test_load_without_files_requires_initial_value(data_handler):
+    with pytest.raises(FileNotFoundError):
+        open_store(data_handler).load()
+
+
+def test_compaction_folds_journal_into_snapshot(data_handler):
+    store = open_store(data_handler, compaction_threshold=3)
+    data = store.load(pd.DataFrame())
+    for record in records(3):
+        store.append(record)
+        data = pd.concat([data, pd.DataFrame([record])], ignore_index=True)
+    assert store.needs_compaction
+
+    store.compact(data)
+
+    assert not store.needs_compaction
+    assert data_handler.listdir(store.journal_folder) == []
+    assert data_handler.exists("data.parquet")
+    assert open_store(data_handler).load(pd.DataFrame())["record_id"].tolist() == ["r000", "r001", "r002"]
+
+
+def test_tombstones_hide_deleted_records_until_compaction(data_handler):
+    store = open_store(data_handler, tombstone_ratio=0.5)
+    data = store.load(pd.DataFrame())
+    for record in records(4):
+        store.append(record)
+    data = pd.DataFrame(records(4))  # own appends are not read back by refresh
+
+    store.delete_records(data[data["record_id"] == "r001"])
+    assert not store.needs_compaction
+    assert open_store(data_handler).load(pd.DataFrame())["record_id"].tolist() == ["r000", "r002", "r003"]
+
+    store.delete_records(data[data["record_id"] == "r002"])
+    assert store.needs_compaction
+    store.compact(data[~data["record_id"].isin(["r001", "r002"])])
+
+    assert store.tombstone_count == 0
+    assert data_handler.load("data.parquet")["record_id"].tolist() == ["r000", "r003"]
+
+
+def test_delete_requires_id_column(data_handler):
+    store = RecordStore(data_handler, "data.csv")
+    with pytest.raises(ValueError):
+        store.delete_records(pd.DataFrame({"record_id": ["r000"]}))
+
+
+def test_records_without_id_get_one_on_load(data_handler):
+    data_handler.save("data.csv", pd.DataFrame({"patient_id": ["P1", "P2"]}))
+
+    data = RecordStore(data_handler, "data.csv", id_column="record_id").load()
+
+    assert data["record_id"].notna().all() and data["record_id"].is_unique
+    assert data_handler.load("data.csv")["record_id"].tolist() == data["record_id"].tolist()
+
+
+def test_retried_append_and_delete_write_one_entry(data_handler):
+    store = open_store(data_handler)
+    data = store.load(pd.DataFrame())
+    record = records(1)[0]
+
+    assert store.append(record) == store.append(record)
+    data = pd.DataFrame([record])
+    deleted = data.iloc[:0]
+    assert store.delete_records(data) == store.delete_records(data)
+
+    assert len(data_handler.listdir(store.journal_folder)) == 2
+    assert store.record_count == 0 and store.tombstone_count == 1
+    assert open_store(data_handler).load(pd.DataFrame()).empty
+    assert store.delete_records(deleted) is None
+
+
+def test_record_in_snapshot_and_journal_is_loaded_once(data_handler):
+    store = open_store(data_handler)
+    data = pd.DataFrame(records(2))
+    store.load(pd.DataFrame())
+    store.compact(data)
+    # a compaction that failed after writing the snapshot leaves the journal entry behind
+    data_handler.save(data_handler.join(store.journal_folder, "r001.jsonl"), [records(2)[1]])
+
+    assert open_store(data_handler).load(pd.DataFrame())["record_id"].tolist() == ["r000", "r001"]
+
+
+def test_new_ids_sort_in_creation_order():
+    ids = [RecordStore.new_id() for _ in range(100)]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+
+
+def test_refresh_reads_changes_of_other_sessions(data_handler):
+    first, second = open_store(data_handler), open_store(data_handler)
+    first_data, second_data = first.load(pd.DataFrame()), second.load(pd.DataFrame())
+
+    second.append(records(1, start=5)[0])
+    second_data = pd.DataFrame(records(1, start=5))
+    first.append(records(1)[0])
+    first_data = pd.DataFrame(records(1))
+
+    assert first.has_foreign_changes()
+    assert sorted(first.refresh(first_data)["record_id"]) == ["r000", "r005"]
+    assert sorted(second.refresh(second_data)["record_id"]) == ["r000", "r005"]
+    assert not second.has_foreign_changes()
+
+
+def test_compaction_merges_changes_of_other_sessions(data_handler):
+    first, second = open_store(data_handler), open_store(data_handler)
+    first_data = first.load(pd.DataFrame())
+    second_data = second.load(pd.DataFrame())
+    for record in records(2):
+        first.append(record)
+    first_data = pd.DataFrame(records(2))
+
+    second.append(records(1, start=5)[0])
+    second.delete_records(pd.DataFrame({"record_id": ["r000"]}))
+    first.compact(first_data)
+
+    assert sorted(open_store(data_handler).load(pd.DataFrame())["record_id"]) == ["r001", "r005"]
+    assert sorted(first.refresh(first_data)["record_id"]) == ["r001", "r005"]
+    second_data = second.refresh(second_data)
+    assert sorted(second_data["record_id"]) == ["r001", "r005"]
+
+
+def test_compaction_retries_when_snapshot_is_replaced_concurrently(data_handler, monkeypatch):
+    # the other session has its own handler, only the writes of the first session are intercepted
+    first, second = open_store(data_handler), open_store(DataHandler(data_handler.filesystem, data_handler.root_path))
+    first_data = first.load(pd.DataFrame())
+    second.load(pd.DataFrame())
+    first.append(records(1)[0])
+    first_data = pd.DataFrame(records(1))
+
+    save_if_version = data_handler.save_if_version
+    calls = []
+
+    def replace_snapshot_first(relative_path, content, version):
+        if not calls:  # another session compacts between the merge and the write
+            second.append(records(1, start=5)[0])
+            second.compact(second.load(pd.DataFrame()))
+        calls.append(version)
+        return save_if_version(relative_path, content, version)
+
+    monkeypatch.setattr(data_handler, "save_if_version", replace_snapshot_first)
+    first.compact(first_data)
+
+    assert len(calls) == 2
+    assert sorted(open_store(data_handler).load(pd.DataFrame())["record_id"]) == ["r000", "r005"]
+
+
+def test_compaction_gives_up_after_write_attempts(data_handler, monkeypatch):
+    store = open_store(data_handler)
+    data = store.load(pd.DataFrame())
+    monkeypatch.setattr(data_handler, "save_if_version", lambda relative_path, content, version: False)
+
+    with pytest.raises(RuntimeError):
+        store.compact(data)
@@ -0,0 +1,34 @@
+import numpy as np
+
+from utils.reference_ranges import CELL_TYPES, TABLE, evaluate, lookup, reference_ranges
+
+
+def test_age_band_borders_belong_to_the_older_band():
+    low, high = lookup([0, 0.99, 1, 4.9, 5, 11, 12, 80], ["Weiblich"] * 8)
+    bands = [0, 0, 1, 1, 2, 2, 3, 3]
+
+    assert np.array_equal(low, TABLE[bands, 1, :, 0])
+    assert np.array_equal(high, TABLE[bands, 1, :, 1])
+
+
+def test_missing_or_invalid_age_uses_the_adult_ranges():
+    low, _ = lookup([None, "unbekannt", np.nan], ["Männlich"] * 3)
+
+    assert (low == TABLE[3, 0, :, 0]).all()
+
+
+def test_unknown_sex_uses_the_ranges_for_unknown_sex():
+    low, high = lookup([30, 30, 30], ["Divers", None, "weiblich"])
+
+    assert (low == TABLE[3, 2, :, 0]).all() and (high == TABLE[3, 2, :, 1]).all()
+    assert reference_ranges(30, None) == reference_ranges(30, "Divers")
+
+
+def test_evaluate_flags_values_outside_of_the_range():
+    low, high = lookup([30], ["Weiblich"])
+    percentages = np.vstack([low, high, low - 1, high + 1])
+
+    flags = evaluate(percentages, [30] * 4, ["Weiblich"] * 4)
+
+    assert flags.shape == (4, len(CELL_TYPES))
+    assert (flags[:2] == 0).all() and (flags[2] == -1).all() and (flags[3] == 1).all()
@@ -0,0 +1,57 @@
+import io, re, zipfile
+
+from utils import report
+
+
+def records(count):
+    return [{"patient_id": f"P{i % 2}", "gender": "Weiblich", "age": 40, "timestamp": "2025-01-01 12:00:00",
+             "counts": {"Eosinophile": i, "Monozyten": 3}, "morphology_results": {"Anisozytose": "Leicht"},
+             "comment": "Linksverschiebung " * (400 if i == 1 else 1)}
+            for i in range(count)]
+
+
+def without_creation_date(pdf_bytes):
+    return re.sub(rb"/CreationDate \(D:\d+\)", b"", pdf_bytes)
+
+
+def test_reports_with_the_same_content_are_rendered_once(monkeypatch):
+    rendered = []
+    render_report = report.render_report
+    monkeypatch.setattr(report, "_cache", report.OrderedDict())
+    monkeypatch.setattr(report, "render_report", lambda *args: rendered.append(args) or render_report(*args))
+    record = records(1)[0]
+
+    first = report.build_report(record)
+    assert report.build_report(dict(record)) is first
+    assert report.build_report({**record, "comment": "anders"}) is not first
+    assert len(rendered) == 2
+
+
+def test_report_key_depends_on_the_reference_ranges():
+    record = records(1)[0]
+
+    assert report.report_key(record) == report.report_key({**record, "birth_date": ""})
+    assert report.report_key(record) != report.report_key({**record, "age": 3})
+    assert report.report_key(record) != report.report_key(record, {"Eosinophile": (0, 100)})
+
+
+def test_zip_export_writes_one_report_per_result_to_the_file():
+    file, progress = io.BytesIO(), []
+
+    report.export_zip(records(3), file, progress=lambda done, total: progress.append((done, total)))
+
+    with zipfile.ZipFile(file) as archive:
+        names = archive.namelist()
+        assert names == ["Zellbericht_P0_2025-01-01_12-00-00.pdf", "Zellbericht_P1_2025-01-01_12-00-00.pdf",
+                         "Zellbericht_P0_2025-01-01_12-00-00_2.pdf"]
+        assert all(archive.read(name).startswith(b"%PDF") for name in names)
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+
+
+def test_pooled_pdf_export_equals_the_export_of_one_process():
+    # batch size 1 renders the pages in the process pool, batch size 8 in the current process
+    pooled = report.export_pdf(records(4), batch_size=1)
+    single = report.export_pdf(records(4), batch_size=8)
+
+    assert without_creation_date(pooled) == without_creation_date(single)
+    assert pooled.count(b"/Type /Page\n") == 5  # the long comment of the second result needs two pages
@@ -0,0 +1,59 @@
+import threading
+
+from utils.write_queue import WriteQueue
+
+
+def test_failing_step_is_retried_without_running_earlier_steps():
+    queue = WriteQueue(retry_delay=0.001)
+    calls = []
+
+    def flaky_compaction():
+        calls.append("compact")
+        if calls.count("compact") < 3:
+            raise OSError("temporarily unavailable")
+
+    queue.submit("data.csv", [lambda: calls.append("append"), flaky_compaction], coalesce=False)
+
+    assert queue.flush(timeout=5)
+    assert calls == ["append", "compact", "compact", "compact"]
+    assert queue.errors == []
+
+
+def test_steps_after_a_failed_step_are_skipped():
+    queue = WriteQueue(max_retries=1, retry_delay=0.001)
+    calls = []
+
+    def fail():
+        raise OSError("unavailable")
+
+    queue.submit("data.csv", [fail, lambda: calls.append("compact")], coalesce=False)
+
+    assert queue.flush(timeout=5)
+    assert calls == []
+    assert [key for key, _ in queue.errors] == ["data.csv"]
+
+
+def test_writes_run_in_submit_order_and_coalesce_per_key():
+    queue = WriteQueue()
+    calls = []
+    queue.submit("a", lambda: calls.append(1))
+    queue.submit("b", lambda: calls.append(2), coalesce=False)
+    queue.submit("b", lambda: calls.append(3), coalesce=False)
+
+    assert queue.flush(timeout=5)
+    assert calls == [1, 2, 3]
+
+
+def test_coalescing_write_does_not_replace_a_write_that_must_run():
+    queue = WriteQueue()
+    calls = []
+    started, release = threading.Event(), threading.Event()
+    queue.submit("other", lambda: (started.set(), release.wait(5)))  # keeps the following writes queued
+    started.wait(5)
+    queue.submit("data.csv", [lambda: calls.append("append"), lambda: calls.append("statistics")], coalesce=False)
+    queue.submit("data.csv", lambda: calls.append("compact"))
+    queue.submit("data.csv", lambda: calls.append("compact again"))
+    release.set()
+
+    assert queue.flush(timeout=5)
+    assert calls == ["append", "statistics", "compact again"]
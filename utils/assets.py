@@ -0,0 +1,36 @@
+import os
+import streamlit as st
+from utils.shared_cache import SharedCache
+
+
+@st.cache_resource(show_spinner=False)
+def _asset_cache():
+    return SharedCache(max_bytes=20 * 1024 * 1024)
+
+
+def read_asset(path):
+    """
+    Read a static file (e.g. an image) from the app folder, shared by all sessions of the process.
+
+    The file is only read again if its modification time or size changed.
+
+    Args:
+        path (str): Path of the file relative to the app folder
+
+    Returns:
+        bytes: The content of the file
+    """
+    stat = os.stat(path)
+
+    def load():
+        with open(path, "rb") as f:
+            return f.read()
+
+    return _asset_cache().get(os.path.abspath(path), (stat.st_mtime_ns, stat.st_size), load)
+
+
+def show_logo():
+    """
+    Shows the app logo in the sidebar.
+    """
+    st.sidebar.image(read_asset("images/logo.png"), use_container_width=True)
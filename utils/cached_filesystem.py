@@ -0,0 +1,341 @@
+import hashlib, io, json, os, shutil, tempfile, threading, time
+
+
+class CachedFileSystem:
+    """
+    A read cache that keeps local copies of the files of a (remote) fsspec filesystem.
+
+    Every read first fetches the file metadata from the remote filesystem (one cheap request)
+    and serves the local copy if size, modification time and ETag are unchanged. Only changed
+    or unknown files are downloaded. Writes go straight to the remote filesystem and refresh
+    the local copy. Metadata is reused for `info_ttl` seconds, so the usual `exists` + `open`
+    pair of DataHandler costs a single request. The least recently used copies are evicted
+    once the cache exceeds `max_cache_bytes`, including copies left by earlier processes.
+
+    The cache folder may be shared by several sessions and processes: local copies are written
+    to a temporary file first and then renamed, so a reader always sees a complete file.
+
+        >>> fs = CachedFileSystem(fsspec.filesystem('webdav', base_url=..., auth=...))
+        >>> dh = DataHandler(fs, 'app_data')
+
+    Attributes:
+        filesystem (fsspec.AbstractFileSystem): The wrapped filesystem
+        cache_dir (str): Local folder holding the cached copies
+        max_cache_bytes (int): Size limit of the local copies
+        info_ttl (float): Seconds for which remote metadata is reused without a new request
+    """
+
+    def __init__(self, filesystem, cache_dir=None, max_cache_bytes=100 * 1024 * 1024, info_ttl=2.0):
+        """
+        Initialize the cache for a filesystem.
+
+        Args:
+            filesystem (fsspec.AbstractFileSystem): The filesystem to cache
+            cache_dir (str, optional): Local folder for the cached copies. Defaults to a folder in the temp directory.
+            max_cache_bytes (int, optional): Size limit of the local copies. Defaults to 100 MB.
+            info_ttl (float, optional): Seconds for which remote metadata is reused. Defaults to 2.0.
+        """
+        self.filesystem = filesystem
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), 'wbc_app_cache')
+        self.max_cache_bytes = max_cache_bytes
+        self.info_ttl = info_ttl
+        self._index = {}  # remote path -> metadata of the local copy
+        self._info = {}  # remote path -> (fetch time, remote info or None)
+        self._usage = {}  # local file name -> [size, last access time] of every copy on disk
+        self._lock = threading.RLock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """
+        Registers the local copies that are already on disk, e.g. from an earlier process.
+        """
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith('.') and not entry.name.endswith('.meta'):
+                    stat = entry.stat()
+                    self._usage[entry.name] = [stat.st_size, max(stat.st_atime, stat.st_mtime)]
+
+    def __getattr__(self, name):
+        # everything that is not cached is delegated to the wrapped filesystem
+        return getattr(self.filesystem, name)
+
+    def _local_path(self, path):
+        return os.path.join(self.cache_dir, hashlib.sha256(path.encode('utf-8')).hexdigest())
+
+    @staticmethod
+    def _validation_key(info):
+        """
+        Builds the key that identifies a version of a remote file from its metadata.
+        """
+        modified = info.get('modified', info.get('mtime', info.get('created')))
+        return [info.get('etag'), info.get('size'), str(modified)]
+
+    def _remote_info(self, path):
+        """
+        Returns the metadata of a remote path, or None if it does not exist.
+        """
+        with self._lock:
+            cached = self._info.get(path)
+            if cached is not None and time.monotonic() - cached[0] < self.info_ttl:
+                return cached[1]
+        try:
+            info = self.filesystem.info(path)
+        except FileNotFoundError:
+            info = None
+        with self._lock:
+            self._info[path] = (time.monotonic(), info)
+        return info
+
+    def invalidate(self, path):
+        """
+        Forgets the cached metadata of a path, so the next access asks the remote filesystem again.
+        """
+        with self._lock:
+            self._info.pop(path, None)
+
+    def _get_entry(self, path):
+        """
+        Returns the metadata of the local copy, reading it from disk after a restart.
+        """
+        entry = self._index.get(path)
+        if entry is None:
+            try:
+                with open(self._local_path(path) + '.meta', 'r') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._index[path] = entry
+        return entry
+
+    def _temp_file(self):
+        """
+        Creates a temporary file in the cache folder and returns its file descriptor and path.
+        """
+        return tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp_')
+
+    def _write_atomic(self, file_path, data, text=False):
+        """
+        Writes a file by renaming a completely written temporary file, so readers never see a partial file.
+        """
+        fd, temp_path = self._temp_file()
+        try:
+            with os.fdopen(fd, 'w' if text else 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def _store(self, path, data, info):
+        """
+        Stores a local copy of a remote file and evicts old copies if the cache is full.
+        """
+        local_path = self._local_path(path)
+        self._write_atomic(local_path, data)
+        self._register(path, len(data), info)
+
+    def _register(self, path, size, info):
+        """
+        Records the metadata of a local copy that was just written.
+        """
+        local_path = self._local_path(path)
+        entry = {'key': self._validation_key(info), 'size': size, 'atime': time.time()}
+        with self._lock:
+            self._write_atomic(local_path + '.meta', json.dumps(entry), text=True)
+            self._index[path] = entry
+            self._usage[os.path.basename(local_path)] = [size, entry['atime']]
+            self._evict()
+
+    def _drop(self, path):
+        with self._lock:
+            self._index.pop(path, None)
+            self._remove_local(os.path.basename(self._local_path(path)))
+
+    def _remove_local(self, name):
+        self._usage.pop(name, None)
+        for file_path in (os.path.join(self.cache_dir, name), os.path.join(self.cache_dir, name + '.meta')):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        """
+        Removes the least recently used local copies until the cache fits into `max_cache_bytes`.
+        """
+        total = sum(size for size, _ in self._usage.values())
+        if total <= self.max_cache_bytes:
+            return
+        paths = {os.path.basename(self._local_path(path)): path for path in self._index}
+        for name, (size, _) in sorted(self._usage.items(), key=lambda item: item[1][1]):
+            if total <= self.max_cache_bytes:
+                break
+            total -= size
+            self._index.pop(paths.get(name), None)
+            self._remove_local(name)
+
+    def exists(self, path, **kwargs):
+        return self._remote_info(path) is not None
+
+    def info(self, path, **kwargs):
+        info = self._remote_info(path)
+        if info is None:
+            raise FileNotFoundError(path)
+        return info
+
+    def ls(self, path, detail=True, **kwargs):
+        """
+        Lists a remote folder and keeps the metadata of its entries, so reading them needs no further request.
+        """
+        entries = self.filesystem.ls(path, detail=True, **kwargs)
+        now = time.monotonic()
+        with self._lock:
+            for entry in entries:
+                self._info[entry['name']] = (now, entry)
+        return entries if detail else [entry['name'] for entry in entries]
+
+    def open(self, path, mode='rb', encoding='utf-8', **kwargs):
+        """
+        Open a file for reading (served from the cache if valid) or writing (written through).
+
+        Args:
+            path (str): The remote path
+            mode (str, optional): 'r', 'rb', 'w' or 'wb'. Defaults to 'rb'.
+            encoding (str, optional): Encoding for text modes. Defaults to 'utf-8'.
+
+        Returns:
+            A file-like object
+        """
+        if 'w' in mode:
+            binary = _WriteThroughFile(self, path)
+            return binary if 'b' in mode else io.TextIOWrapper(binary, encoding=encoding)
+
+        info = self._remote_info(path)
+        if info is None:
+            raise FileNotFoundError(path)
+
+        with self._lock:
+            entry = self._get_entry(path)
+            local_path = self._local_path(path)
+            if entry is not None and entry['key'] == self._validation_key(info) and os.path.exists(local_path):
+                entry['atime'] = time.time()
+                self._usage[os.path.basename(local_path)] = [entry['size'], entry['atime']]
+                return open(local_path, mode) if 'b' in mode else open(local_path, mode, encoding=encoding)
+
+        # stream the download into the cache folder instead of holding the whole file in memory
+        fd, temp_path = self._temp_file()
+        try:
+            with os.fdopen(fd, 'wb') as local, self.filesystem.open(path, 'rb') as remote:
+                shutil.copyfileobj(remote, local, 1024 * 1024)
+            size = os.path.getsize(temp_path)
+            # opened before the rename, so an eviction by another session cannot remove it under us
+            f = open(temp_path, mode) if 'b' in mode else open(temp_path, mode, encoding=encoding)
+            os.replace(temp_path, local_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._register(path, size, info)
+        return f
+
+    def _upload(self, path, data):
+        """
+        Writes data to the remote filesystem and keeps it as local copy.
+        """
+        with self.filesystem.open(path, 'wb') as f:
+            f.write(data)
+        self._uploaded(path, data)
+
+    def _uploaded(self, path, data):
+        self.invalidate(path)
+        info = self._remote_info(path)
+        if info is not None:
+            self._store(path, data, info)
+
+    def write_if_match(self, path, data, etag):
+        """
+        Uploads data only if the remote file still has the given ETag.
+
+        The condition is sent as HTTP precondition (`If-Match`, or `If-None-Match: *` for a new file),
+        so the server checks it and replaces the file in one step.
+
+        Args:
+            path (str): The remote path
+            data (bytes): The new file content
+            etag (str): The expected strong ETag, or None if the file must not exist yet
+
+        Returns:
+            bool: True if the file was written, False if it was changed or created in the meantime
+
+        Raises:
+            NotImplementedError: If the wrapped filesystem is no WebDAV filesystem
+        """
+        client = getattr(self.filesystem, 'client', None)
+        if not callable(getattr(client, 'request', None)):
+            raise NotImplementedError("Conditional writes need a WebDAV filesystem")
+        from webdav4.client import HTTPError  # installed with the WebDAV filesystem
+
+        headers = {'If-Match': etag} if etag is not None else {'If-None-Match': '*'}
+        try:
+            client.request('PUT', self.filesystem._strip_protocol(path), content=data, headers=headers)
+        except HTTPError as e:
+            if e.status_code == 412:  # Precondition Failed
+                self.invalidate(path)
+                return False
+            raise
+        self._uploaded(path, data)
+        return True
+
+    def mkdirs(self, path, exist_ok=False, **kwargs):
+        self.invalidate(path)
+        return self.filesystem.mkdirs(path, exist_ok=exist_ok, **kwargs)
+
+    def mv(self, path1, path2, *args, **kwargs):
+        """
+        Moves a remote file, e.g. a completely written temporary file onto its final path.
+
+        The metadata of both paths is invalidated. The local copy of `path1` becomes the copy of
+        `path2`, so the moved file is not downloaded again, and no entry of `path1` is left behind.
+        """
+        result = self.filesystem.mv(path1, path2, *args, **kwargs)
+        self.invalidate(path1)
+        self.invalidate(path2)
+        with self._lock:
+            entry = self._get_entry(path1)
+            source, target = self._local_path(path1), self._local_path(path2)
+            moved = entry is not None and os.path.exists(source)
+            if moved:
+                os.replace(source, target)
+                self._usage.pop(os.path.basename(source), None)
+            self._drop(path1)
+            if not moved:
+                self._drop(path2)
+        if moved:
+            info = self._remote_info(path2)
+            if info is not None:
+                self._register(path2, entry['size'], info)
+            else:
+                self._drop(path2)
+        return result
+
+    def rm(self, path, *args, **kwargs):
+        self.invalidate(path)
+        self._drop(path)
+        return self.filesystem.rm(path, *args, **kwargs)
+
+
+class _WriteThroughFile(io.BytesIO):
+    """
+    In-memory file that uploads its content through the cache when it is closed.
+    """
+
+    def __init__(self, cache, path):
+        super().__init__()
+        self._cache = cache
+        self._path = path
+
+    def close(self):
+        if not self.closed:
+            self._cache._upload(self._path, self.getvalue())
+        super().close()
@@ -0,0 +1,168 @@
+import time
+from collections.abc import Mapping
+import numpy as np
+
+
+class CellCounter(Mapping):
+    """
+    Counter for a fixed list of cell types with undo, redo and timing of the counted cells.
+
+    The counts are kept in an integer array in the order of `cell_types`. Every count is logged
+    as (cell index, monotonic time) in a ring buffer of fixed capacity, so the memory per counter
+    stays constant no matter how many cells are counted. Counting, undo and redo take constant time;
+    undo is possible for the last `capacity` counts.
+
+    The counter is a read-only mapping of cell type -> count, so it can be used wherever the
+    counts were a dict before (e.g. `dict(counter)` for saving).
+
+        >>> counter = CellCounter(["Monozyten", "Lymphozyten"])
+        >>> counter.increment("Monozyten")
+        >>> counter.undo()
+        'Monozyten'
+        >>> counter.redo()
+        'Monozyten'
+        >>> dict(counter)
+        {'Monozyten': 1, 'Lymphozyten': 0}
+
+    Attributes:
+        cell_types (tuple): The cell types in display order
+        capacity (int): Number of counts kept in the event log
+    """
+
+    def __init__(self, cell_types, capacity=1024):
+        """
+        Initialize a counter with all counts at zero.
+
+        Args:
+            cell_types (list): The cell types in display order (at most 127)
+            capacity (int, optional): Number of counts kept in the event log. Defaults to 1024.
+        """
+        self.cell_types = tuple(cell_types)
+        self.capacity = capacity
+        self._index = {cell: i for i, cell in enumerate(self.cell_types)}
+        self._counts = np.zeros(len(self.cell_types), dtype=np.int32)
+        self._event_cells = np.zeros(capacity, dtype=np.int8)
+        self._event_times = np.zeros(capacity, dtype=np.float64)
+        self._start = 0  # ring buffer position of the oldest logged count
+        self._size = 0  # number of logged counts that are applied
+        self._redo = 0  # number of undone counts after them that can be redone
+
+    def __getitem__(self, cell):
+        return int(self._counts[self._index[cell]])
+
+    def __iter__(self):
+        return iter(self.cell_types)
+
+    def __len__(self):
+        return len(self.cell_types)
+
+    @property
+    def counts(self):
+        """
+        The counts as integer array in the order of `cell_types`.
+        """
+        return self._counts.copy()
+
+    @property
+    def total(self):
+        return int(self._counts.sum())
+
+    def increment(self, cell):
+        """
+        Count one cell. Counts that were undone can no longer be redone afterwards.
+
+        Args:
+            cell (str): The cell type
+
+        Raises:
+            KeyError: If the cell type is unknown
+        """
+        index = self._index[cell]
+        if self._size == self.capacity:
+            self._start = (self._start + 1) % self.capacity  # the oldest count can no longer be undone
+            self._size -= 1
+        position = (self._start + self._size) % self.capacity
+        self._event_cells[position] = index
+        self._event_times[position] = time.monotonic()
+        self._size += 1
+        self._redo = 0
+        self._counts[index] += 1
+
+    def undo(self):
+        """
+        Take back the last count.
+
+        Returns:
+            str: The cell type of the undone count, or None if there is nothing to undo
+        """
+        if self._size == 0:
+            return None
+        self._size -= 1
+        self._redo += 1
+        index = self._event_cells[(self._start + self._size) % self.capacity]
+        self._counts[index] -= 1
+        return self.cell_types[index]
+
+    def redo(self):
+        """
+        Count the last undone cell again.
+
+        Returns:
+            str: The cell type of the redone count, or None if there is nothing to redo
+        """
+        if self._redo == 0:
+            return None
+        position = (self._start + self._size) % self.capacity
+        self._event_times[position] = time.monotonic()
+        self._size += 1
+        self._redo -= 1
+        index = self._event_cells[position]
+        self._counts[index] += 1
+        return self.cell_types[index]
+
+    def reset(self):
+        """
+        Set all counts to zero and clear the event log.
+        """
+        self._counts[:] = 0
+        self._start = self._size = self._redo = 0
+
+    def _positions(self, last=None):
+        size = self._size if last is None else min(last, self._size)
+        return (self._start + self._size - size + np.arange(size)) % self.capacity
+
+    def recent(self, last=None):
+        """
+        The cell types of the logged counts, oldest first.
+
+        Args:
+            last (int, optional): Only return the last `last` counts. Defaults to all logged counts.
+
+        Returns:
+            list: The cell types in the order they were counted
+        """
+        return [self.cell_types[index] for index in self._event_cells[self._positions(last)]]
+
+    def click_intervals(self):
+        """
+        The time in seconds between consecutive logged counts.
+
+        Returns:
+            np.ndarray: One interval less than logged counts
+        """
+        return np.diff(self._event_times[self._positions()])
+
+    def throughput(self, last=50):
+        """
+        Counting speed over the last counts.
+
+        Args:
+            last (int, optional): Number of counts to average over. Defaults to 50.
+
+        Returns:
+            float: Counted cells per minute, or None if fewer than two counts are logged
+        """
+        times = self._event_times[self._positions(last)]
+        if len(times) < 2 or times[-1] <= times[0]:
+            return None
+        return 60 * (len(times) - 1) / (times[-1] - times[0])
@@ -0,0 +1,262 @@
+import ast, hashlib, secrets
+from collections import Counter
+import numpy as np
+import pandas as pd
+from utils.reference_ranges import CELL_TYPES, evaluate_records
+
+# Percentages are rounded to one decimal (see evaluate_records), so 0.0 ... 100.0 % fit into 1001 bins
+_BIN_VALUES = np.arange(1001) / 10
+
+
+def _morphology_findings(value):
+    """
+    The (parameter, severity) pairs of a morphology result that are not 'Keine'.
+    """
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return []
+    if not isinstance(value, dict):
+        return []
+    return [(str(parameter), str(severity)) for parameter, severity in value.items()
+            if severity is not None and severity != "Keine"]
+
+
+class CohortStatistics:
+    """
+    Aggregated statistics of the saved results of all users, maintained incrementally.
+
+    For every cell type the statistics keep a histogram of the percentages and the number of values
+    below and above the reference range; the morphology findings are counted per parameter and severity.
+    Mean, standard deviation and percentiles are computed from the histograms, so reading the statistics
+    takes the same time for any number of records. The aggregates are stored as a small JSON file
+    (see `to_dict`) and updated with the records that are added or deleted, never rebuilt from all records.
+
+    The records of a user are only counted once the user is included with all records (`include`);
+    `add` ignores records of users that are not included yet. The file is shared by all users, so it
+    holds no usernames: included users are stored as hashes with a random salt of the file.
+
+        >>> statistics = CohortStatistics.from_dict(data_handler.load("data_statistics.json", initial_value={}))
+        >>> statistics.include("alice", data_df)
+        >>> statistics.add("alice", pd.DataFrame([record]))
+        >>> data_handler.save("data_statistics.json", statistics.to_dict())
+        >>> statistics.summary()
+
+    Attributes:
+        record_count (int): Number of records
+        counted (int): Number of records with a cell count
+        users (set): Salted hashes of the users whose records are included (see `includes`)
+        salt (str): Random salt of the user hashes, created with the first included user
+        applied (list): IDs of the latest applied updates, to apply a retried update only once
+    """
+
+    applied_limit = 100  # update IDs that are kept in `applied`
+
+    def __init__(self):
+        """
+        Initialize empty statistics.
+        """
+        self.record_count = 0
+        self.counted = 0
+        self.users = set()
+        self.salt = None
+        self.applied = []
+        self._histograms = np.zeros((len(CELL_TYPES), len(_BIN_VALUES)), dtype=np.int64)
+        self._low = np.zeros(len(CELL_TYPES), dtype=np.int64)
+        self._high = np.zeros(len(CELL_TYPES), dtype=np.int64)
+        self._findings = Counter()  # (parameter, severity) -> number of records
+
+    @classmethod
+    def from_dict(cls, content):
+        """
+        Creates the statistics from their stored form.
+
+        Args:
+            content (dict): The result of `to_dict`, an empty dict for empty statistics
+
+        Returns:
+            CohortStatistics: The statistics
+        """
+        statistics = cls()
+        statistics.record_count = int(content.get("record_count", 0))
+        statistics.counted = int(content.get("counted", 0))
+        statistics.salt = content.get("salt")
+        if statistics.salt is None:  # written with plain usernames
+            statistics.users = {statistics._user_hash(user) for user in content.get("users", [])}
+        else:
+            statistics.users = set(content.get("users", []))
+        statistics.applied = list(content.get("applied", []))
+        for cell, histogram in content.get("histograms", {}).items():
+            if cell in CELL_TYPES:
+                for bin_index, count in histogram.items():
+                    statistics._histograms[CELL_TYPES.index(cell), int(bin_index)] = count
+        for name, counts in (("low", statistics._low), ("high", statistics._high)):
+            for cell, count in content.get(name, {}).items():
+                if cell in CELL_TYPES:
+                    counts[CELL_TYPES.index(cell)] = count
+        statistics._findings = Counter({(parameter, severity): count for parameter, severity, count in content.get("findings", [])})
+        return statistics
+
+    def to_dict(self):
+        """
+        The stored form of the statistics. Histograms only hold the filled bins (percentage x 10 -> count).
+
+        Returns:
+            dict: JSON serializable statistics
+        """
+        return {
+            "record_count": self.record_count,
+            "counted": self.counted,
+            "salt": self.salt,
+            "users": sorted(self.users),
+            "applied": self.applied[-self.applied_limit:],
+            "histograms": {cell: {str(bin_index): int(histogram[bin_index]) for bin_index in histogram.nonzero()[0]}
+                           for cell, histogram in zip(CELL_TYPES, self._histograms)},
+            "low": {cell: int(count) for cell, count in zip(CELL_TYPES, self._low)},
+            "high": {cell: int(count) for cell, count in zip(CELL_TYPES, self._high)},
+            "findings": [[parameter, severity, count] for (parameter, severity), count in self._findings.items()],
+        }
+
+    def _add(self, data, sign):
+        evaluation = evaluate_records(data)
+        counted = evaluation["totals"] > 0
+        bins = np.clip(np.rint(evaluation["percentages"][counted] * 10), 0, len(_BIN_VALUES) - 1).astype(int)
+        flags = evaluation["flags"][counted]
+        for cell in range(len(CELL_TYPES)):
+            np.add.at(self._histograms[cell], bins[:, cell], sign)
+        self._low += sign * (flags < 0).sum(axis=0)
+        self._high += sign * (flags > 0).sum(axis=0)
+        self.counted += sign * int(counted.sum())
+        self.record_count += sign * len(data)
+        morphology = data["morphology_results"] if "morphology_results" in data.columns else pd.Series()
+        if isinstance(morphology.dtype, pd.ArrowDtype) and morphology.dtype.type is dict:
+            for field in morphology.dtype.pyarrow_dtype:  # struct column: count the severities per parameter
+                for severity, count in morphology.struct.field(field.name).value_counts().items():
+                    if severity != "Keine":
+                        self._findings[(field.name, str(severity))] += sign * int(count)
+        else:
+            for value in morphology:
+                for finding in _morphology_findings(value):
+                    self._findings[finding] += sign
+        self._findings = +self._findings  # drops findings that no record has anymore
+
+    def _user_hash(self, user):
+        if self.salt is None:
+            self.salt = secrets.token_hex(16)
+        return hashlib.sha256(f"{self.salt}:{user}".encode("utf-8")).hexdigest()
+
+    def includes(self, user):
+        """
+        Checks whether the records of a user are included.
+
+        Args:
+            user (str): The username
+
+        Returns:
+            bool: True if the user is included
+        """
+        return self.salt is not None and self._user_hash(user) in self.users
+
+    def include(self, user, data):
+        """
+        Adds all records of a user that is not included yet.
+
+        Args:
+            user (str): The user the records belong to
+            data (pd.DataFrame): All records of the user
+
+        Returns:
+            bool: True if the records were added, False if the user was already included
+        """
+        if self.includes(user):
+            return False
+        self.users.add(self._user_hash(user))
+        self._add(data, 1)
+        return True
+
+    def add(self, user, data, sign=1):
+        """
+        Adds records of an included user, or removes deleted records with `sign=-1`.
+
+        Args:
+            user (str): The user the records belong to
+            data (pd.DataFrame): The added or deleted records
+            sign (int, optional): 1 to add, -1 to remove the records. Defaults to 1.
+
+        Returns:
+            bool: True if the statistics changed, False if the user is not included yet
+        """
+        if not self.includes(user) or data.empty:
+            return False
+        self._add(data, sign)
+        return True
+
+    def percentiles(self, quantiles):
+        """
+        Percentiles of the percentages per cell type (nearest rank).
+
+        Args:
+            quantiles (list): Quantiles between 0 and 1, e.g. [0.25, 0.5, 0.75]
+
+        Returns:
+            np.ndarray: Values with shape (cell types, quantiles), NaN if no record has a cell count
+        """
+        if not self.counted:
+            return np.full((len(CELL_TYPES), len(quantiles)), np.nan)
+        ranks = np.maximum(np.ceil(np.asarray(quantiles) * self.counted), 1)
+        cumulative = self._histograms.cumsum(axis=1)
+        return np.array([_BIN_VALUES[np.searchsorted(row, ranks)] for row in cumulative])
+
+    def summary(self):
+        """
+        Distribution of the percentages and share of values outside of the reference range per cell type.
+
+        Returns:
+            pd.DataFrame: One row per cell type
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = self._histograms @ _BIN_VALUES / self.counted
+            variance = self._histograms @ _BIN_VALUES ** 2 / self.counted - mean ** 2
+            low_share, high_share = self._low / self.counted, self._high / self.counted
+        p5, p25, median, p75, p95 = self.percentiles([0.05, 0.25, 0.5, 0.75, 0.95]).T
+        return pd.DataFrame({
+            "Mittelwert (%)": mean,
+            "Standardabweichung (%)": np.sqrt(np.maximum(variance, 0)),
+            "P5 (%)": p5,
+            "P25 (%)": p25,
+            "Median (%)": median,
+            "P75 (%)": p75,
+            "P95 (%)": p95,
+            "Anteil erniedrigt": low_share,
+            "Anteil erhöht": high_share,
+        }, index=list(CELL_TYPES)).round(2)
+
+    def histogram(self, cell_type, bin_width=5):
+        """
+        Number of records per percentage range of a cell type, e.g. for a bar chart.
+
+        Args:
+            cell_type (str): One of CELL_TYPES
+            bin_width (int, optional): Width of the ranges in percent. Defaults to 5.
+
+        Returns:
+            pd.Series: Number of records, indexed by the lower bound of the range; 100 % is counted in the last range
+        """
+        counts = self._histograms[CELL_TYPES.index(cell_type)]
+        lower_bounds = (np.minimum(_BIN_VALUES, _BIN_VALUES[-2]) // bin_width * bin_width).astype(int)
+        return pd.Series(counts).groupby(lower_bounds).sum()
+
+    def morphology_findings(self, top=10):
+        """
+        The most frequent morphology findings.
+
+        Args:
+            top (int, optional): Number of findings. Defaults to 10.
+
+        Returns:
+            pd.DataFrame: Parameter, severity, number and share of records, most frequent first
+        """
+        rows = [(parameter, severity, count, count / self.record_count)
+                for (parameter, severity), count in self._findings.most_common(top)]
+        return pd.DataFrame(rows, columns=["Parameter", "Schweregrad", "Anzahl", "Anteil"]).round({"Anteil": 2})
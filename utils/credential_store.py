@@ -0,0 +1,314 @@
+import copy, secrets, threading, time
+from collections.abc import MutableMapping
+from types import MappingProxyType
+
+
+class CredentialStore:
+    """
+    Storage for the user credentials used by LoginManager.
+
+    The credentials are kept in memory as a dict by (lower case) username, so a lookup does not
+    depend on the number of users. They are persisted as a JSON snapshot plus a journal folder:
+    every registration or change of a user is written as a small JSON file holding only that user,
+    instead of dumping all credentials again. Loading reads the snapshot and replays the journal;
+    once the journal holds `compaction_threshold` entries, it is folded into a new snapshot.
+
+    The store is meant to be shared by all sessions of the process (see LoginManager). A session
+    works on a `view`, which copies only the users it reads. `refresh` only reads journal entries
+    written by other processes since the last load, and with `max_age` at most once in that time.
+    Existing credentials in the original YAML file are migrated on first load.
+
+        >>> store = CredentialStore(data_handler)
+        >>> store.load()
+        >>> store.get("jdoe")
+        {'email': ..., 'password': ...}
+        >>> store.save_user("jdoe", {"email": "jdoe@example.com", "password": "$2b$12$..."})
+
+    Attributes:
+        data_handler (DataHandler): Handler for the folder the credentials are stored in
+        folder (str): Folder holding the snapshot and the journal
+        legacy_file_name (str): YAML file with credentials that is migrated if no snapshot exists yet
+        compaction_threshold (int): Number of journal entries after which the journal is compacted
+        usernames (dict): Username -> credentials of the user
+        journal_entries (list): Journal entries that are already contained in `usernames`
+        snapshot_version (str): Version of the snapshot `usernames` is based on
+        refreshed_at (float): Time of the last load or refresh (time.monotonic)
+    """
+
+    snapshot_name = 'credentials.json'
+    journal_name = 'journal'
+    write_attempts = 10  # conditional snapshot writes that fail because of concurrent compactions before giving up
+
+    def __init__(self, data_handler, folder='credentials', legacy_file_name='credentials.yaml',
+                 compaction_threshold=100):
+        """
+        Initialize an empty credential store.
+
+        Args:
+            data_handler (DataHandler): Handler for the folder the credentials are stored in
+            folder (str, optional): Folder holding the snapshot and the journal. Defaults to 'credentials'.
+            legacy_file_name (str, optional): YAML file that is migrated on first load. Defaults to 'credentials.yaml'.
+            compaction_threshold (int, optional): Number of journal entries after which the journal is compacted.
+                Defaults to 100.
+        """
+        self.data_handler = data_handler
+        self.folder = folder
+        self.legacy_file_name = legacy_file_name
+        self.compaction_threshold = compaction_threshold
+        self.usernames = {}
+        self.journal_entries = []
+        self.snapshot_version = None
+        self.refreshed_at = None
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    @property
+    def snapshot_file(self):
+        return self.data_handler.join(self.folder, self.snapshot_name)
+
+    @property
+    def journal_folder(self):
+        return self.data_handler.join(self.folder, self.journal_name)
+
+    def _list_journal(self):
+        return [name for name in self.data_handler.listdir(self.journal_folder) if name.endswith('.json')]
+
+    def _replay(self, entries):
+        for entry in entries:
+            users = self.data_handler.load(self.data_handler.join(self.journal_folder, entry))
+            for username, credentials in users.items():
+                if credentials is None:
+                    self.usernames.pop(username, None)
+                else:
+                    self.usernames[username] = credentials
+        self.journal_entries.extend(entries)
+
+    def load(self):
+        """
+        Load the snapshot and replay the journal. Migrates the legacy YAML file if no snapshot exists.
+
+        Returns:
+            dict: Username -> credentials of the user
+        """
+        with self._lock:
+            self.snapshot_version = self.data_handler.version(self.snapshot_file)
+            if self.snapshot_version is not None:
+                snapshot = self.data_handler.load(self.snapshot_file)
+            else:
+                snapshot = self._migrate()
+            self.usernames = {username.lower(): credentials
+                              for username, credentials in snapshot.get('usernames', {}).items()}
+            self.journal_entries = []
+            self._replay(self._list_journal())
+            self._loaded = True
+            self.refreshed_at = time.monotonic()
+            return self.usernames
+
+    def _migrate(self):
+        """
+        Reads the legacy YAML credentials and writes them as snapshot. The legacy file is kept untouched.
+        """
+        if self.legacy_file_name is None or not self.data_handler.exists(self.legacy_file_name):
+            return {'usernames': {}}
+
+        from streamlit_authenticator.utilities.hasher import Hasher
+        legacy = self.data_handler.load(self.legacy_file_name) or {}
+        usernames = {}
+        for username, credentials in (legacy.get('usernames') or {}).items():
+            credentials = dict(credentials)
+            if 'password' in credentials and not Hasher.is_hash(credentials['password']):
+                credentials['password'] = Hasher.hash(credentials['password'])
+            usernames[username.lower()] = credentials
+
+        snapshot = {'usernames': usernames}
+        self.data_handler.makedirs(self.folder)
+        if not self.data_handler.save_if_version(self.snapshot_file, snapshot, None):
+            snapshot = self.data_handler.load(self.snapshot_file)  # migrated by another process meanwhile
+        self.snapshot_version = self.data_handler.version(self.snapshot_file)
+        return snapshot
+
+    def refresh(self, max_age=None):
+        """
+        Read the changes written by other processes since the last load.
+
+        Only new journal entries are read. If the snapshot was replaced in the meantime, the store
+        is loaded again completely.
+
+        Args:
+            max_age (float, optional): Seconds after the last load or refresh during which the store
+                is not checked again. Defaults to None (always check).
+
+        Returns:
+            dict: Username -> credentials of the user
+        """
+        with self._lock:
+            if not self._loaded:
+                return self.load()
+            if max_age is not None and time.monotonic() - self.refreshed_at < max_age:
+                return self.usernames
+            self.refreshed_at = time.monotonic()
+            known = set(self.journal_entries)
+            entries = self._list_journal()
+            if self.data_handler.version(self.snapshot_file) != self.snapshot_version or not known.issubset(entries):
+                return self.load()
+            self._replay([entry for entry in entries if entry not in known])
+            return self.usernames
+
+    def get(self, username):
+        """
+        Get the credentials of a user.
+
+        Args:
+            username (str): The username (case insensitive)
+
+        Returns:
+            dict: A copy of the credentials of the user, or None if the user does not exist
+        """
+        with self._lock:
+            return copy.deepcopy(self.usernames.get(username.lower()))
+
+    def view(self, max_age=None):
+        """
+        Get a view of the credentials for one session.
+
+        The view copies the credentials of a user only when the session reads them (e.g. the user
+        logging in), so a session (e.g. streamlit_authenticator updating failed login attempts) can
+        change them while other sessions register users. See CredentialView.
+
+        Args:
+            max_age (float, optional): See `refresh`; a lookup of an unknown user refreshes the store
+                at most once in that time. Defaults to None.
+
+        Returns:
+            CredentialView: Username -> credentials of the user
+        """
+        return CredentialView(self, max_age)
+
+    def __contains__(self, username):
+        return username.lower() in self.usernames
+
+    def __len__(self):
+        return len(self.usernames)
+
+    def save_user(self, username, credentials):
+        """
+        Store the credentials of a single user by writing one journal entry.
+
+        Args:
+            username (str): The username (case insensitive)
+            credentials (dict): The credentials of the user, None to delete the user
+        """
+        username = username.lower()
+        with self._lock:
+            self.data_handler.makedirs(self.journal_folder)
+            entry = f"{time.time_ns():020d}_{secrets.token_hex(4)}.json"
+            self.data_handler.save(self.data_handler.join(self.journal_folder, entry), {username: credentials})
+            self.journal_entries.append(entry)
+            if credentials is None:
+                self.usernames.pop(username, None)
+            else:
+                self.usernames[username] = copy.deepcopy(credentials)
+
+            if len(self.journal_entries) >= self.compaction_threshold:
+                try:
+                    self.compact()
+                except RuntimeError:
+                    pass  # the user is saved in the journal, compacted with a later save
+
+    def compact(self):
+        """
+        Write all credentials as new snapshot and drop the journal entries it contains.
+
+        Journal entries written by other processes are read first, so their users are kept. The
+        snapshot is only replaced if no other process compacted in the meantime, otherwise the
+        store is loaded again and the compaction is repeated.
+
+        Raises:
+            RuntimeError: If other processes replaced the snapshot during every attempt
+        """
+        with self._lock:
+            for _ in range(self.write_attempts):
+                self.refresh()
+                self.data_handler.makedirs(self.folder)
+                if self.data_handler.save_if_version(self.snapshot_file, {'usernames': self.usernames},
+                                                     self.snapshot_version):
+                    break
+            else:
+                raise RuntimeError(f"CredentialStore: {self.snapshot_file} was changed concurrently, compaction skipped")
+
+            for entry in self.journal_entries:
+                self.data_handler.remove(self.data_handler.join(self.journal_folder, entry))
+            self.journal_entries = []
+            self.snapshot_version = self.data_handler.version(self.snapshot_file)
+
+
+class CredentialView(MutableMapping):
+    """
+    The credentials of a CredentialStore as seen by one session, used as `credentials['usernames']`
+    of streamlit_authenticator.
+
+    Reading a user (`view[username]`) copies the credentials of only this user into the view, so
+    the session can change them (failed login attempts, logged_in) without a copy of all users.
+    Written users (e.g. a registration) also stay in the view until they are saved with
+    `CredentialStore.save_user`. Iterating over all users (e.g. the email check of a registration)
+    gives read-only mappings of the stored credentials without copying them.
+
+    A lookup of a user that is not known refreshes the store (at most once per `max_age` seconds),
+    so users registered by other processes can log in.
+    """
+
+    def __init__(self, store, max_age=None):
+        self.store = store
+        self.max_age = max_age
+        self._users = {}
+        self._removed = set()
+
+    def _stored(self, username):
+        credentials = self.store.usernames.get(username)
+        if credentials is None and username not in self._removed:
+            credentials = self.store.refresh(self.max_age).get(username)
+        return credentials
+
+    def __getitem__(self, username):
+        username = username.lower()
+        if username not in self._users:
+            credentials = None if username in self._removed else self._stored(username)
+            if credentials is None:
+                raise KeyError(username)
+            with self.store._lock:
+                self._users[username] = copy.deepcopy(credentials)
+        return self._users[username]
+
+    def __setitem__(self, username, credentials):
+        username = username.lower()
+        self._removed.discard(username)
+        self._users[username] = credentials
+
+    def __delitem__(self, username):
+        username = username.lower()
+        if username not in self:
+            raise KeyError(username)
+        self._users.pop(username, None)
+        self._removed.add(username)
+
+    def __contains__(self, username):
+        username = username.lower() if isinstance(username, str) else username
+        return username in self._users or (username not in self._removed and self._stored(username) is not None)
+
+    def __iter__(self):
+        with self.store._lock:
+            stored = list(self.store.usernames)
+        yield from self._users
+        yield from (username for username in stored if username not in self._users and username not in self._removed)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def items(self):
+        with self.store._lock:
+            stored = {username: MappingProxyType(credentials) for username, credentials in self.store.usernames.items()}
+        stored.update(self._users)
+        return [(username, credentials) for username, credentials in stored.items() if username not in self._removed]
+
+    def values(self):
+        return [credentials for _, credentials in self.items()]
@@ -1,6 +1,9 @@
-import json, yaml, posixpath
+import ast, json, yaml, posixpath, threading, uuid
 import pandas as pd
-from io import StringIO
+from io import BytesIO
+
+# serializes the version check and the write of `save_if_version` on filesystems without preconditions
+_conditional_save_lock = threading.Lock()
 
 class DataHandler:
     def __init__(self, filesystem, root_path):
@@ -94,6 +97,76 @@ class DataHandler:
         with self.filesystem.open(full_path, "wb") as f:
             f.write(content)
 
+    def makedirs(self, relative_path):
+        """
+        Create a directory (and all missing parents) if it does not exist yet.
+
+        Args:
+            relative_path: The directory path relative to the root directory.
+        """
+        full_path = self._resolve_path(relative_path)
+        if not self.filesystem.exists(full_path):
+            self.filesystem.mkdirs(full_path, exist_ok=True)
+
+    def listdir(self, relative_path):
+        """
+        List the file names in a directory.
+
+        Args:
+            relative_path: The directory path relative to the root directory.
+
+        Returns:
+            A sorted list of file names (without directory part), or an empty list if the directory does not exist.
+        """
+        full_path = self._resolve_path(relative_path)
+        try:
+            entries = self.filesystem.ls(full_path, detail=False)
+        except FileNotFoundError:
+            return []
+        return sorted(posixpath.basename(entry.rstrip("/")) for entry in entries)
+
+    def remove(self, relative_path):
+        """
+        Delete a file if it exists.
+
+        Args:
+            relative_path: The path relative to the root directory.
+        """
+        full_path = self._resolve_path(relative_path)
+        if self.filesystem.exists(full_path):
+            self.filesystem.rm(full_path)
+
+    def invalidate(self, relative_path):
+        """
+        Forget cached metadata of a file, if the filesystem caches it.
+
+        Args:
+            relative_path: The path relative to the root directory.
+        """
+        invalidate = getattr(self.filesystem, 'invalidate', None)
+        if callable(invalidate):
+            invalidate(self._resolve_path(relative_path))
+
+    def version(self, relative_path):
+        """
+        Get a token that changes whenever the file is written.
+
+        Args:
+            relative_path: The path relative to the root directory.
+
+        Returns:
+            The ETag of the file, or its size and modification time if the filesystem has no ETags.
+            None if the file does not exist.
+        """
+        self.invalidate(relative_path)
+        try:
+            info = self.filesystem.info(self._resolve_path(relative_path))
+        except FileNotFoundError:
+            return None
+        if info.get('etag'):
+            return str(info['etag'])
+        return f"{info.get('size')}:{info.get('modified', info.get('mtime', info.get('created')))}"
+
     def load(self, relative_path, initial_value=None, **load_args):
         """
         Load data from a file based on its extension.
@@ -101,7 +174,8 @@ class DataHandler:
         Args:
             relative_path: The path relative to the root directory.
             initial_value: The value to return if the file does not exist. If None, raises FileNotFoundError.
-            **load_args: Additional arguments to pass to the file loader (pd.read_csv).
+            **load_args: Additional arguments to pass to the file loader (pd.read_csv). For CSV and Parquet files,
+                `usecols` reads only the given columns.
         Returns:
             Parsed data (e.g., DataFrame, dict, str, bytes) depending on the file type, or the initial value if provided.
         """
@@ -113,10 +187,14 @@ class DataHandler:
         ext = posixpath.splitext(relative_path)[-1].lower()
         if ext == ".json":
             return json.loads(self.read_text(relative_path))
+        elif ext == ".jsonl":
+            return [json.loads(line) for line in self.read_text(relative_path).splitlines() if line.strip()]
         elif ext in [".yaml", ".yml"]:
             return yaml.safe_load(self.read_text(relative_path))
         elif ext == ".csv":
-            return pd.read_csv(StringIO(self.read_text(relative_path)), **load_args)       
+            return self._read_csv(relative_path, **load_args)
+        elif ext == ".parquet":
+            return self._read_parquet(relative_path, **load_args)
         elif ext == ".txt":
             return self.read_text(relative_path)
         else:
@@ -133,24 +211,342 @@ class DataHandler:
         Raises:
             ValueError: If the content type doesn't match the file extension.
         """
-        full_path = self._resolve_path(relative_path)
-        parent_dir = posixpath.dirname(full_path)
+        data = self._serialize(relative_path, content)
+        self._ensure_parent(relative_path)
+        self.write_binary(relative_path, data)
 
-        # Ensure the parent directory exists
+    def save_if_version(self, relative_path, content, version):
+        """
+        Save data only if the file still has the given version, i.e. nobody has written it since it was read.
+
+        On filesystems that support HTTP preconditions (see CachedFileSystem.write_if_match), the server
+        checks the ETag and rejects the write atomically. Otherwise the version is compared right before
+        the file is replaced, which only excludes concurrent writes of the same process.
+
+        Args:
+            relative_path: The path relative to the root directory.
+            content: The content to save (e.g., DataFrame, dict, str, bytes).
+            version: The version returned by `version` when the file was read, None if it did not exist.
+
+        Returns:
+            True if the data was saved, False if the file has another version by now.
+
+        Raises:
+            ValueError: If the content type doesn't match the file extension.
+        """
+        data = self._serialize(relative_path, content)
+        self._ensure_parent(relative_path)
+
+        write_if_match = getattr(self.filesystem, "write_if_match", None)
+        # only strong ETags (quoted, see RFC 9110) can be checked by the server
+        if callable(write_if_match) and (version is None or version.startswith('"')):
+            try:
+                return write_if_match(self._resolve_path(relative_path), data, version)
+            except NotImplementedError:
+                pass
+
+        with _conditional_save_lock:
+            if self.version(relative_path) != version:
+                return False
+            # renamed into place, so readers without the lock never see a partially written file
+            temp_path = f"{relative_path}.{uuid.uuid4().hex}.tmp"
+            self.write_binary(temp_path, data)
+            self.filesystem.mv(self._resolve_path(temp_path), self._resolve_path(relative_path))
+            self.invalidate(relative_path)
+            return True
+
+    def _ensure_parent(self, relative_path):
+        parent_dir = posixpath.dirname(self._resolve_path(relative_path))
         if not self.filesystem.exists(parent_dir):
             self.filesystem.mkdirs(parent_dir, exist_ok=True)
 
+    def _serialize(self, relative_path, content):
+        """
+        Convert data to the file content for the format given by the file extension.
+
+        Args:
+            relative_path: The path relative to the root directory.
+            content: The content to save (e.g., DataFrame, dict, str, bytes).
+
+        Returns:
+            bytes: The file content, text formats are encoded as UTF-8.
+
+        Raises:
+            ValueError: If the content type doesn't match the file extension.
+        """
         ext = posixpath.splitext(relative_path)[-1].lower()
 
         if isinstance(content, pd.DataFrame) and ext == ".csv":
-            self.write_text(relative_path, content.to_csv(index=False))
+            text = content.to_csv(index=False)
+        elif isinstance(content, pd.DataFrame) and ext == ".parquet":
+            return self._to_parquet(content)
         elif isinstance(content, (dict, list)) and ext == ".json":
-            self.write_text(relative_path, json.dumps(content, indent=4))
+            text = json.dumps(content, indent=4)
+        elif isinstance(content, list) and ext == ".jsonl":
+            text = "".join(json.dumps(line, default=str) + "\n" for line in content)
         elif isinstance(content, (dict, list)) and ext in [".yaml", ".yml"]:
-            self.write_text(relative_path, yaml.dump(content, default_flow_style=False))
+            text = yaml.dump(content, default_flow_style=False)
         elif isinstance(content, str) and ext == ".txt":
-            self.write_text(relative_path, content)
+            text = content
         elif isinstance(content, bytes):
-            self.write_binary(relative_path, content)
+            return content
         else:
             raise ValueError(f"Unsupported content type for extension {ext}")
+        return text.encode("utf-8")
+
+    def _read_csv(self, relative_path, **load_args):
+        """
+        Read a CSV file by streaming the file object directly into the parser.
+
+        Args:
+            relative_path: The path relative to the root directory.
+            **load_args: Additional arguments to pass to pd.read_csv (e.g. usecols).
+
+        Returns:
+            The loaded DataFrame.
+        """
+        full_path = self._resolve_path(relative_path)
+        with self.filesystem.open(full_path, "r") as f:
+            return pd.read_csv(f, **load_args)
+
+    def _read_parquet(self, relative_path, parse_dates=None, usecols=None, **load_args):
+        """
+        Read a Parquet file into a DataFrame.
+
+        Nested columns (e.g. `counts`) are stored as structs and come back as typed struct columns,
+        so no per-row parsing is needed (see `_from_arrow`).
+
+        Args:
+            relative_path: The path relative to the root directory.
+            parse_dates: Columns to convert to datetime, for compatibility with the CSV loader.
+            usecols: Columns to read, for compatibility with the CSV loader; takes precedence over `columns`.
+            **load_args: Additional arguments to pass to pyarrow.parquet.read_table (e.g. columns).
+
+        Returns:
+            The loaded DataFrame.
+        """
+        import pyarrow.parquet as pq  # installed as engine of pd.read_parquet
+
+        full_path = self._resolve_path(relative_path)
+        columns = load_args.pop("columns", None)
+        if usecols is not None:
+            columns = list(usecols)
+        with self.filesystem.open(full_path, "rb") as f:
+            df = self._from_arrow(pq.read_table(f, columns=columns, **load_args))
+        return self.parse_dates(df, parse_dates)
+
+    @staticmethod
+    def parse_dates(df, columns):
+        """
+        Convert the given columns of a DataFrame to datetime, ignoring columns that do not exist.
+
+        Args:
+            df: The DataFrame to convert in place.
+            columns: The column names, or None.
+
+        Returns:
+            The DataFrame.
+        """
+        for column in columns or []:
+            if column in df.columns:
+                df[column] = pd.to_datetime(df[column], errors="coerce")
+        return df
+
+    @staticmethod
+    def _from_arrow(table):
+        """
+        Convert an Arrow table or record batch to a DataFrame.
+
+        Struct columns (e.g. `counts` with one typed field per cell type) stay typed Arrow columns, so
+        a field of all rows is read without Python objects (`df["counts"].struct.field("Monozyten")`),
+        while a single value is still a dict. Map columns of older files become dicts.
+        """
+        import pyarrow as pa  # installed as engine of pd.read_parquet
+
+        return table.to_pandas(maps_as_pydicts="strict",
+                               types_mapper=lambda arrow_type: pd.ArrowDtype(arrow_type) if pa.types.is_struct(arrow_type) else None)
+
+    @staticmethod
+    def is_struct(column):
+        """
+        Checks whether a column is a typed struct column as read from Parquet.
+
+        Args:
+            column: A pd.Series
+
+        Returns:
+            bool: True if the values are stored as Arrow structs
+        """
+        return isinstance(column.dtype, pd.ArrowDtype) and column.dtype.type is dict
+
+    @staticmethod
+    def _parse_dict(value):
+        """
+        Returns a dict value as dict with string keys, parsing Python reprs written by the CSV format.
+        Returns None for values that are no dicts.
+        """
+        if isinstance(value, str) and value.lstrip().startswith("{"):
+            try:
+                value = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                return None
+        if not isinstance(value, dict):
+            return None
+        return {str(key): item for key, item in value.items() if item is not None}
+
+    @staticmethod
+    def _value_type(items):
+        """
+        The Arrow type of dict values: int64 if all are integers, float64 if all are numbers, string otherwise.
+        """
+        import pyarrow as pa  # installed as engine of pd.read_parquet
+
+        if all(isinstance(item, int) and not isinstance(item, bool) for item in items):
+            return pa.int64()
+        if all(isinstance(item, (int, float)) and not isinstance(item, bool) for item in items):
+            return pa.float64()
+        return pa.string()
+
+    @classmethod
+    def _struct_array(cls, values):
+        """
+        Converts dicts (or their Python reprs) to an Arrow struct array with one typed field per key.
+
+        Returns:
+            The struct array, None if no value is a dict with at least one key.
+        """
+        import pyarrow as pa  # installed as engine of pd.read_parquet
+
+        dicts = [cls._parse_dict(value) for value in values]
+        keys = list(dict.fromkeys(key for value in dicts if value for key in value))
+        if not keys:
+            return None
+        fields = []
+        for key in keys:
+            value_type = cls._value_type([value[key] for value in dicts if value and key in value])
+            if value_type == pa.string():
+                dicts = [{**value, key: str(value[key])} if value and key in value else value for value in dicts]
+            fields.append(pa.field(key, value_type))
+        return pa.array(dicts, type=pa.struct(fields))
+
+    @staticmethod
+    def _conform_struct(array, struct_type, length):
+        """
+        Casts a struct array (or None for a missing column) to a struct type with more or wider fields.
+        """
+        import pyarrow as pa  # installed as engine of pd.read_parquet
+
+        if array is None:
+            return pa.nulls(length, struct_type)
+        children = dict(zip([field.name for field in array.type], array.flatten()))
+        arrays = [children[field.name].cast(field.type) if field.name in children else pa.nulls(length, field.type)
+                  for field in struct_type]
+        return pa.StructArray.from_arrays(arrays, fields=list(struct_type), mask=array.is_null())
+
+    @classmethod
+    def concat_records(cls, frames):
+        """
+        Concatenate DataFrames of records like `pd.concat(frames, ignore_index=True)`, keeping struct columns typed.
+
+        A column that is a struct column in any frame (see `is_struct`) is a struct column in the result,
+        with the fields of all frames. Dicts in that column of the other frames (e.g. appended records)
+        are converted; a field with integers in one frame and numbers in another becomes float64, other
+        differing types become strings.
+
+        Args:
+            frames (list): The DataFrames
+
+        Returns:
+            pd.DataFrame: The concatenated records with a new index
+        """
+        import pyarrow as pa  # installed as engine of pd.read_parquet
+
+        frames = list(frames)
+        columns = list(dict.fromkeys(column for frame in frames for column in frame.columns))
+        struct_columns = [column for column in columns
+                          if any(column in frame.columns and cls.is_struct(frame[column]) for frame in frames)]
+        if not struct_columns:
+            return pd.concat(frames, ignore_index=True)
+
+        data = pd.concat([frame.drop(columns=[column for column in struct_columns if column in frame.columns])
+                          for frame in frames], ignore_index=True)
+        for column in struct_columns:
+            arrays = []
+            for frame in frames:
+                if column not in frame.columns:
+                    arrays.append(None)
+                elif cls.is_struct(frame[column]):
+                    arrays.append(pa.array(frame[column].array))
+                else:
+                    arrays.append(cls._struct_array(frame[column].tolist()))
+            field_types = {}
+            for array in arrays:
+                for field in array.type if array is not None else []:
+                    current = field_types.setdefault(field.name, field.type)
+                    if current != field.type:
+                        numeric = {current, field.type} <= {pa.int64(), pa.float64()}
+                        field_types[field.name] = pa.float64() if numeric else pa.string()
+            struct_type = pa.struct([pa.field(name, field_type) for name, field_type in field_types.items()])
+            combined = pa.concat_arrays([cls._conform_struct(array, struct_type, len(frame))
+                                         for array, frame in zip(arrays, frames)])
+            data[column] = pd.arrays.ArrowExtensionArray(combined)
+        return data[columns]
+
+    @classmethod
+    def _to_columnar(cls, df):
+        """
+        Prepare a DataFrame for a typed columnar format.
+
+        Columns whose values are all dicts, or Python reprs of dicts as written by the CSV format,
+        become struct columns with one typed field per key (e.g. one int64 field per cell type, see
+        `_value_type`). A column of empty dicts only becomes a map column, since a struct needs a field.
+        Struct columns that were read from Parquet are written as they are. Other columns with mixed
+        value types (e.g. `age`) are stored as strings.
+
+        Args:
+            df: The DataFrame to convert.
+
+        Returns:
+            tuple: A converted copy of the DataFrame and the Arrow map type per column of empty dicts.
+        """
+        import pyarrow as pa  # installed as engine of pd.read_parquet
+
+        df = df.copy()
+        map_types = {}
+        for column in df.select_dtypes(include=['object', 'string']).columns:  # CSV text is 'str' in pandas 3
+            values = df[column].dropna()
+            if values.empty:
+                continue
+            if values.map(cls._parse_dict).notna().all():
+                array = cls._struct_array(df[column].tolist())
+                if array is not None:
+                    df[column] = pd.arrays.ArrowExtensionArray(array)
+                else:
+                    df[column] = df[column].map(lambda value: {} if isinstance(value, (dict, str)) else None)
+                    map_types[column] = pa.map_(pa.string(), pa.int64())
+            elif values.map(type).nunique() > 1:
+                df[column] = df[column].map(lambda v: v if pd.isna(v) else str(v))
+        return df, map_types
+
+    @classmethod
+    def _to_parquet(cls, df):
+        """
+        Serialize a DataFrame to Parquet with typed columns (see `_to_columnar`).
+
+        Args:
+            df: The DataFrame to serialize.
+
+        Returns:
+            bytes: The Parquet file content.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq  # installed as engine of pd.read_parquet
+
+        df, map_types = cls._to_columnar(df)
+        schema = pa.Schema.from_pandas(df.drop(columns=list(map_types)), preserve_index=False)
+        for column, map_type in map_types.items():
+            schema = schema.insert(list(df.columns).index(column), pa.field(column, map_type))
+        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+        buffer = BytesIO()
+        pq.write_table(table, buffer)
+        return buffer.getvalue()
@@ -1,7 +1,61 @@
-import fsspec, posixpath
+import copy, fsspec, posixpath
 import streamlit as st
+import numpy as np
 import pandas as pd
+from utils.cached_filesystem import CachedFileSystem
 from utils.data_handler import DataHandler
+from utils.cohort_statistics import CohortStatistics
+from utils.record_index import EvaluationIndex, RecordIndex, TextIndex, TimestampIndex
+from utils.record_store import PartitionedRecordStore, RecordStore
+from utils.shared_cache import SharedCache
+from utils.write_queue import WriteQueue
+
+@st.cache_resource(show_spinner=False)
+def _shared_webdav_filesystem(base_url, username, password, max_connections=10, cache_dir=None,
+                              max_cache_bytes=100 * 1024 * 1024):
+    """
+    Creates the WebDAV filesystem that is shared by all sessions of the server process.
+
+    All sessions use the same HTTP connection pool, so connections (and their TLS handshakes) are
+    reused across sessions instead of being opened per browser session. The pool keeps idle
+    connections alive and never opens more than `max_connections` connections; further requests
+    wait for a free connection. The httpx client and the cache are thread-safe.
+
+    Args:
+        base_url (str): URL of the WebDAV server
+        username (str): WebDAV user name
+        password (str): WebDAV password
+        max_connections (int, optional): Maximum number of open connections. Defaults to 10.
+        cache_dir (str, optional): Folder of the local read cache. Defaults to None (temp directory).
+        max_cache_bytes (int, optional): Size limit of the local read cache. Defaults to 100 MB.
+
+    Returns:
+        CachedFileSystem: The shared, cached WebDAV filesystem
+    """
+    import httpx  # installed with webdav4
+
+    webdav_fs = fsspec.filesystem(
+        'webdav',
+        base_url=base_url,
+        auth=(username, password),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60
+        ),
+        timeout=httpx.Timeout(30, pool=60),
+        skip_instance_cache=True
+    )
+    return CachedFileSystem(webdav_fs, cache_dir=cache_dir, max_cache_bytes=max_cache_bytes)
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_app_data_cache(max_bytes=100 * 1024 * 1024):
+    """
+    Creates the cache of read-only app data that is shared by all sessions of the process.
+    """
+    return SharedCache(max_bytes)
+
 
 class DataManager:
     """
@@ -25,12 +79,19 @@ class DataManager:
         fs_root_folder (str): Root directory for all file operations
         app_data_reg (dict): Registry of application-wide data files
         user_data_reg (dict): Registry of user-specific data files
+        record_store_reg (dict): Registry of append-only record stores by session state key
+        record_index_reg (dict): Registry of record indexes by session state key
+        search_store_reg (dict): Registry of the record stores holding the search tokens by session state key
+        statistics_reg (dict): Registry of the files with the cohort statistics of records by session state key
+        write_queue (WriteQueue): Background queue that performs all writes of this instance
         - Uses fsspec for filesystem operations
         - Requires Streamlit session state for persistence
         - Automatically manages user data separation
         - Implements data registry for tracking stored files
     """
 
+    record_id_column = 'record_id'
+
     def __new__(cls, *args, **kwargs):
         """
         Implements singleton pattern by returning existing instance from session state if available.
@@ -59,6 +120,11 @@ class DataManager:
             fs: Filesystem interface instance
             app_data_reg (dict): Registry for application-wide data
             user_data_reg (dict): Registry for user-specific data
+            record_store_reg (dict): Registry for append-only record stores
+            record_index_reg (dict): Registry for record indexes
+            search_store_reg (dict): Registry for the record stores of the search tokens
+            statistics_reg (dict): Registry for the files with the cohort statistics
+            write_queue (WriteQueue): Background queue for all writes
         """
         if hasattr(self, 'fs'):  # check if instance is already initialized
             return
@@ -68,6 +134,11 @@ class DataManager:
         self.fs = self._init_filesystem(fs_protocol)
         self.app_data_reg = {}
         self.user_data_reg = {}
+        self.record_store_reg = {}
+        self.record_index_reg = {}
+        self.search_store_reg = {}
+        self.statistics_reg = {}
+        self.write_queue = WriteQueue()
 
     @staticmethod
     def _init_filesystem(protocol: str):
@@ -75,6 +146,9 @@ class DataManager:
         Creates and configures an fsspec filesystem instance.
 
         Supports WebDAV protocol using credentials from Streamlit secrets, and local filesystem access.
+        WebDAV files are served from a validated local cache (see CachedFileSystem). Its folder and size
+        limit can be set with the optional secrets `cache_dir` and `cache_max_mb`. The WebDAV filesystem
+        is shared by all sessions of the server process (see `_shared_webdav_filesystem`).
         
         Args:
             protocol: The filesystem protocol to initialize ('webdav' or 'file')
@@ -88,10 +162,13 @@ class DataManager:
         if protocol == 'webdav':
             try:
                 secrets = st.secrets['webdav']
-                return fsspec.filesystem(
-                    'webdav',
-                    base_url=secrets['base_url'],
-                    auth=(secrets['username'], secrets['password'])
+                return _shared_webdav_filesystem(
+                    secrets['base_url'],
+                    secrets['username'],
+                    secrets['password'],
+                    max_connections=int(secrets.get('max_connections', 10)),
+                    cache_dir=secrets.get('cache_dir'),
+                    max_cache_bytes=int(secrets.get('cache_max_mb', 100)) * 1024 * 1024
                 )
             except KeyError as e:
                 st.error(f"Fehler: Der Schlüssel '{e.args[0]}' fehlt in secrets.toml. Bitte überprüfen Sie die Datei.")
@@ -130,13 +207,20 @@ class DataManager:
             None: The loaded data is stored directly in Streamlit's session state
 
         Note:
-            The method also registers the file name in the app_data_reg dictionary using the session_state_key
+            The method also registers the file name in the app_data_reg dictionary using the session_state_key.
+            App data is read-only: all sessions share one in-memory copy per file version, which is only
+            loaded again when the file changes.
         """
         if session_state_key in st.session_state:
             return
         
         dh = self._get_data_handler()
-        data = dh.load(file_name, initial_value, **load_args)
+        version = dh.version(file_name)
+        if version is None:
+            data = dh.load(file_name, initial_value, **load_args)
+        else:
+            key = (type(self.fs).__name__, dh.join(dh.root_path, file_name), repr(sorted(load_args.items())))
+            data = _shared_app_data_cache().get(key, version, lambda: dh.load(file_name, **load_args))
         st.session_state[session_state_key] = data
         self.app_data_reg[session_state_key] = file_name
 
@@ -163,9 +247,7 @@ class DataManager:
         """
         username = st.session_state.get('username', None)
         if username is None:
-            for key in self.user_data_reg:  # delete all user data
-                st.session_state.pop(key)
-            self.user_data_reg = {}
+            self._clear_user_data()
             st.error(f"DataManager: No user logged in, cannot load file `{file_name}` into session state with key `{session_state_key}`")
             return
         elif session_state_key in st.session_state:
@@ -178,6 +260,403 @@ class DataManager:
         st.session_state[session_state_key] = data
         self.user_data_reg[session_state_key] = dh.join(user_data_folder, file_name)
 
+    def load_user_records(self, session_state_key, file_name, initial_value=None, compaction_threshold=50,
+                          snapshot_format=None, partition_by=None, order_by=None, statistics_file=None, **load_args):
+        """
+        Load user-specific records (a DataFrame) backed by an append-only record store.
+
+        In contrast to `load_user_data`, records added with `append_record` are written to a journal
+        next to the file, so a save only transfers the new record. The journal is folded into the
+        file once it holds `compaction_threshold` entries, or whenever `save_data` is called.
+
+        Every record gets a stable ID in the column `record_id`, which is used by `delete_records`.
+
+        With `partition_by`, the records are split into one partition per value of that column
+        (see PartitionedRecordStore), stored in a folder named like `file_name` without extension.
+        Existing records in `file_name` are migrated into the partitions on first load. Only the
+        manifest of the partitions is read here and the session state holds `initial_value`; the
+        partitions are loaded when they are needed with `load_record_partitions`, and
+        `get_record_partitions` lists them without loading any records.
+
+        With `statistics_file`, the records of all users are aggregated in one app-wide file (see
+        CohortStatistics and `get_cohort_statistics`). The records of the user are added to it on the
+        first load, later appends and deletes update it in the background.
+
+        Args:
+            session_state_key (str): Key under which the data will be stored in Streamlit's session state
+            file_name (str): Name of the snapshot file (e.g. 'data.csv')
+            initial_value: Default value if neither the file nor a journal exist (default: None)
+            compaction_threshold (int, optional): Journal entries after which the journal is compacted. Defaults to 50.
+            snapshot_format (str, optional): Store the snapshot in another format than given by `file_name`,
+                e.g. 'parquet' for typed columns instead of Python reprs in CSV cells. Defaults to None.
+            partition_by (str, optional): Column to partition the records by, e.g. 'patient_id'. Defaults to None.
+            order_by (str, optional): Column to sort partitioned records by after loading. Defaults to None.
+            statistics_file (str, optional): App-wide JSON file with the aggregated statistics of the records
+                of all users, e.g. 'data_statistics.json'. Defaults to None.
+            **load_args: Additional arguments to pass to the data handler's load method
+        """
+        username = st.session_state.get('username', None)
+        if username is None:
+            self._clear_user_data()
+            st.error(f"DataManager: No user logged in, cannot load file `{file_name}` into session state with key `{session_state_key}`")
+            return
+        elif session_state_key in st.session_state:
+            return
+
+        user_data_folder = 'user_data_' + username
+
+        dh = self._get_data_handler(user_data_folder)
+        store_path = posixpath.splitext(file_name)[0] if partition_by is not None else file_name
+
+        def open_store():
+            store = RecordStore(dh, file_name, compaction_threshold=compaction_threshold, snapshot_format=snapshot_format,
+                                id_column=self.record_id_column)
+            if partition_by is None:
+                return store
+            return PartitionedRecordStore(dh, store_path, partition_by, compaction_threshold=compaction_threshold,
+                                          snapshot_format=snapshot_format, order_by=order_by, legacy_store=store,
+                                          id_column=self.record_id_column)
+
+        store = open_store()
+        if partition_by is not None:
+            store.open(**load_args)
+            data = initial_value if initial_value is not None else pd.DataFrame()
+        else:
+            store_path = store.file_name
+            data = store.load(initial_value, **load_args)
+        st.session_state[session_state_key] = data
+        self.user_data_reg[session_state_key] = dh.join(user_data_folder, store_path)
+        self.record_store_reg[session_state_key] = store
+        if isinstance(data, pd.DataFrame) and store.needs_compaction:
+            self.write_queue.submit(self.user_data_reg[session_state_key], lambda: store.compact(data))
+        if statistics_file is not None and isinstance(data, pd.DataFrame):
+            self.statistics_reg[session_state_key] = statistics_file
+            records = []  # read once in the background, only if the user is not included yet
+
+            def include(statistics):
+                if statistics.includes(username):
+                    return False
+                if not records:
+                    records.append(data if partition_by is None else open_store().load(pd.DataFrame(), **load_args))
+                return statistics.include(username, records[0])
+
+            self.write_queue.submit(statistics_file, self._update_statistics(session_state_key, include), coalesce=False)
+
+    def get_record_partitions(self, session_state_key):
+        """
+        Returns the partitions of partitioned records as listed in the manifest, without loading any records.
+
+        Args:
+            session_state_key (str): Key the records were loaded with via `load_user_records`
+
+        Returns:
+            dict: Partition value (e.g. patient ID) -> number of records, sorted by value,
+                or None if the records are not partitioned
+        """
+        store = self.record_store_reg.get(session_state_key)
+        if not isinstance(store, PartitionedRecordStore):
+            return None
+        return store.partition_counts()
+
+    def load_record_partitions(self, session_state_key, values=None):
+        """
+        Adds the records of partitions that are not loaded yet to the records in the session state,
+        e.g. all results of the selected patient.
+
+        Only the given partitions are read. Own writes that are still pending are finished first, so
+        the loaded partitions contain them. Records that are not partitioned are loaded completely by
+        `load_user_records` already.
+
+        Args:
+            session_state_key (str): Key the records were loaded with via `load_user_records`
+            values (list, optional): Partition values (e.g. patient IDs) to load. Defaults to None (all).
+
+        Returns:
+            bool: True if the records in the session state changed
+        """
+        store = self.record_store_reg.get(session_state_key)
+        if not isinstance(store, PartitionedRecordStore) or store.complete or session_state_key not in st.session_state:
+            return False
+        if values is not None:
+            values = [value for value in values if store.partition_key(value) in store.manifest
+                      and store.partition_key(value) not in store.known_revisions]
+            if not values:
+                return False
+        self.flush_writes()
+
+        data = st.session_state[session_state_key]
+        loaded = store.load_partitions(data, values)
+        if loaded is data:
+            return False
+        st.session_state[session_state_key] = loaded
+        if store.needs_compaction:
+            # e.g. writes the combined snapshot once all partitions are loaded, so the next full load reads fewer files
+            self.write_queue.submit(self.user_data_reg[session_state_key], lambda: store.compact(loaded))
+        return True
+
+    def refresh_user_records(self, session_state_key):
+        """
+        Update the records in the session state with changes written by other sessions of the same user.
+
+        Only the journal entries and partitions that changed since the last load are read. The refresh
+        is skipped while own writes are pending, they are picked up by the next refresh.
+
+        Args:
+            session_state_key (str): Key the records were loaded with via `load_user_records`
+
+        Returns:
+            bool: True if the records in the session state changed
+        """
+        store = self.record_store_reg.get(session_state_key)
+        if store is None or session_state_key not in st.session_state or self.pending_writes:
+            return False
+
+        data = st.session_state[session_state_key]
+        refreshed = store.refresh(data)
+        if refreshed is data:
+            return False
+        st.session_state[session_state_key] = refreshed
+        return True
+
+    def get_record_index(self, session_state_key, column):
+        """
+        Returns an index of the records in the session state by the values of a column.
+
+        The index is built on first use and then kept up to date by `append_record` and `delete_records`.
+        It is rebuilt only if the records were replaced otherwise, e.g. by `refresh_user_records`.
+
+        Args:
+            session_state_key (str): Key identifying the DataFrame in the session state
+            column (str): The column to index, e.g. 'patient_id'
+
+        Returns:
+            RecordIndex: The index of the current records
+
+        Raises:
+            ValueError: If the session state value is not a DataFrame
+        """
+        return self._get_index(session_state_key, RecordIndex, column)
+
+    def get_timestamp_index(self, session_state_key, column='timestamp'):
+        """
+        Returns a sorted index of the records in the session state by a timestamp column, for time range queries.
+
+        Like `get_record_index`, the index is built on first use and kept up to date by `append_record`
+        and `delete_records`.
+
+        Args:
+            session_state_key (str): Key identifying the DataFrame in the session state
+            column (str, optional): The timestamp column. Defaults to 'timestamp'.
+
+        Returns:
+            TimestampIndex: The index of the current records
+
+        Raises:
+            ValueError: If the session state value is not a DataFrame
+        """
+        return self._get_index(session_state_key, TimestampIndex, column)
+
+    def get_evaluation_index(self, session_state_key):
+        """
+        Returns the evaluated cell counts of the records in the session state (see EvaluationIndex).
+
+        Like `get_record_index`, the counts are evaluated on first use and kept up to date by
+        `append_record` and `delete_records`, so filtering the records does not evaluate them again.
+
+        Args:
+            session_state_key (str): Key identifying the DataFrame in the session state
+
+        Returns:
+            EvaluationIndex: The evaluation of the current records
+
+        Raises:
+            ValueError: If the session state value is not a DataFrame
+        """
+        return self._get_index(session_state_key, EvaluationIndex, None)
+
+    def get_search_index(self, session_state_key, columns=('comment', 'patient_id')):
+        """
+        Returns an inverted index for keyword search over text columns of the records in the session state.
+
+        The tokens of every record are stored next to the records in a record store
+        (`<file>_search_<columns>.parquet` plus journal), so a new session only tokenizes records that were
+        added elsewhere. Like `get_record_index`, the index is kept up to date by `append_record` and
+        `delete_records`, which store the tokens of the changed records as journal entries in the background.
+
+        Args:
+            session_state_key (str): Key identifying the DataFrame in the session state
+            columns (tuple, optional): The text columns. Defaults to ('comment', 'patient_id').
+
+        Returns:
+            TextIndex: The index of the current records
+
+        Raises:
+            ValueError: If the session state value is not a DataFrame with a `record_id` column
+        """
+        def build(index, data):
+            documents = self._load_search_tokens(session_state_key, index.column)
+            store = self.record_store_reg.get(session_state_key)
+            if isinstance(store, PartitionedRecordStore) and not store.complete and self.record_id_column in data.columns:
+                # the tokens of records in partitions that are not loaded are kept, not removed as outdated
+                loaded = set(data[self.record_id_column].astype(str))
+                documents = {record_id: tokens for record_id, tokens in documents.items() if record_id in loaded}
+            index.build(data, documents)
+            self._save_search_tokens(session_state_key, index)
+
+        return self._get_index(session_state_key, TextIndex, tuple(columns), build)
+
+    def get_cohort_statistics(self, session_state_key):
+        """
+        Returns the aggregated statistics of the records of all users (see CohortStatistics).
+
+        The statistics are read from the file given to `load_user_records` as `statistics_file`, which
+        `append_record` and `delete_records` keep up to date. All sessions share one in-memory copy per
+        file version, so showing them only checks whether the file changed.
+
+        Args:
+            session_state_key (str): Key the records were loaded with via `load_user_records`
+
+        Returns:
+            CohortStatistics: The stored statistics, to be treated as read-only
+
+        Raises:
+            ValueError: If the records were loaded without `statistics_file`
+        """
+        file_name = self.statistics_reg.get(session_state_key)
+        if file_name is None:
+            raise ValueError(f"DataManager: The records for key {session_state_key} have no statistics file")
+
+        dh = self._get_data_handler()
+        version = dh.version(file_name)
+        if version is None:
+            return CohortStatistics()
+        key = (type(self.fs).__name__, dh.join(dh.root_path, file_name), CohortStatistics.__name__)
+        return _shared_app_data_cache().get(key, version, lambda: CohortStatistics.from_dict(dh.load(file_name)))
+
+    def _update_statistics(self, session_state_key, update):
+        """
+        Creates a write that applies `update(statistics)` to the stored cohort statistics.
+
+        The file is only replaced if nobody has written it since it was read, otherwise the update is
+        applied again to the new version. `update` returns False if it did not change anything. Every
+        update has an ID that is stored with the statistics, so a retried update is applied only once.
+        """
+        file_name = self.statistics_reg[session_state_key]
+        dh = self._get_data_handler()
+        update_id = RecordStore.new_id()
+
+        def write():
+            for _ in range(RecordStore.write_attempts):
+                version = dh.version(file_name)
+                statistics = CohortStatistics.from_dict(dh.load(file_name, initial_value={}) if version is not None else {})
+                if update_id in statistics.applied or not update(statistics):
+                    return
+                statistics.applied.append(update_id)
+                if dh.save_if_version(file_name, statistics.to_dict(), version):
+                    return
+            raise RuntimeError(f"DataManager: {file_name} was changed concurrently, statistics not updated")
+
+        return write
+
+    def _search_store(self, session_state_key, columns):
+        """
+        Creates the record store of the search tokens of registered data, or returns None if the data is
+        not registered. Every row holds the ID of a record and its tokens separated by spaces.
+        """
+        file_path = self.data_reg.get(session_state_key)
+        if file_path is None:
+            return None
+        file_name = f"{posixpath.splitext(file_path)[0]}_search_{'_'.join(columns)}.parquet"
+        return RecordStore(self._get_data_handler(), file_name, id_column=self.record_id_column)
+
+    def _load_search_tokens(self, session_state_key, columns):
+        """
+        Loads the stored tokens per record ID, an empty dict if there are none or they cannot be read.
+        """
+        store = self._search_store(session_state_key, columns)
+        if store is None:
+            return {}
+        try:
+            stored = store.load(pd.DataFrame())
+        except Exception:
+            return {}  # the index is rebuilt from the records
+        if not self.pending_writes or (session_state_key, columns) not in self.search_store_reg:
+            # the loaded store knows all journal entries, so its compactions are due in time
+            self.search_store_reg[(session_state_key, columns)] = store
+        if stored.empty or not {self.record_id_column, 'tokens'}.issubset(stored.columns):
+            return {}
+        return {str(record_id): str(tokens).split() for record_id, tokens in zip(stored[self.record_id_column], stored['tokens'])}
+
+    def _save_search_tokens(self, session_state_key, index):
+        """
+        Stores the tokens of the records that changed in the search index in the background: one journal
+        entry with the added records and one with tombstones of the deleted records.
+        """
+        changes = index.pop_changes()
+        store = self.search_store_reg.get((session_state_key, index.column))
+        if store is None:
+            store = self.search_store_reg[(session_state_key, index.column)] = self._search_store(session_state_key, index.column)
+        if store is None or not changes:
+            return
+        added = [{self.record_id_column: record_id, 'tokens': ' '.join(tokens)}
+                 for record_id, tokens in changes.items() if tokens is not None]
+        deleted = pd.DataFrame({self.record_id_column: [record_id for record_id, tokens in changes.items() if tokens is None]})
+
+        def compact_if_needed():
+            if store.needs_compaction:
+                store.compact(store.load(pd.DataFrame()))  # the journal holds all own changes
+
+        self.write_queue.submit(store.file_name, [lambda: store.append_records(added), lambda: store.delete_records(deleted),
+                                                  compact_if_needed], coalesce=False)
+
+    def _get_index(self, session_state_key, index_class, column, build=None):
+        """
+        Returns the index of the given class and column, building it if the records have no current one.
+        `build(index, data)` replaces the default `index.build(data)`.
+        """
+        data = st.session_state.get(session_state_key)
+        if not isinstance(data, pd.DataFrame):
+            raise ValueError(f"DataManager: The session state value for key {session_state_key} must be a DataFrame")
+
+        indexed_data, indexes = self.record_index_reg.get(session_state_key, (None, {}))
+        if indexed_data is not data:
+            indexes = {}
+        if (index_class, column) not in indexes:
+            index = index_class(column)
+            if build is None:
+                index.build(data)
+            else:
+                build(index, data)
+            indexes[(index_class, column)] = index
+        self.record_index_reg[session_state_key] = (data, indexes)
+        return indexes[(index_class, column)]
+
+    def _update_record_indexes(self, session_state_key, old_data, new_data, update):
+        """
+        Applies an incremental update to the indexes of the records, or drops them if they are outdated.
+        """
+        indexed_data, indexes = self.record_index_reg.get(session_state_key, (None, {}))
+        if indexed_data is not old_data:
+            self.record_index_reg.pop(session_state_key, None)
+            return
+        for index in indexes.values():
+            update(index)
+            if isinstance(index, TextIndex):
+                self._save_search_tokens(session_state_key, index)
+        self.record_index_reg[session_state_key] = (new_data, indexes)
+
+    def _clear_user_data(self):
+        """
+        Removes all user-specific data from the session state and the registries.
+        """
+        for key in self.user_data_reg:  # delete all user data
+            st.session_state.pop(key, None)
+        self.user_data_reg = {}
+        self.record_store_reg = {}
+        self.record_index_reg = {}
+        self.search_store_reg = {}
+        self.statistics_reg = {}
+
     @property
     def data_reg(self):
         return {**self.app_data_reg, **self.user_data_reg}
@@ -186,6 +665,10 @@ class DataManager:
         """
         Saves data from session state to persistent storage using the registered data handler.
 
+        The write runs in the background (see `write_queue`), so this method returns immediately.
+        A copy of the current value is written; consecutive saves of the same key are coalesced.
+        Use `flush_writes` to wait until the data is stored.
+
         Args:
             session_state_key (str): Key identifying the data in both session state and data registry
 
@@ -202,8 +685,46 @@ class DataManager:
         if session_state_key not in st.session_state:
             raise ValueError(f"DataManager: Key {session_state_key} not found in session state")
         
+        data = st.session_state[session_state_key]
+        data = data.copy() if isinstance(data, pd.DataFrame) else copy.deepcopy(data)
+        file_path = self.data_reg[session_state_key]
+
+        if session_state_key in self.record_store_reg:
+            store = self.record_store_reg[session_state_key]
+            self.write_queue.submit(file_path, lambda: store.compact(data))
+            return
+
         dh = self._get_data_handler()
-        dh.save(self.data_reg[session_state_key], st.session_state[session_state_key])
+        self.write_queue.submit(file_path, lambda: dh.save(file_path, data))
+
+    @property
+    def pending_writes(self):
+        """
+        Number of writes that are not yet stored persistently.
+        """
+        return self.write_queue.pending_count
+
+    def flush_writes(self, timeout=None):
+        """
+        Waits until all queued writes are stored persistently.
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds. Defaults to None (wait forever).
+
+        Returns:
+            bool: True if all writes are done, False if the timeout expired
+        """
+        return self.write_queue.flush(timeout)
+
+    def show_write_status(self):
+        """
+        Shows pending and failed writes in the sidebar.
+        """
+        if self.pending_writes:
+            st.sidebar.caption(f"💾 {self.pending_writes} Änderung(en) werden gespeichert …")
+        while self.write_queue.errors:
+            file_path, error = self.write_queue.errors.pop(0)
+            st.sidebar.error(f"Fehler beim Speichern von `{file_path}`: {error}")
 
     def save_all_data(self):
         """
@@ -235,18 +756,89 @@ class DataManager:
         Returns:
             None: The updated value is stored back in the session state
 
+        Note:
+            If the key is backed by a record store (see `load_user_records`), only the new record
+            is written to the journal instead of saving the whole value. Like `save_data`, the
+            write runs in the background.
         """
-        data_value = st.session_state[session_state_key]
-        
         if not isinstance(record_dict, dict):
             raise ValueError(f"DataManager: The record_dict must be a dictionary")
+
+        record_dict = copy.deepcopy(record_dict)  # the record must not change while it is queued
+        store = self.record_store_reg.get(session_state_key)
+        if store is not None:
+            record_dict.setdefault(self.record_id_column, RecordStore.new_id())
+        if isinstance(store, PartitionedRecordStore):
+            # the loaded records hold complete partitions, so the partition of the record is loaded first
+            self.load_record_partitions(session_state_key, [record_dict.get(store.partition_by)])
+        data_value = st.session_state[session_state_key]
         
         if isinstance(data_value, pd.DataFrame):
-            data_value = pd.concat([data_value, pd.DataFrame([record_dict])], ignore_index=True)
+            old_value = data_value
+            data_value = DataHandler.concat_records([data_value, pd.DataFrame([record_dict])])
+            self._update_record_indexes(session_state_key, old_value, data_value,
+                                        lambda index: index.append(record_dict, len(old_value)))
         elif isinstance(data_value, list):
-            data_value.append(record_dict)
+            data_value = data_value + [record_dict]  # a new list, app data may be shared with other sessions
         else:
             raise ValueError(f"DataManager: The session state value for key {session_state_key} must be a DataFrame or a list")
         
         st.session_state[session_state_key] = data_value
-        self.save_data(session_state_key)
\ No newline at end of file
+
+        if store is None:
+            self.save_data(session_state_key)
+            return
+
+        def compact_if_needed():
+            if store.needs_compaction:
+                store.compact(data_value)
+
+        steps = [lambda: store.append(record_dict)]
+        if session_state_key in self.statistics_reg:
+            username = st.session_state.get('username')
+            steps.append(self._update_statistics(
+                session_state_key, lambda statistics: statistics.add(username, pd.DataFrame([record_dict]))))
+        # separate steps, so a failing compaction is retried without appending the record again
+        self.write_queue.submit(self.data_reg[session_state_key], steps + [compact_if_needed], coalesce=False)
+
+    def delete_records(self, session_state_key, record_ids):
+        """
+        Delete records by their ID from a DataFrame in the session state and from persistent storage.
+
+        For record stores, only tombstones with the IDs are written (in the background); the stored
+        records are rewritten by a later compaction once enough of them are deleted. Other data is
+        saved completely with `save_data`.
+
+        Args:
+            session_state_key (str): Key identifying the DataFrame in the session state
+            record_ids (list): IDs (column `record_id`) of the records to delete
+
+        Raises:
+            ValueError: If the session state value is not a DataFrame with a `record_id` column
+        """
+        data_value = st.session_state[session_state_key]
+        if not isinstance(data_value, pd.DataFrame) or self.record_id_column not in data_value.columns:
+            raise ValueError(f"DataManager: The session state value for key {session_state_key} has no column {self.record_id_column}")
+
+        mask = data_value[self.record_id_column].isin(record_ids)
+        deleted = data_value[mask]
+        old_value = data_value
+        data_value = data_value[~mask].reset_index(drop=True)
+        st.session_state[session_state_key] = data_value
+        self._update_record_indexes(session_state_key, old_value, data_value,
+                                    lambda index: index.delete(np.flatnonzero(mask.to_numpy())))
+
+        store = self.record_store_reg.get(session_state_key)
+        if store is None:
+            self.save_data(session_state_key)
+            return
+
+        def compact_if_needed():
+            if store.needs_compaction:
+                store.compact(data_value)
+
+        steps = [lambda: store.delete_records(deleted)]
+        if session_state_key in self.statistics_reg:
+            username = st.session_state.get('username')
+            steps.append(self._update_statistics(session_state_key, lambda statistics: statistics.add(username, deleted, -1)))
+        self.write_queue.submit(self.data_reg[session_state_key], steps + [compact_if_needed], coalesce=False)
@@ -0,0 +1,56 @@
+import os
+import streamlit as st
+import streamlit.components.v1 as components
+
+UNDO = "__undo__"
+DEFAULT_KEYS = "12345678"
+
+_component = components.declare_component(
+    "keyboard_counter", path=os.path.join(os.path.dirname(__file__), "frontend", "keyboard_counter"))
+
+
+def keyboard_counter(counter, key, key_map=None, milestones=(100, 200), sync_delay=1000, max_batch=25):
+    """
+    Shows a counter that counts cells by keyboard in the browser and applies the counted cells in batches.
+
+    Every key press is counted and shown in the browser right away. The counted cells are sent to the
+    server after a pause of `sync_delay` milliseconds, when a milestone is reached, when `max_batch`
+    counts are waiting, and when the counter loses focus or the page is left. Backspace undoes the last
+    count. Each batch contains all counts the server has not confirmed yet, numbered per browser
+    session, so a lost or repeated batch neither drops nor doubles counts.
+
+    Args:
+        counter (CellCounter): The counter the counted cells are applied to
+        key (str): Widget key, also used to store the confirmed batches in the session state
+        key_map (dict, optional): Keyboard key -> cell type. Defaults to the keys 1-8 for the cell types in order.
+        milestones (tuple, optional): Totals at which the counts are sent immediately. Defaults to (100, 200).
+        sync_delay (int, optional): Pause in milliseconds after which the counts are sent. Defaults to 1000.
+        max_batch (int, optional): Number of waiting counts after which they are sent. Defaults to 25.
+
+    Returns:
+        int: Number of counts and undos applied in this run
+    """
+    if key_map is None:
+        key_map = dict(zip(DEFAULT_KEYS, counter.cell_types))
+    ack_key = f"{key}_ack"
+    ack = st.session_state.get(ack_key, {"mount": None, "n": 0})
+
+    batch = _component(counts=dict(counter), history=counter.recent(200), ack=ack, key_map=key_map,
+                       milestones=list(milestones), sync_delay=sync_delay, max_batch=max_batch, key=key, default=None)
+    if not batch:
+        return 0
+
+    last_n = ack["n"] if batch["mount"] == ack["mount"] else 0
+    applied = 0
+    for n, action in batch["actions"]:
+        if n <= last_n:
+            continue
+        if action == UNDO:
+            counter.undo()
+        elif action in counter:
+            counter.increment(action)
+        last_n = n
+        applied += 1
+
+    st.session_state[ack_key] = {"mount": batch["mount"], "n": last_n}
+    return applied
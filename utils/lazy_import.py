@@ -0,0 +1,53 @@
+import importlib, sys, threading
+
+
+class LazyModule:
+    """
+    Placeholder for a module that is only imported when one of its attributes is used.
+
+    Heavy modules that are only needed by some features (e.g. fpdf for PDF reports) can be declared
+    at the top of a page without slowing down its first run, as long as the first run does not use
+    the feature. Once imported, the module is shared by the whole process as usual.
+
+        >>> report = lazy_import("utils.report")  # nothing imported yet
+        >>> pdf_bytes = report.build_report(record)  # utils.report and fpdf are imported here
+
+    Attributes:
+        name (str): Full name of the module
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, name):
+        self.name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self.name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self.name}' ({state})>"
+
+
+def lazy_import(name):
+    """
+    Declare a module that is imported on first use.
+
+    Args:
+        name (str): Full name of the module, e.g. 'utils.report'
+
+    Returns:
+        The module if it was already imported, otherwise a LazyModule for it
+    """
+    return sys.modules.get(name) or LazyModule(name)
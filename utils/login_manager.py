@@ -2,10 +2,32 @@ import secrets
 import streamlit as st
 import streamlit_authenticator as stauth
 from streamlit_authenticator.utilities.exceptions import RegisterError
+from utils.credential_store import CredentialStore
 from utils.data_manager import DataManager
 
 
+@st.cache_resource(show_spinner=False)
+def _shared_credential_store(_data_handler, root_path, folder, legacy_file_name):
+    """
+    Loads the credential store once per process, so new sessions do not read all credentials again.
+
+    Args:
+        _data_handler (DataHandler): Handler for the app data folder (not part of the cache key)
+        root_path (str): Root path of the data handler, identifies the storage location
+        folder (str): Folder holding the credentials
+        legacy_file_name (str): YAML file with credentials that is migrated on first load
+
+    Returns:
+        CredentialStore: The loaded store shared by all sessions
+    """
+    store = CredentialStore(_data_handler, folder, legacy_file_name)
+    store.load()
+    return store
+
+
 class LoginManager:
+    credential_refresh_interval = 5  # seconds between checks for users registered by other processes
+
     def __new__(cls, *args, **kwargs):
         if 'login_manager' in st.session_state:
             return st.session_state.login_manager
@@ -16,6 +38,7 @@ class LoginManager:
 
     def __init__(self, data_manager: DataManager = None,
                  auth_credentials_file: str = 'credentials.yaml',
+                 auth_credentials_folder: str = 'credentials',
                  auth_cookie_name: str = 'bmld_inf2_streamlit_app'):
         if hasattr(self, 'authenticator'):
             return
@@ -25,15 +48,17 @@ class LoginManager:
 
         self.data_manager = data_manager
         self.auth_credentials_file = auth_credentials_file
+        self.auth_credentials_folder = auth_credentials_folder
         self.auth_cookie_name = auth_cookie_name
         self.auth_cookie_key = secrets.token_urlsafe(32)
-        self.auth_credentials = self._load_auth_credentials()
+        self.auth_credentials = {"usernames": {}}
 
         self.authenticator = stauth.Authenticate(
             self.auth_credentials,
             self.auth_cookie_name,
             self.auth_cookie_key,
             cookie_expiry_days=30,
+            auto_hash=False,  # passwords are stored hashed, see CredentialStore
             translations={
                 "login": {
                     "title": "Anmeldung",
@@ -66,14 +91,20 @@ class LoginManager:
                 }
             }
         )
+        # set after the authenticator is created, which would otherwise copy all users into a dict;
+        # the authenticator keeps this dict and looks up only the users logging in through the view
+        self.auth_credentials["usernames"] = self._load_auth_credentials()
 
     def _load_auth_credentials(self):
         dh = self.data_manager._get_data_handler()
-        return dh.load(self.auth_credentials_file, initial_value={"usernames": {}})
+        self.credential_store = _shared_credential_store(dh, dh.root_path, self.auth_credentials_folder,
+                                                         self.auth_credentials_file)
+        # users registered by other processes are read when they log in, at most every few seconds
+        return self.credential_store.view(max_age=self.credential_refresh_interval)
 
-    def _save_auth_credentials(self):
-        dh = self.data_manager._get_data_handler()
-        dh.save(self.auth_credentials_file, self.auth_credentials)
+    def _save_auth_credentials(self, username):
+        username = username.lower()
+        self.credential_store.save_user(username, self.auth_credentials["usernames"][username])
 
     def login_register(self, login_title='Anmeldung', register_title='Registrierung'):
         if st.session_state.get("authentication_status") is True:
@@ -110,7 +141,7 @@ class LoginManager:
                 if res[1] is not None:
                     st.success(f"Nutzer *{res[1]}* wurde erfolgreich registriert.")
                     try:
-                        self._save_auth_credentials()
+                        self._save_auth_credentials(res[1])
                         st.success("Zugangsdaten wurden gespeichert.")
                     except Exception:
                         st.error("Fehler beim Speichern der Zugangsdaten.")
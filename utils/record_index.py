@@ -0,0 +1,513 @@
+import bisect, re
+import numpy as np
+import pandas as pd
+from utils.reference_ranges import evaluate_records
+
+
+class RecordIndex:
+    """
+    An in-memory hash index of the row positions of records by the value of one column.
+
+    The index is built once from a DataFrame and then kept up to date with `append` and `delete`,
+    so looking up the records of one value (e.g. all results of a patient) does not scan all rows.
+    Values are compared as strings, missing values are not indexed.
+
+        >>> index = RecordIndex("patient_id")
+        >>> index.build(data_df)
+        >>> index.values  # sorted patient IDs
+        >>> index.select(data_df, "P-001")
+
+    Attributes:
+        column (str): The indexed column
+    """
+
+    def __init__(self, column):
+        """
+        Initialize an empty index.
+
+        Args:
+            column (str): The indexed column
+        """
+        self.column = column
+        self._positions = {}  # value -> list of row positions in ascending order
+        self._values = []  # sorted values
+
+    @staticmethod
+    def _key(value):
+        if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+            return None
+        return str(value)
+
+    def build(self, data):
+        """
+        Builds the index from all rows of a DataFrame.
+
+        Args:
+            data (pd.DataFrame): The records
+        """
+        self._positions = {}
+        if self.column in data.columns and len(data):
+            column = pd.Series(data[self.column].to_numpy(dtype=object))
+            present = column.notna().to_numpy()
+            keys = column[present].astype(str).to_numpy()
+            positions = np.flatnonzero(present)
+            for key, rows in pd.Series(keys).groupby(keys).indices.items():
+                self._positions[key] = positions[rows].tolist()
+        self._values = sorted(self._positions)
+
+    def append(self, record, position):
+        """
+        Adds a record that was appended to the indexed DataFrame.
+
+        Args:
+            record (dict): The new record
+            position (int): Row position of the record
+        """
+        key = self._key(record.get(self.column))
+        if key is None:
+            return
+        if key not in self._positions:
+            bisect.insort(self._values, key)
+            self._positions[key] = []
+        self._positions[key].append(position)
+
+    def delete(self, positions):
+        """
+        Removes deleted rows and moves the positions of the following rows up, like `reset_index` does.
+
+        Args:
+            positions (array-like): Row positions of the deleted records
+        """
+        deleted = np.unique(np.asarray(positions, dtype=int))
+        if not len(deleted):
+            return
+        for key in list(self._positions):
+            rows = np.asarray(self._positions[key])
+            rows = rows[~np.isin(rows, deleted)]
+            if len(rows):
+                self._positions[key] = (rows - np.searchsorted(deleted, rows)).tolist()
+            else:
+                del self._positions[key]
+                self._values.remove(key)
+
+    @property
+    def values(self):
+        """
+        The indexed values in sorted order.
+        """
+        return list(self._values)
+
+    def counts(self):
+        """
+        Number of records per value.
+
+        Returns:
+            dict: Value -> number of records, sorted by value
+        """
+        return {key: len(self._positions[key]) for key in self._values}
+
+    def positions(self, value):
+        """
+        Row positions of the records with a value.
+
+        Args:
+            value: The value to look up
+
+        Returns:
+            np.ndarray: Row positions in ascending order, empty if the value is not indexed
+        """
+        return np.asarray(self._positions.get(self._key(value), []), dtype=int)
+
+    def select(self, data, value):
+        """
+        The records with a value.
+
+        Args:
+            data (pd.DataFrame): The indexed DataFrame
+            value: The value to look up
+
+        Returns:
+            pd.DataFrame: The matching rows of `data`
+        """
+        return data.iloc[self.positions(value)]
+
+
+class TimestampIndex:
+    """
+    A sorted in-memory index of the records by a timestamp column, for time range queries.
+
+    The timestamps are parsed once when the index is built or a record is appended. Range queries
+    find their bounds by binary search, so they do not scan or parse all rows. Like RecordIndex, it
+    is kept up to date with `append` and `delete`. Rows without a valid timestamp are not found by
+    range queries.
+
+        >>> index = TimestampIndex("timestamp")
+        >>> index.build(data_df)
+        >>> data_df.iloc[index.range(pd.Timestamp("2025-05-01"), pd.Timestamp("2025-06-01"))]
+
+    Attributes:
+        column (str): The indexed column
+    """
+
+    def __init__(self, column):
+        """
+        Initialize an empty index.
+
+        Args:
+            column (str): The indexed column
+        """
+        self.column = column
+        self._row_times = np.array([], dtype="datetime64[ns]")  # parsed timestamp per row position
+        self._sorted_times = np.array([], dtype="datetime64[ns]")  # valid timestamps in ascending order
+        self._sorted_positions = np.array([], dtype=int)  # row positions in the order of _sorted_times
+
+    @staticmethod
+    def _parse(values):
+        values = pd.Series(values)
+        if not pd.api.types.is_datetime64_any_dtype(values):  # e.g. strings from a CSV snapshot
+            values = pd.to_datetime(values.astype(object), errors="coerce", format="mixed")
+        return values.to_numpy(dtype="datetime64[ns]")
+
+    def _sort(self):
+        valid = np.flatnonzero(~np.isnat(self._row_times))
+        order = np.argsort(self._row_times[valid], kind="stable")
+        self._sorted_positions = valid[order]
+        self._sorted_times = self._row_times[self._sorted_positions]
+
+    def build(self, data):
+        """
+        Builds the index from all rows of a DataFrame.
+
+        Args:
+            data (pd.DataFrame): The records
+        """
+        values = data[self.column] if self.column in data.columns else [None] * len(data)
+        self._row_times = self._parse(values)
+        self._sort()
+
+    def append(self, record, position):
+        """
+        Adds a record that was appended to the indexed DataFrame.
+
+        Args:
+            record (dict): The new record
+            position (int): Row position of the record
+        """
+        time = self._parse([record.get(self.column)])
+        self._row_times = np.concatenate([self._row_times, time])
+        if not np.isnat(time[0]):
+            at = np.searchsorted(self._sorted_times, time[0], side="right")  # usually the end
+            self._sorted_times = np.insert(self._sorted_times, at, time[0])
+            self._sorted_positions = np.insert(self._sorted_positions, at, position)
+
+    def delete(self, positions):
+        """
+        Removes deleted rows and moves the positions of the following rows up, like `reset_index` does.
+
+        Args:
+            positions (array-like): Row positions of the deleted records
+        """
+        deleted = np.unique(np.asarray(positions, dtype=int))
+        if not len(deleted):
+            return
+        self._row_times = np.delete(self._row_times, deleted)
+        keep = ~np.isin(self._sorted_positions, deleted)
+        self._sorted_times = self._sorted_times[keep]
+        self._sorted_positions = self._sorted_positions[keep]
+        self._sorted_positions = self._sorted_positions - np.searchsorted(deleted, self._sorted_positions)
+
+    @property
+    def bounds(self):
+        """
+        The earliest and latest timestamp, or (None, None) if no row has a valid timestamp.
+        """
+        if not len(self._sorted_times):
+            return None, None
+        return pd.Timestamp(self._sorted_times[0]), pd.Timestamp(self._sorted_times[-1])
+
+    def range(self, start=None, end=None):
+        """
+        Row positions of the records in a time range.
+
+        Args:
+            start (pd.Timestamp, optional): Earliest timestamp (inclusive). Defaults to None (no limit).
+            end (pd.Timestamp, optional): End of the range (exclusive). Defaults to None (no limit).
+
+        Returns:
+            np.ndarray: Row positions in ascending order
+        """
+        first = 0 if start is None else np.searchsorted(self._sorted_times, np.datetime64(start, "ns"), side="left")
+        last = len(self._sorted_times) if end is None else np.searchsorted(self._sorted_times, np.datetime64(end, "ns"), side="left")
+        return np.sort(self._sorted_positions[first:last])
+
+    def times(self, positions):
+        """
+        The parsed timestamps of rows.
+
+        Args:
+            positions (array-like): Row positions
+
+        Returns:
+            pd.DatetimeIndex: The timestamps, NaT where a row has no valid timestamp
+        """
+        return pd.DatetimeIndex(self._row_times[np.asarray(positions, dtype=int)])
+
+
+class TextIndex:
+    """
+    An inverted index for keyword search over text columns of the records (e.g. comments and patient IDs).
+
+    Texts are split into lower case word tokens. Every token maps to the IDs of the records that
+    contain it, so a query only looks at the records of its tokens instead of scanning all texts.
+    A query token matches all tokens starting with it ("leuko" finds "leukozytose"), all query tokens
+    must match. The tokens per record (`documents`) can be stored and passed to `build` again, then
+    only records that are not in the stored documents are tokenized. Like RecordIndex, the index is
+    kept up to date with `append` and `delete`. The documents that changed since they were built
+    (`pop_changes`) can be stored incrementally instead of storing all documents again.
+
+        >>> index = TextIndex(("comment", "patient_id"))
+        >>> index.build(data_df)
+        >>> data_df.iloc[index.search("toxische granulation")]
+
+    Attributes:
+        column (tuple): The indexed columns
+        id_column (str): Column with the stable record IDs
+    """
+
+    _token_pattern = re.compile(r"\w+")
+
+    def __init__(self, column, id_column='record_id'):
+        """
+        Initialize an empty index.
+
+        Args:
+            column (tuple): The indexed columns
+            id_column (str, optional): Column with the stable record IDs. Defaults to 'record_id'.
+        """
+        self.column = tuple(column)
+        self.id_column = id_column
+        self._changes = {}  # record ID -> new tokens, None if deleted, since the last pop_changes
+        self._documents = {}  # record ID -> tokens of the record
+        self._postings = {}  # token -> IDs of the records containing it
+        self._terms = []  # sorted tokens, for prefix queries
+        self._row_ids = []  # record ID per row position
+        self._positions = {}  # record ID -> row position
+
+    @classmethod
+    def tokenize(cls, text):
+        """
+        Splits a text into its distinct lower case word tokens.
+
+        Args:
+            text (str): The text
+
+        Returns:
+            list: The tokens in order of their first occurrence
+        """
+        return list(dict.fromkeys(cls._token_pattern.findall(str(text).casefold())))
+
+    def _record_tokens(self, record):
+        tokens = []
+        for column in self.column:
+            value = record.get(column)
+            if value is not None and not (isinstance(value, float) and pd.isna(value)):
+                tokens.extend(self.tokenize(value))
+        return list(dict.fromkeys(tokens))
+
+    def _add(self, record_id, tokens):
+        self._documents[record_id] = tokens
+        for token in tokens:
+            if token not in self._postings:
+                bisect.insort(self._terms, token)
+                self._postings[token] = set()
+            self._postings[token].add(record_id)
+
+    def _remove(self, record_id):
+        for token in self._documents.pop(record_id, ()):
+            postings = self._postings[token]
+            postings.discard(record_id)
+            if not postings:
+                del self._postings[token]
+                self._terms.pop(bisect.bisect_left(self._terms, token))
+
+    @property
+    def documents(self):
+        """
+        The tokens per record ID, to be stored and passed to `build` later.
+        """
+        return dict(self._documents)
+
+    @property
+    def changed(self):
+        """
+        True if documents were added or removed since they were built from stored documents or last popped.
+        """
+        return bool(self._changes)
+
+    def pop_changes(self):
+        """
+        Returns and resets the documents that changed since the index was built or this was last called.
+
+        Returns:
+            dict: Record ID -> tokens of added records, None for deleted records
+        """
+        changes, self._changes = self._changes, {}
+        return changes
+
+    def build(self, data, documents=None):
+        """
+        Builds the index from all rows of a DataFrame.
+
+        Args:
+            data (pd.DataFrame): The records, with the column `id_column`
+            documents (dict, optional): Stored tokens per record ID (see `documents`); records found
+                there are not tokenized again. Defaults to None.
+
+        Raises:
+            ValueError: If the records have no column `id_column`
+        """
+        if self.id_column not in data.columns:
+            raise ValueError(f"TextIndex: The records have no column {self.id_column}")
+        documents = documents or {}
+        self._documents, self._postings, self._terms = {}, {}, []
+        self._row_ids = [str(record_id) for record_id in data[self.id_column]]
+        self._positions = {record_id: position for position, record_id in enumerate(self._row_ids)}
+        columns = [column for column in self.column if column in data.columns]
+        records = data[columns].to_dict("records")
+        for record_id, record in zip(self._row_ids, records):
+            tokens = documents.get(record_id)
+            if tokens is None:
+                tokens = self._record_tokens(record)
+            self._add(record_id, list(tokens))
+        self._changes = {record_id: tokens for record_id, tokens in self._documents.items() if record_id not in documents}
+        self._changes.update((record_id, None) for record_id in documents if record_id not in self._documents)
+
+    def append(self, record, position):
+        """
+        Adds a record that was appended to the indexed DataFrame.
+
+        Args:
+            record (dict): The new record, with the key `id_column`
+            position (int): Row position of the record
+        """
+        record_id = str(record.get(self.id_column))
+        self._row_ids.append(record_id)
+        self._positions[record_id] = position
+        self._remove(record_id)
+        self._add(record_id, self._record_tokens(record))
+        self._changes[record_id] = self._documents[record_id]
+
+    def delete(self, positions):
+        """
+        Removes deleted rows.
+
+        Args:
+            positions (array-like): Row positions of the deleted records
+        """
+        deleted = set(np.asarray(positions, dtype=int).tolist())
+        if not deleted:
+            return
+        for position in deleted:
+            self._remove(self._row_ids[position])
+            self._changes[self._row_ids[position]] = None
+        self._row_ids = [record_id for position, record_id in enumerate(self._row_ids) if position not in deleted]
+        self._positions = {record_id: position for position, record_id in enumerate(self._row_ids)}
+
+    def search(self, query):
+        """
+        Row positions of the records that match all tokens of a query.
+
+        Args:
+            query (str): Keywords, each matching the tokens it is a prefix of
+
+        Returns:
+            np.ndarray: Row positions in ascending order, all rows for an empty query
+        """
+        tokens = self.tokenize(query)
+        if not tokens:
+            return np.arange(len(self._row_ids))
+
+        matches = None
+        for token in tokens:
+            ids = set()
+            for term in self._terms[bisect.bisect_left(self._terms, token):]:
+                if not term.startswith(token):
+                    break
+                ids |= self._postings[term]
+            matches = ids if matches is None else matches & ids
+            if not matches:
+                return np.array([], dtype=int)
+        return np.sort(np.array([self._positions[record_id] for record_id in matches], dtype=int))
+
+
+class EvaluationIndex:
+    """
+    The evaluated cell counts of every record (see `evaluate_records`), kept per row position.
+
+    The counts of all records are evaluated once when the index is built, an appended record is
+    evaluated on its own. Filtering the records then only selects rows of the stored arrays instead
+    of parsing and evaluating the counts of the selected records again. Like RecordIndex, the index
+    is kept up to date with `append` and `delete`.
+
+        >>> index = EvaluationIndex()
+        >>> index.build(data_df)
+        >>> index.take(positions)["any_abnormal"]
+
+    Attributes:
+        column (str): Not used, for the common interface of the record indexes
+    """
+
+    def __init__(self, column=None):
+        """
+        Initialize an empty index.
+
+        Args:
+            column (str, optional): Not used, for the common interface of the record indexes
+        """
+        self.column = column
+        self._evaluation = evaluate_records(pd.DataFrame())  # name -> array with one row per position
+
+    def build(self, data):
+        """
+        Evaluates all rows of a DataFrame.
+
+        Args:
+            data (pd.DataFrame): The records
+        """
+        self._evaluation = evaluate_records(data)
+
+    def append(self, record, position):
+        """
+        Adds a record that was appended to the indexed DataFrame.
+
+        Args:
+            record (dict): The new record
+            position (int): Row position of the record
+        """
+        evaluation = evaluate_records(pd.DataFrame([record]))
+        self._evaluation = {name: np.concatenate([values, evaluation[name]]) for name, values in self._evaluation.items()}
+
+    def delete(self, positions):
+        """
+        Removes deleted rows and moves the following rows up, like `reset_index` does.
+
+        Args:
+            positions (array-like): Row positions of the deleted records
+        """
+        deleted = np.unique(np.asarray(positions, dtype=int))
+        if not len(deleted):
+            return
+        self._evaluation = {name: np.delete(values, deleted, axis=0) for name, values in self._evaluation.items()}
+
+    def take(self, positions):
+        """
+        The evaluation of rows, in the format of `evaluate_records`.
+
+        Args:
+            positions (array-like): Row positions
+
+        Returns:
+            dict: Arrays with one row per given position
+        """
+        positions = np.asarray(positions, dtype=int)
+        return {name: values[positions] for name, values in self._evaluation.items()}
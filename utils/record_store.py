@@ -0,0 +1,925 @@
+import hashlib, posixpath, re, secrets, time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RecordStore:
+    """
+    Append-only storage for a table of records (e.g. the saved results in `data.csv`).
+
+    The records are persisted as a snapshot file plus a journal folder next to it. Every
+    appended record is written as its own small newline-delimited JSON file in the journal,
+    so saving one result only transfers that record instead of the whole history. Loading
+    replays the snapshot followed by the journal tail. Once the journal holds
+    `compaction_threshold` entries, it is folded into a new snapshot.
+
+    With `snapshot_format='parquet'` the snapshot is written in a typed columnar format instead
+    of the format given by the file extension. An existing snapshot in the original format is
+    still read until the next compaction replaces it.
+
+    With an `id_column`, every record has a stable ID and records can be deleted by writing a
+    tombstone with their ID to the journal. Tombstones are applied while loading; the snapshot
+    is only rewritten once tombstones make up `tombstone_ratio` of the stored records.
+
+    Appends and deletes may be retried after an error: the journal entry of a record is named
+    after its ID and the entry of a tombstone after the deleted IDs, so a retry overwrites the
+    same entry, and a record that is stored twice (e.g. in the snapshot and in a journal entry
+    that a failed compaction did not remove) is only loaded once.
+
+    Several sessions may use the same files. `refresh` only reads the journal entries that other
+    sessions wrote since the last load, and `compact` merges changes of other sessions into the
+    data before it replaces the snapshot, so their records are not overwritten.
+
+        >>> store = RecordStore(data_handler, "data.csv")
+        >>> df = store.load(initial_value=pd.DataFrame(), parse_dates=["timestamp"])
+        >>> store.append({"patient_id": "12345", "timestamp": "2025-01-01 12:00:00"})
+        >>> if store.needs_compaction:
+        ...     store.compact(df)
+        >>> df = store.refresh(df)
+
+    Attributes:
+        data_handler (DataHandler): Handler for the folder the records are stored in
+        file_name (str): Name of the snapshot file, its extension selects the file format
+        legacy_file_name (str): Snapshot in the original format that is read if `file_name` does not exist yet
+        journal_folder (str): Name of the journal folder belonging to the snapshot
+        compaction_threshold (int): Number of journal entries after which a compaction is due
+        journal_entries (list): Journal entries that are already contained in the loaded data
+        id_column (str): Column holding the stable record ID, or None
+        tombstone_ratio (float): Share of deleted records after which a compaction is due
+        record_count (int): Number of records that are not deleted
+        tombstone_count (int): Number of tombstones in the journal
+        snapshot_version (str): Version of the snapshot the loaded data is based on
+    """
+
+    tombstone_key = '_deleted'
+    write_attempts = 10  # conditional writes that fail because of concurrent writes before giving up
+
+    def __init__(self, data_handler, file_name, compaction_threshold=50, snapshot_format=None, id_column=None,
+                 tombstone_ratio=0.2):
+        """
+        Initialize the record store for a snapshot file.
+
+        Args:
+            data_handler (DataHandler): Handler for the folder the records are stored in
+            file_name (str): Name of the snapshot file (e.g. 'data.csv')
+            compaction_threshold (int, optional): Number of journal entries after which
+                `needs_compaction` becomes True. Defaults to 50.
+            snapshot_format (str, optional): File format of the snapshot (e.g. 'parquet'). Defaults to None,
+                i.e. the format given by the extension of `file_name`.
+            id_column (str, optional): Column holding a stable record ID. Records without ID get one
+                when loaded. Required for `delete_records`. Defaults to None.
+            tombstone_ratio (float, optional): Share of deleted records after which `needs_compaction`
+                becomes True. Defaults to 0.2.
+        """
+        stem = posixpath.splitext(file_name)[0]
+        self.data_handler = data_handler
+        self.file_name = file_name if snapshot_format is None else f"{stem}.{snapshot_format}"
+        self.legacy_file_name = file_name if self.file_name != file_name else None
+        self.journal_folder = stem + '.journal'
+        self.compaction_threshold = compaction_threshold
+        self.journal_entries = []
+        self.id_column = id_column
+        self.tombstone_ratio = tombstone_ratio
+        self.record_count = 0
+        self.tombstone_count = 0
+        self.snapshot_version = None
+        self._load_args = {}
+        self._journal_ready = False
+
+    @staticmethod
+    def new_id():
+        """
+        Creates a new record ID. IDs sort in creation order, so journal entries named after them do as well.
+
+        Returns:
+            str: 32 hexadecimal characters, the creation time in nanoseconds followed by random digits
+        """
+        return f"{time.time_ns():016x}{secrets.token_hex(8)}"
+
+    def _new_entry_name(self, lines):
+        """
+        Creates the journal entry name for the given lines.
+
+        The name is derived from the record ID or the IDs of the tombstones, so writing the same
+        lines again (e.g. on a retry) uses the same entry. Lines without ID get a unique name
+        that sorts in write order.
+        """
+        if self.id_column is not None:
+            if len(lines) == 1 and lines[0].get(self.id_column) is not None:
+                record_id = str(lines[0][self.id_column])
+                if re.fullmatch(r'[0-9a-zA-Z_-]{1,64}', record_id):
+                    return f"{record_id}.jsonl"
+                return f"id_{hashlib.sha1(record_id.encode('utf-8')).hexdigest()}.jsonl"
+            deleted = sorted(str(line[self.tombstone_key]) for line in lines if self.tombstone_key in line)
+            if deleted and len(deleted) == len(lines):
+                digest = hashlib.sha1('\n'.join(deleted).encode('utf-8')).hexdigest()
+                return f"del_{digest[:16]}.jsonl"
+        return f"{time.time_ns():020d}_{secrets.token_hex(4)}.jsonl"
+
+    def _list_journal(self):
+        return [name for name in self.data_handler.listdir(self.journal_folder) if name.endswith('.jsonl')]
+
+    def _read_entries(self, entries):
+        records = []
+        for entry in entries:
+            records.extend(self.data_handler.load(self.data_handler.join(self.journal_folder, entry)))
+        return records
+
+    def _read_journal(self):
+        """
+        Reads all journal entries in write order.
+
+        Returns:
+            tuple: The list of entry names and the list of records they contain
+        """
+        entries = self._list_journal()
+        return entries, self._read_entries(entries)
+
+    def _snapshot_file(self):
+        """
+        Returns the existing snapshot file, preferring `file_name` over the legacy file, or None.
+        """
+        for file_name in (self.file_name, self.legacy_file_name):
+            if file_name is not None and self.data_handler.exists(file_name):
+                return file_name
+        return None
+
+    def has_foreign_changes(self):
+        """
+        Checks whether another session has replaced the snapshot or written journal entries since the last load.
+        """
+        if self.data_handler.version(self.file_name) != self.snapshot_version:
+            return True
+        known = set(self.journal_entries)
+        return any(entry not in known for entry in self._list_journal())
+
+    def load(self, initial_value=None, **load_args):
+        """
+        Load the snapshot and replay the journal on top of it.
+
+        Args:
+            initial_value (Any, optional): Value used as snapshot if the snapshot file does not exist.
+                If None and neither snapshot nor journal exist, FileNotFoundError is raised.
+            **load_args: Additional arguments for loading the snapshot (e.g. parse_dates). Columns listed
+                in `parse_dates` are converted for the journal records as well.
+
+        Returns:
+            pd.DataFrame: All records in write order, without deleted records
+        """
+        self._load_args = load_args
+        self.snapshot_version = self.data_handler.version(self.file_name)
+        entries, records = self._read_journal()
+        self.journal_entries = entries
+        self.tombstone_count = 0
+
+        snapshot_file = self._snapshot_file()
+        if snapshot_file is not None:
+            data = self.data_handler.load(snapshot_file, **load_args)
+        elif initial_value is not None or records:
+            data = initial_value if initial_value is not None else pd.DataFrame()
+        else:
+            raise FileNotFoundError(f"File does not exist: {self.file_name}")
+
+        if records:
+            data = self.data_handler.parse_dates(self._replay(data, records), load_args.get('parse_dates'))
+
+        if self.id_column is not None and not data.empty and \
+                (self.id_column not in data.columns or data[self.id_column].isna().any()):
+            data = self.assign_ids(data, self.id_column)
+            self.compact(data)  # persist the new IDs, otherwise they could not be referenced by tombstones
+
+        self.record_count = len(data)
+        return data
+
+    def _replay(self, data, records):
+        """
+        Appends the journal records to the data and removes the records deleted by tombstones.
+        """
+        deleted = {record[self.tombstone_key] for record in records if self.tombstone_key in record}
+        records = [record for record in records if self.tombstone_key not in record]
+        self.tombstone_count += len(deleted)
+
+        if records:
+            journal_df = pd.DataFrame(records)
+            data = journal_df if data.empty else self.data_handler.concat_records([data, journal_df])
+            if self.id_column in data.columns:
+                ids = data[self.id_column]
+                duplicated = ids.duplicated() & ids.notna()
+                if duplicated.any():
+                    data = data[~duplicated].reset_index(drop=True)
+        if deleted and self.id_column in data.columns:
+            data = data[~data[self.id_column].isin(deleted)].reset_index(drop=True)
+        return data
+
+    def refresh(self, data):
+        """
+        Bring loaded data up to date with changes that other sessions have written since.
+
+        Only journal entries that are not contained in the data yet are read. If the snapshot was
+        replaced in the meantime, the store is loaded again completely.
+
+        Args:
+            data (pd.DataFrame): The records as returned by `load` (plus own appends and deletes)
+
+        Returns:
+            pd.DataFrame: The up to date records, or the given object if nothing changed
+        """
+        known = set(self.journal_entries)
+        entries = self._list_journal()
+        if self.data_handler.version(self.file_name) != self.snapshot_version or not known.issubset(entries):
+            return self.load(pd.DataFrame(), **self._load_args)
+
+        new_entries = [entry for entry in entries if entry not in known]
+        if not new_entries:
+            return data
+
+        records = self._read_entries(new_entries)
+        self.journal_entries.extend(new_entries)
+        data = self.data_handler.parse_dates(self._replay(data, records), self._load_args.get('parse_dates'))
+        self.record_count = len(data)
+        return data
+
+    @staticmethod
+    def assign_ids(data, id_column):
+        """
+        Gives every record without ID a new unique ID.
+
+        Args:
+            data (pd.DataFrame): The records
+            id_column (str): Column holding the record ID
+
+        Returns:
+            pd.DataFrame: A copy of the records where every record has an ID
+        """
+        data = data.copy()
+        if id_column not in data.columns:
+            data[id_column] = None
+        missing = data[id_column].isna()
+        data[id_column] = data[id_column].astype(object)
+        data.loc[missing, id_column] = [RecordStore.new_id() for _ in range(missing.sum())]
+        return data
+
+    def append(self, record):
+        """
+        Append a single record to the journal.
+
+        Appending the same record again (e.g. when retrying after an error) has no further effect.
+
+        Args:
+            record (dict): The record to persist. Values that are not JSON serializable
+                (e.g. timestamps) are stored as strings.
+
+        Returns:
+            str: Name of the journal entry holding the record
+        """
+        entry, written = self._write_entry([record])
+        if written:
+            self.record_count += 1
+        return entry
+
+    def append_records(self, records):
+        """
+        Append several records to the journal as one entry.
+
+        A single record is written like with `append`. An entry with several records gets a new name
+        on a retry, the records it holds twice are only loaded once (see `load`).
+
+        Args:
+            records (list): The records (dicts) to persist
+
+        Returns:
+            str: Name of the journal entry holding the records, or None if there was nothing to append
+        """
+        if not records:
+            return None
+        entry, written = self._write_entry(list(records))
+        if written:
+            self.record_count += len(records)
+        return entry
+
+    def _write_entry(self, lines):
+        """
+        Writes lines as journal entry unless this store has written the same entry before.
+
+        Returns:
+            tuple: The entry name and whether it was written now
+        """
+        entry = self._new_entry_name(lines)
+        if entry in self.journal_entries:
+            return entry, False
+
+        if not self._journal_ready:
+            self.data_handler.makedirs(self.journal_folder)
+            self._journal_ready = True
+
+        self.data_handler.save(self.data_handler.join(self.journal_folder, entry), lines)
+        self.journal_entries.append(entry)
+        return entry, True
+
+    def delete_records(self, records):
+        """
+        Delete records by writing tombstones with their IDs to the journal.
+
+        Deleting the same records again (e.g. when retrying after an error) has no further effect.
+
+        Args:
+            records (pd.DataFrame): The records to delete, identified by their `id_column`
+
+        Returns:
+            str: Name of the journal entry holding the tombstones, or None if there was nothing to delete
+
+        Raises:
+            ValueError: If the store has no id_column
+        """
+        if self.id_column is None:
+            raise ValueError("RecordStore: Records can only be deleted if an id_column is set")
+
+        record_ids = [str(record_id) for record_id in records[self.id_column].dropna()]
+        if not record_ids:
+            return None
+        entry, written = self._write_entry([{self.tombstone_key: record_id} for record_id in record_ids])
+        if written:
+            self.tombstone_count += len(record_ids)
+            self.record_count -= len(record_ids)
+        return entry
+
+    @property
+    def needs_compaction(self):
+        stored_count = self.record_count + self.tombstone_count
+        return len(self.journal_entries) >= self.compaction_threshold or \
+            (self.tombstone_count > 0 and self.tombstone_count >= self.tombstone_ratio * stored_count)
+
+    def _merge(self, data):
+        """
+        Merges the stored records, including changes of other sessions, into the data.
+
+        All own appends and deletes are already in the journal, so the stored records are complete.
+        Records of the data win over stored records with the same ID; records that are no longer
+        stored (deleted by another session) are dropped. Without `id_column` the data is kept as is.
+        """
+        stored = self.load(pd.DataFrame(), **self._load_args)
+        if self.id_column is None or self.id_column not in stored.columns:
+            return data
+        if self.id_column not in data.columns:
+            return stored
+
+        stored_ids = stored[self.id_column]
+        data = data[data[self.id_column].isin(stored_ids)]
+        added = stored[~stored_ids.isin(data[self.id_column])]
+        return self.data_handler.concat_records([data, added]) if not added.empty else data.reset_index(drop=True)
+
+    def compact(self, data):
+        """
+        Write the complete data as new snapshot and drop the journal entries it contains.
+
+        The write is conditional: if another session has replaced the snapshot or written journal
+        entries since the last load, these changes are merged into the data first. The snapshot is
+        only replaced if it still has the version the merge was based on, otherwise the merge is
+        repeated. The merged records show up in the loaded data after the next `refresh`.
+
+        Args:
+            data (pd.DataFrame): The complete records, i.e. the loaded snapshot plus all appended records
+
+        Raises:
+            RuntimeError: If other sessions replaced the snapshot during every attempt
+        """
+        merged = False
+        for _ in range(self.write_attempts):
+            if self.has_foreign_changes():
+                data = self._merge(data)
+                merged = True
+            if self.data_handler.save_if_version(self.file_name, data, self.snapshot_version):
+                break
+        else:
+            raise RuntimeError(f"RecordStore: {self.file_name} was changed concurrently, compaction skipped")
+
+        for entry in self.journal_entries:
+            self.data_handler.remove(self.data_handler.join(self.journal_folder, entry))
+        self.journal_entries = []
+        self.record_count = len(data)
+        self.tombstone_count = 0
+        # after a merge the caller's data misses records, so the next refresh loads everything again
+        self.snapshot_version = None if merged else self.data_handler.version(self.file_name)
+
+    def drop(self):
+        """
+        Delete the snapshot and the complete journal.
+        """
+        self.data_handler.remove(self.file_name)
+        for entry in self.data_handler.listdir(self.journal_folder):
+            self.data_handler.remove(self.data_handler.join(self.journal_folder, entry))
+        self.journal_entries = []
+        self.record_count = 0
+        self.tombstone_count = 0
+        self.snapshot_version = None
+
+
+class PartitionedRecordStore:
+    """
+    Record storage that splits the records into one RecordStore per value of a column (e.g. the patient ID).
+
+    Every partition has its own snapshot and journal in `folder`. A small manifest file lists the
+    partitions with their column value and record count, so the values (e.g. for a patient selector)
+    are known without loading any records. Appending or deleting a record only touches the journal
+    of its partition and the manifest, and a compaction only rewrites the partitions whose records
+    changed or that are due for compaction.
+
+    The manifest has a version that increases with every write and a revision per partition. Manifest
+    writes are conditional: the manifest is read again right before writing and the own changes are
+    applied on top, so concurrent sessions do not overwrite each other. `refresh` compares the
+    versions and only refreshes the partitions whose revision changed.
+
+    `open` only reads the manifest, e.g. to list the patients at login; `load_partitions` then loads
+    single partitions when they are needed. Until all partitions are loaded, `refresh` and `compact`
+    only handle the loaded partitions.
+
+    To load all records without reading every partition, a combined snapshot holds the records of
+    all partitions together with the partition revisions it contains. `load` reads the combined
+    snapshot and only loads the partitions that changed since it was written. Once
+    `combined_threshold` partitions have changed, the next compaction writes a new combined snapshot.
+
+        >>> store = PartitionedRecordStore(data_handler, "records", "patient_id", snapshot_format="parquet")
+        >>> df = store.load(initial_value=pd.DataFrame(), parse_dates=["timestamp"])
+        >>> store.append({"patient_id": "12345", "timestamp": "2025-01-01 12:00:00"})
+        >>> store.load_partition("12345")
+        >>> df = store.refresh(df)
+        >>> store.open()  # only the manifest, e.g. {'12345': 1}
+        >>> df = store.load_partitions(pd.DataFrame(), ["12345"])
+
+    Attributes:
+        data_handler (DataHandler): Handler for the parent folder of `folder`
+        folder (str): Folder holding the manifest and all partitions
+        partition_by (str): Column whose value selects the partition of a record
+        order_by (str): Column by which the loaded records are sorted, or None
+        manifest (dict): Partition key -> {'value': column value, 'count': number of records, 'revision': int}
+        combined (dict): The combined snapshot, {'file': file name, 'revisions': partition key -> revision}
+        combined_threshold (int): Number of changed partitions after which the combined snapshot is rewritten
+        manifest_version (int): Version of the manifest the loaded data is based on
+        known_revisions (dict): Partition key -> revision of the partition contained in the loaded data
+        complete (bool): Whether the loaded data holds all partitions, False after `open`
+        partitions (dict): Partition key -> RecordStore of the partitions used so far
+        legacy_store (RecordStore): Unpartitioned store whose records are migrated on first load
+    """
+
+    manifest_name = 'manifest.json'
+
+    def __init__(self, data_handler, folder, partition_by, compaction_threshold=50, snapshot_format=None,
+                 order_by=None, legacy_store=None, id_column=None, tombstone_ratio=0.2, combined_threshold=10):
+        """
+        Initialize the partitioned record store.
+
+        Args:
+            data_handler (DataHandler): Handler for the parent folder of `folder`
+            folder (str): Folder holding the manifest and all partitions
+            partition_by (str): Column whose value selects the partition of a record
+            compaction_threshold (int, optional): Journal entries per partition after which it is compacted. Defaults to 50.
+            snapshot_format (str, optional): File format of the partition snapshots. Defaults to 'csv'.
+            order_by (str, optional): Column by which the loaded records are sorted. Defaults to None.
+            legacy_store (RecordStore, optional): Unpartitioned store that is migrated if no manifest exists yet
+            id_column (str, optional): Column holding a stable record ID, see RecordStore. Defaults to None.
+            tombstone_ratio (float, optional): Share of deleted records per partition after which it is compacted.
+                Defaults to 0.2.
+            combined_threshold (int, optional): Changed partitions after which the combined snapshot is rewritten.
+                Defaults to 10.
+        """
+        self.data_handler = data_handler
+        self.folder = folder
+        self.partition_by = partition_by
+        self.compaction_threshold = compaction_threshold
+        self.snapshot_format = snapshot_format or 'csv'
+        self.order_by = order_by
+        self.legacy_store = legacy_store
+        self.id_column = id_column
+        self.tombstone_ratio = tombstone_ratio
+        self.manifest = {}
+        self.manifest_version = 0
+        self.combined = {}
+        self.combined_threshold = combined_threshold
+        self.known_revisions = {}
+        self.complete = True
+        self.partitions = {}
+        self._load_args = {}
+        self._counted_entries = set()  # journal entries whose records are counted in the manifest
+
+    @property
+    def manifest_file(self):
+        return self.data_handler.join(self.folder, self.manifest_name)
+
+    @staticmethod
+    def partition_key(value):
+        """
+        Builds a file name safe partition key for a column value.
+
+        Args:
+            value: The column value, e.g. a patient ID
+
+        Returns:
+            str: A readable prefix of the value plus a short hash that keeps different values apart
+        """
+        value = '' if value is None or pd.isna(value) else str(value)
+        prefix = re.sub(r'[^a-zA-Z0-9_-]', '_', value)[:40] or 'ohne_wert'
+        return f"{prefix}_{hashlib.sha1(value.encode('utf-8')).hexdigest()[:8]}"
+
+    def _partition(self, key):
+        if key not in self.partitions:
+            file_name = self.data_handler.join(self.folder, f"{key}.{self.snapshot_format}")
+            self.partitions[key] = RecordStore(self.data_handler, file_name, self.compaction_threshold,
+                                               id_column=self.id_column, tombstone_ratio=self.tombstone_ratio)
+            # partitions taken from the combined snapshot are loaded by `refresh` with the same arguments
+            self.partitions[key]._load_args = self._load_args
+        return self.partitions[key]
+
+    def _read_manifest(self):
+        """
+        Reads the current manifest from storage, bypassing cached metadata.
+
+        Returns:
+            tuple: The manifest version, the partitions, the combined snapshot and the file version
+                for a conditional write
+        """
+        file_version = self.data_handler.version(self.manifest_file)
+        manifest = self.data_handler.load(self.manifest_file, initial_value={}) if file_version is not None else {}
+        return manifest.get('version', 0), manifest.get('partitions', {}), manifest.get('combined', {}), file_version
+
+    def _update_manifest(self, updates, combined=None):
+        """
+        Conditionally writes changes of partitions to the manifest.
+
+        The manifest is read again right before writing and the changes are applied to its current
+        state, so changes of other sessions are kept. The write only succeeds if the manifest file
+        was not replaced since it was read; otherwise it is read again and the changes are reapplied.
+        A partition only counts as known in its new revision if nobody else had changed it since it
+        was loaded.
+
+        Args:
+            updates (dict): Partition key -> function that takes the current manifest entry (or None)
+                and returns the new entry (or None to remove the partition)
+            combined (dict, optional): A new combined snapshot. Defaults to None (keep the current one).
+
+        Returns:
+            dict: The combined snapshot that was replaced by `combined`, or None
+
+        Raises:
+            RuntimeError: If other sessions replaced the manifest during every attempt
+        """
+        for _ in range(RecordStore.write_attempts):
+            version, manifest, current_combined, file_version = self._read_manifest()
+            known, removed = {}, []
+            for key, update in updates.items():
+                entry = manifest.get(key)
+                up_to_date = (entry or {}).get('revision', 0) == self.known_revisions.get(key, 0)
+                entry = update(dict(entry) if entry is not None else None)
+                if entry is None:
+                    manifest.pop(key, None)
+                    removed.append(key)
+                    continue
+                entry['revision'] = entry.get('revision', 0) + 1
+                manifest[key] = entry
+                if up_to_date:
+                    known[key] = entry['revision']
+            content = {'version': version + 1, 'partitions': manifest,
+                       'combined': combined if combined is not None else current_combined}
+            if self.data_handler.save_if_version(self.manifest_file, content, file_version):
+                break
+        else:
+            raise RuntimeError(f"PartitionedRecordStore: {self.manifest_file} was changed concurrently")
+
+        for key in removed:
+            self.known_revisions.pop(key, None)
+        self.known_revisions.update(known)
+        if version == self.manifest_version:
+            self.manifest_version = version + 1
+        self.manifest = manifest
+        self.combined = content['combined']
+        return current_combined if combined is not None else None
+
+    def _normalize(self, data):
+        """
+        Sorts the records and stores the partition column as strings, like the manifest values.
+        """
+        if self.partition_by in data.columns:
+            data[self.partition_by] = data[self.partition_by].map(lambda v: v if pd.isna(v) else str(v))
+        if self.order_by is not None and self.order_by in data.columns:
+            data = data.sort_values(self.order_by, kind='stable', ignore_index=True)
+        return data
+
+    def _keys(self, data):
+        """
+        The partition key of every record, as array.
+        """
+        if self.partition_by not in data.columns:
+            return pd.Series(self.partition_key(None), index=data.index).values
+        values = data[self.partition_by]
+        keys = {value: self.partition_key(value) for value in values.dropna().unique()}
+        return values.map(keys).fillna(self.partition_key(None)).values
+
+    def _combined_revisions(self):
+        """
+        Partition key -> revision for the partitions whose current revision is in the combined snapshot.
+        """
+        revisions = self.combined.get('revisions', {})
+        return {key: entry.get('revision', 0) for key, entry in self.manifest.items()
+                if key in revisions and revisions[key] == entry.get('revision', 0)}
+
+    def _load_combined(self):
+        """
+        Loads the records of the partitions that are up to date in the combined snapshot.
+
+        Returns:
+            tuple: The list of loaded DataFrames and the set of partition keys they cover
+        """
+        keys = set(self._combined_revisions())
+        if not keys:
+            return [], set()
+        try:
+            data = self.data_handler.load(self.data_handler.join(self.folder, self.combined['file']), **self._load_args)
+        except FileNotFoundError:
+            return [], set()  # replaced by another session in the meantime, the partitions are loaded one by one
+        return [data[pd.Series(self._keys(data)).isin(keys).values]], keys
+
+    def _load_partitions(self, keys):
+        """
+        Loads the given partitions concurrently and returns their non-empty DataFrames.
+        """
+        partitions = [self._partition(key) for key in keys]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            frames = list(executor.map(lambda partition: partition.load(pd.DataFrame(), **self._load_args), partitions))
+        return [frame for frame in frames if not frame.empty]
+
+    def load(self, initial_value=None, **load_args):
+        """
+        Load the records of all partitions.
+
+        The records of partitions that did not change since the combined snapshot was written are taken
+        from the combined snapshot, the other partitions are loaded concurrently. If there is no manifest
+        yet but the legacy store has records, they are split into partitions first.
+
+        Args:
+            initial_value (Any, optional): Value returned if no records exist. If None, FileNotFoundError is raised.
+            **load_args: Additional arguments for loading the partitions (e.g. parse_dates)
+
+        Returns:
+            pd.DataFrame: All records
+        """
+        self._load_args = load_args
+        self.complete = True
+        if not self.data_handler.exists(self.manifest_file):
+            self.manifest, self.manifest_version, self.known_revisions = {}, 0, {}
+            if self.legacy_store is not None:
+                try:
+                    data = self.legacy_store.load(**load_args)
+                except FileNotFoundError:
+                    data = None
+                if data is not None and not data.empty:
+                    data = self._normalize(data)
+                    if self.id_column is not None:
+                        data = RecordStore.assign_ids(data, self.id_column)
+                    self._migrate(data)
+                    return data
+            if initial_value is None:
+                raise FileNotFoundError(f"File does not exist: {self.manifest_file}")
+            return initial_value
+
+        self.manifest_version, self.manifest, self.combined, _ = self._read_manifest()
+        self.known_revisions = {key: entry.get('revision', 0) for key, entry in self.manifest.items()}
+        frames, combined_keys = self._load_combined()
+        frames = [frame for frame in frames if not frame.empty]
+        frames.extend(self._load_partitions([key for key in self.manifest if key not in combined_keys]))
+        if not frames:
+            return initial_value if initial_value is not None else pd.DataFrame()
+        return self._normalize(self.data_handler.concat_records(frames))
+
+    def refresh(self, data):
+        """
+        Bring loaded data up to date with changes that other sessions have written since.
+
+        If the manifest version is unchanged, nothing else is read. Otherwise only partitions with a
+        new revision are refreshed (reading only their new journal entries), removed partitions are
+        dropped and new partitions are loaded.
+
+        Args:
+            data (pd.DataFrame): The records as returned by `load` (plus own appends and deletes)
+
+        Returns:
+            pd.DataFrame: The up to date records, or the given object if nothing changed
+        """
+        version, manifest, combined, _ = self._read_manifest()
+        if version == self.manifest_version:
+            return data
+
+        # partitions that are not loaded after `open` stay unloaded, their manifest entries are still updated
+        changed = {key for key, entry in manifest.items() if entry.get('revision', 0) != self.known_revisions.get(key)
+                   and (self.complete or key in self.known_revisions)}
+        removed = set(self.known_revisions) - set(manifest)
+        new_keys = [key for key in changed if key not in self.known_revisions]
+
+        frames = []
+        if not data.empty:
+            keys = self._keys(data)
+            frames.append(data[~pd.Series(keys).isin(changed | removed).values])
+            for key in changed - set(new_keys):
+                frames.append(self._partition(key).refresh(data[keys == key]))
+        frames.extend(self._load_partitions(new_keys))
+
+        self.manifest, self.manifest_version, self.combined = manifest, version, combined
+        self.known_revisions = {key: entry.get('revision', 0) for key, entry in manifest.items()
+                                if self.complete or key in self.known_revisions}
+        frames = [frame for frame in frames if not frame.empty]
+        return self._normalize(self.data_handler.concat_records(frames)) if frames else data.iloc[0:0]
+
+    def open(self, **load_args):
+        """
+        Read only the manifest, so the partitions can be loaded when they are needed with `load_partitions`.
+
+        Like `load`, the records of the legacy store are split into partitions if there is no manifest yet.
+
+        Args:
+            **load_args: Additional arguments for loading the partitions later (e.g. parse_dates)
+
+        Returns:
+            dict: Column value -> number of records per partition, see `partition_counts`
+        """
+        if not self.data_handler.exists(self.manifest_file) and self.legacy_store is not None:
+            self.load(pd.DataFrame(), **load_args)
+        self._load_args = load_args
+        self.manifest_version, self.manifest, self.combined, _ = self._read_manifest()
+        self.known_revisions = {}
+        self.complete = not self.manifest  # without partitions, new ones of other sessions are loaded by `refresh`
+        return self.partition_counts()
+
+    def partition_counts(self):
+        """
+        The column values of all partitions with their number of records, as listed in the manifest.
+
+        Returns:
+            dict: Column value (e.g. patient ID) -> number of records, sorted by value
+        """
+        return dict(sorted((entry['value'], entry['count']) for entry in self.manifest.values()))
+
+    def load_partitions(self, data, values=None):
+        """
+        Add the records of partitions that are not loaded yet to the data, e.g. after `open`.
+
+        Args:
+            data (pd.DataFrame): The records loaded so far (plus own appends and deletes)
+            values (list, optional): Column values of the partitions to load. Defaults to None
+                (all partitions, read like `load` from the combined snapshot).
+
+        Returns:
+            pd.DataFrame: The data with the records of the loaded partitions, or the given object
+                if they were loaded already
+        """
+        if self.complete:
+            return data
+        if values is None:
+            return self.load(pd.DataFrame(), **self._load_args)
+
+        _, manifest, _, _ = self._read_manifest()
+        keys = [key for key in dict.fromkeys(self.partition_key(value) for value in values)
+                if key in manifest and key not in self.known_revisions]
+        if not keys:
+            return data
+        frames = [data] if not data.empty else []
+        frames.extend(self._load_partitions(keys))
+        # only the loaded partitions get the current revision, `refresh` compares the others by manifest version
+        self.known_revisions.update({key: manifest[key].get('revision', 0) for key in keys})
+        if len(frames) == (0 if data.empty else 1):
+            return data
+        return self._normalize(self.data_handler.concat_records(frames))
+
+    def load_partition(self, value, **load_args):
+        """
+        Load only the records of one partition.
+
+        Args:
+            value: The column value of the partition, e.g. a patient ID
+            **load_args: Additional arguments for loading the partition (e.g. parse_dates)
+
+        Returns:
+            pd.DataFrame: The records of the partition (empty if it does not exist)
+        """
+        return self._normalize(self._partition(self.partition_key(value)).load(pd.DataFrame(), **load_args))
+
+    def _migrate(self, data):
+        """
+        Writes records of the legacy store as partitions. The legacy files are kept untouched.
+        """
+        updates = {}
+        for key, subset in self._group(data):
+            self._partition(key).compact(subset)
+            updates[key] = self._set_entry(self._partition_value(subset), len(subset))
+        self._update_manifest(updates)
+
+    def _partition_value(self, subset):
+        if self.partition_by not in subset.columns or pd.isna(subset[self.partition_by].iloc[0]):
+            return ''
+        return str(subset[self.partition_by].iloc[0])
+
+    def _group(self, data):
+        if data.empty:
+            return []
+        return data.groupby(self._keys(data), sort=False)
+
+    @staticmethod
+    def _set_entry(value, count):
+        return lambda entry: {**(entry or {}), 'value': value, 'count': count}
+
+    @staticmethod
+    def _add_to_entry(value, count_delta):
+        return lambda entry: {**(entry or {}), 'value': value,
+                              'count': max((entry or {}).get('count', 0) + count_delta, 0)}
+
+    def append(self, record):
+        """
+        Append a single record to the journal of its partition and update the manifest.
+
+        Args:
+            record (dict): The record to persist
+        """
+        value = record.get(self.partition_by)
+        value = '' if value is None or pd.isna(value) else str(value)
+        key = self.partition_key(value)
+        entry = self._partition(key).append(record)
+        # on a retry, the record is only counted if the manifest update failed the last time
+        if (key, entry) not in self._counted_entries:
+            self._update_manifest({key: self._add_to_entry(value, 1)})
+            self._counted_entries.add((key, entry))
+
+    def delete_records(self, records):
+        """
+        Delete records by writing tombstones to the journals of their partitions and update the manifest.
+
+        Args:
+            records (pd.DataFrame): The records to delete, with partition column and ID column
+        """
+        updates, entries = {}, []
+        for key, subset in self._group(records):
+            entry = self._partition(key).delete_records(subset)
+            if entry is not None and (key, entry) not in self._counted_entries:
+                updates[key] = self._add_to_entry(self._partition_value(subset), -len(subset))
+                entries.append((key, entry))
+        if updates:
+            self._update_manifest(updates)
+            self._counted_entries.update(entries)
+
+    @property
+    def needs_compaction(self):
+        return any(partition.needs_compaction for partition in self.partitions.values()) or \
+            self._needs_combined()
+
+    def _needs_combined(self):
+        # only written from complete data, a combined snapshot of some partitions would make `load` read more files
+        return self.complete and len(self.manifest) - len(self._combined_revisions()) >= self.combined_threshold
+
+    def compact(self, data):
+        """
+        Write the partitions whose records changed and drop partitions without records.
+
+        A partition is rewritten if its number of records differs from the manifest (e.g. after a
+        delete) or if its journal is due for compaction. Partitions that are missing in the data are
+        only dropped if no other session has written to them in the meantime. Afterwards the combined
+        snapshot is rewritten if `combined_threshold` partitions have changed since it was written.
+
+        Args:
+            data (pd.DataFrame): The complete records of all loaded partitions
+        """
+        keys = set()
+        updates = {}
+        for key, subset in self._group(data):
+            keys.add(key)
+            partition = self._partition(key)
+            entry = self.manifest.get(key)
+            if entry is None or entry['count'] != len(subset) or partition.needs_compaction:
+                partition.compact(subset)
+                updates[key] = self._set_entry(self._partition_value(subset), partition.record_count)
+
+        for key in [key for key in self.known_revisions if key not in keys]:
+            partition = self._partition(key)
+            if partition.has_foreign_changes():
+                partition.compact(data.iloc[0:0])  # keeps the records written by the other session
+            if partition.has_foreign_changes() or partition.record_count > 0:
+                updates[key] = self._set_entry(self.manifest.get(key, {}).get('value', ''), partition.record_count)
+            else:
+                partition.drop()
+                updates[key] = lambda entry: None
+
+        if updates:
+            self._update_manifest(updates)
+        if self._needs_combined():
+            self._write_combined(data)
+
+    def _write_combined(self, data):
+        """
+        Writes the records of all partitions that are up to date in the data as new combined snapshot.
+
+        The snapshot gets a new file name, so sessions that still read the previous one are not disturbed.
+        """
+        revisions = {key: revision for key, revision in self.known_revisions.items()
+                     if self.manifest.get(key, {}).get('revision', 0) == revision}
+        if not data.empty:
+            data = data[pd.Series(self._keys(data)).isin(set(revisions)).values]
+        file_name = f"combined_{RecordStore.new_id()}.{self.snapshot_format}"
+        self.data_handler.save(self.data_handler.join(self.folder, file_name), data)
+        replaced = self._update_manifest({}, combined={'file': file_name, 'revisions': revisions})
+        if replaced and replaced.get('file') and replaced['file'] != file_name:
+            self.data_handler.remove(self.data_handler.join(self.folder, replaced['file']))
@@ -0,0 +1,198 @@
+import ast
+import numpy as np
+import pandas as pd
+
+# Cell types of the differential blood count in display order
+CELL_TYPES = (
+    "Segmentkernige Neutrophile",
+    "Stabkernige Neutrophile",
+    "Eosinophile",
+    "Basophile",
+    "Monozyten",
+    "Lymphozyten",
+    "Plasmazellen",
+    "Vorstufen",
+)
+
+SEXES = ("Männlich", "Weiblich")  # any other value uses the ranges for unknown sex
+
+# Age bands in years: [0, 1), [1, 5), [5, 12), [12, inf). A missing age uses the last band.
+AGE_BAND_EDGES = np.array([1, 5, 12])
+
+# Reference ranges in percent per age band, in the order of CELL_TYPES. The ranges do not differ
+# between the sexes yet, sex specific ranges only need another entry in _SEX_RANGES.
+_AGE_BAND_RANGES = [
+    [(35, 65), (5, 15), (2, 8), (0, 1), (5, 12), (20, 50), (0, 2), (0, 2)],
+    [(30, 60), (3, 8), (1, 6), (0, 1), (2, 10), (30, 55), (0, 2), (0, 1)],
+    [(40, 65), (2, 6), (1, 5), (0, 1), (2, 8), (25, 45), (0, 2), (0, 1)],
+    [(40, 75), (3, 6), (1, 6), (0, 1), (2, 10), (15, 45), (0, 2), (0, 1)],
+]
+_SEX_RANGES = {}  # sex -> ranges like _AGE_BAND_RANGES, overriding them for that sex
+
+
+def _build_table():
+    """
+    Builds the table of reference ranges with shape (age bands, sexes incl. unknown, cell types, low/high).
+    """
+    table = np.empty((len(_AGE_BAND_RANGES), len(SEXES) + 1, len(CELL_TYPES), 2))
+    for sex_index, sex in enumerate(SEXES + (None,)):
+        table[:, sex_index] = _SEX_RANGES.get(sex, _AGE_BAND_RANGES)
+    table.setflags(write=False)
+    return table
+
+
+TABLE = _build_table()
+
+
+def _age_band(ages):
+    ages = pd.to_numeric(pd.Series(ages, dtype=object), errors="coerce").to_numpy(dtype=float)
+    bands = np.searchsorted(AGE_BAND_EDGES, ages, side="right")
+    bands[np.isnan(ages)] = len(AGE_BAND_EDGES)
+    return bands
+
+
+def _sex_index(genders):
+    genders = pd.Series(genders, dtype=object)
+    return genders.map({sex: i for i, sex in enumerate(SEXES)}).fillna(len(SEXES)).to_numpy(dtype=int)
+
+
+def lookup(ages, genders):
+    """
+    Looks up the reference ranges of many samples at once.
+
+    Args:
+        ages (array-like): Age in years per sample, missing or invalid values use the adult ranges
+        genders (array-like): Sex per sample ('Männlich', 'Weiblich' or anything else for unknown)
+
+    Returns:
+        tuple: Arrays of the lower and upper limits in percent, each with shape (samples, cell types)
+    """
+    ranges = TABLE[_age_band(ages), _sex_index(genders)]
+    return ranges[..., 0], ranges[..., 1]
+
+
+def evaluate(percentages, ages, genders):
+    """
+    Flags the values of many samples that are outside of their reference range.
+
+    Args:
+        percentages (np.ndarray): Percentages with shape (samples, cell types) in the order of CELL_TYPES
+        ages (array-like): Age in years per sample
+        genders (array-like): Sex per sample
+
+    Returns:
+        np.ndarray: -1 below, 0 within and 1 above the reference range, with the shape of `percentages`
+    """
+    low, high = lookup(ages, genders)
+    return (percentages > high).astype(np.int8) - (percentages < low).astype(np.int8)
+
+
+def reference_ranges(age, gender):
+    """
+    The reference ranges of a single sample.
+
+    Args:
+        age (int): Age in years, None for unknown
+        gender (str): Sex of the patient
+
+    Returns:
+        dict: Cell type -> (low, high) reference range in percent
+    """
+    low, high = lookup([age], [gender])
+    return {cell: (int(l), int(h)) for cell, l, h in zip(CELL_TYPES, low[0], high[0])}
+
+
+def counts_matrix(counts):
+    """
+    Builds the matrix of cell counts from a column of count dicts.
+
+    Args:
+        counts (pd.Series): Cell type -> count dicts per sample, or a struct column with one field per cell type;
+            strings are parsed, missing values count as empty
+
+    Returns:
+        np.ndarray: Counts with shape (samples, cell types) in the order of CELL_TYPES
+    """
+    if isinstance(counts.dtype, pd.ArrowDtype) and counts.dtype.type is dict:
+        # typed struct column as read from Parquet: one vectorized column per cell type
+        fields = {field.name for field in counts.dtype.pyarrow_dtype}
+        matrix = np.zeros((len(counts), len(CELL_TYPES)))
+        for position, cell in enumerate(CELL_TYPES):
+            if cell in fields:
+                matrix[:, position] = pd.to_numeric(counts.struct.field(cell), errors="coerce").to_numpy(dtype=float, na_value=0)
+        return matrix
+
+    def as_dict(value):
+        if isinstance(value, dict):
+            return value
+        if isinstance(value, str):
+            try:
+                value = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                return {}
+            return value if isinstance(value, dict) else {}
+        return {}
+
+    frame = pd.DataFrame.from_records([as_dict(value) for value in counts], columns=list(CELL_TYPES))
+    return frame.apply(pd.to_numeric, errors="coerce").fillna(0).to_numpy(dtype=float)
+
+
+def evaluate_records(data):
+    """
+    Evaluates the cell counts of many samples in one pass.
+
+    Args:
+        data (pd.DataFrame): Samples with the columns counts, age and gender (e.g. the saved results)
+
+    Returns:
+        dict: Arrays with one row per sample:
+            'counts' (samples x cell types), 'totals', 'percentages' (rounded to one decimal like on the
+            evaluation page, 0 if nothing was counted), 'low' and 'high' (reference limits),
+            'flags' (-1 below, 0 within, 1 above the range, 0 if nothing was counted) and 'any_abnormal'
+    """
+    counts = counts_matrix(data["counts"] if "counts" in data.columns else pd.Series([None] * len(data)))
+    totals = counts.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentages = np.where(totals[:, None] > 0, np.round(counts / totals[:, None] * 100, 1), 0.0)
+
+    ages = data["age"] if "age" in data.columns else [None] * len(data)
+    genders = data["gender"] if "gender" in data.columns else [None] * len(data)
+    low, high = lookup(ages, genders)
+    flags = (percentages > high).astype(np.int8) - (percentages < low).astype(np.int8)
+    flags[totals == 0] = 0
+
+    return {
+        "counts": counts,
+        "totals": totals,
+        "percentages": percentages,
+        "low": low,
+        "high": high,
+        "flags": flags,
+        "any_abnormal": (flags != 0).any(axis=1),
+    }
+
+
+def summarize(evaluation):
+    """
+    Summary statistics per cell type over the evaluated samples that have counts.
+
+    Args:
+        evaluation (dict): Result of `evaluate_records`
+
+    Returns:
+        pd.DataFrame: Mean, median and standard deviation of the percentages and the share of samples
+            below and above the reference range, one row per cell type
+    """
+    counted = evaluation["totals"] > 0
+    percentages = evaluation["percentages"][counted]
+    flags = evaluation["flags"][counted]
+    if not counted.any():
+        percentages = np.full((1, len(CELL_TYPES)), np.nan)
+        flags = np.zeros((1, len(CELL_TYPES)))
+    return pd.DataFrame({
+        "Mittelwert (%)": percentages.mean(axis=0),
+        "Median (%)": np.median(percentages, axis=0),
+        "Standardabweichung (%)": percentages.std(axis=0),
+        "Anteil erniedrigt": (flags < 0).mean(axis=0),
+        "Anteil erhöht": (flags > 0).mean(axis=0),
+    }, index=list(CELL_TYPES)).round(2)
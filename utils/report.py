@@ -0,0 +1,324 @@
+import hashlib, json, multiprocessing, re, threading, zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+import pandas as pd
+from fpdf import FPDF
+from utils.reference_ranges import reference_ranges
+
+
+# Layout of the report page: column widths and row height of the tables
+CELL_HEIGHT = 6
+LABEL_WIDTH = 60
+VALUE_WIDTH = 30
+CACHE_SIZE = 256
+POOL_WORKERS = None  # worker processes for exports, None for the number of CPUs
+
+_cache = OrderedDict()  # content hash -> PDF bytes, shared by all sessions of the process
+_lock = threading.Lock()
+_pool = None  # process pool for exports, shared by all sessions of the process
+_pool_lock = threading.Lock()
+
+
+class _ReportPDF(FPDF):
+    """
+    FPDF document with the fixed layout of the cell count report.
+
+    The fonts are registered in the same order in every document, so the pages of one document
+    can be inserted into another (see `export_pdf`).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.set_font("Arial", "B", 8)
+        self.set_font("Arial", "", 8)
+
+    def insert_page(self, content):
+        self.add_page()
+        self.pages[self.page] = content
+
+    def title_line(self, text):
+        self.set_font("Arial", "B", 10)
+        self.cell(0, 8, text, ln=True, align="C")
+        self.ln(4)
+
+    def heading(self, text):
+        self.set_font("Arial", "B", 8)
+        self.cell(0, CELL_HEIGHT, text, ln=True)
+
+    def table(self, header, rows):
+        self.set_font("Arial", "B", 8)
+        self._row(header)
+        self.set_font("Arial", "", 8)
+        for row in rows:
+            self._row(row)
+
+    def _row(self, values):
+        widths = [LABEL_WIDTH] + [VALUE_WIDTH] * (len(values) - 1)
+        for i, (width, value) in enumerate(zip(widths, values)):
+            self.cell(width, CELL_HEIGHT, str(value), border=1, ln=int(i == len(values) - 1))
+
+
+def format_timestamp(timestamp):
+    """
+    Formats the time of a report, 'kein Datum' if it is missing or invalid.
+    """
+    timestamp = pd.to_datetime(timestamp, errors="coerce")
+    return timestamp.strftime("%d.%m.%Y %H:%M:%S") if not pd.isnull(timestamp) else "kein Datum"
+
+
+def _ranges_for(record, reference_values):
+    if reference_values is not None:
+        return reference_values
+    return reference_ranges(record.get("age"), record.get("gender"))
+
+
+def report_key(record, reference_values=None):
+    """
+    Builds the content hash of a report.
+
+    Args:
+        record (dict): The result, see `render_report`
+        reference_values (dict, optional): Cell type -> (low, high) reference range in percent.
+            Defaults to the ranges for the age and sex of each result.
+
+    Returns:
+        str: A hash that only changes if the content of the report changes
+    """
+    content = {
+        "patient_id": record.get("patient_id", ""),
+        "gender": record.get("gender", ""),
+        "birth_date": record.get("birth_date", ""),
+        "age": record.get("age", ""),
+        "timestamp": format_timestamp(record.get("timestamp")),
+        "counts": record.get("counts") or {},
+        "morphology_results": record.get("morphology_results") or {},
+        "comment": record.get("comment") or "",
+        "reference_values": _ranges_for(record, reference_values),
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def render_report(record, reference_values=None):
+    """
+    Renders the PDF report of a result.
+
+    Args:
+        record (dict): The result with the keys patient_id, gender, birth_date, age, timestamp,
+            counts (cell type -> count), morphology_results (parameter -> severity) and comment
+        reference_values (dict, optional): Cell type -> (low, high) reference range in percent.
+            Defaults to the ranges for the age and sex of each result.
+
+    Returns:
+        bytes: The PDF document
+    """
+    pdf = _ReportPDF()
+    _add_report_page(pdf, record, reference_values)
+    return pdf.output(dest='S').encode('latin-1', 'replace')
+
+
+def _add_report_page(pdf, record, reference_values):
+    reference_values = _ranges_for(record, reference_values)
+    counts = record.get("counts") or {}
+    morphology_results = record.get("morphology_results") or {}
+
+    pdf.add_page()
+    pdf.title_line("Ergebnisse der Zellzählung")
+
+    pdf.set_font("Arial", "", 8)
+    pdf.multi_cell(0, CELL_HEIGHT, f"Patienten-ID: {record.get('patient_id', '')} | Geschlecht: {record.get('gender', '')} | "
+                                   f"Geburtsdatum: {record.get('birth_date', '')} | Alter: {record.get('age', '')} Jahre")
+    pdf.cell(0, CELL_HEIGHT, f"Zeitpunkt: {format_timestamp(record.get('timestamp'))}", ln=True)
+    pdf.ln(2)
+
+    pdf.table(["Zelltyp", "Anzahl", "Referenz"],
+              [[cell, counts.get(cell, 0), f"{low}-{high}%"] for cell, (low, high) in reference_values.items()])
+
+    pdf.ln(3)
+    pdf.heading("Morphologische Beurteilung:")
+    pdf.ln(2)
+    pdf.table(["Parameter", "Schweregrad"], list(morphology_results.items()))
+
+    pdf.ln(3)
+    pdf.heading("Kommentar:")
+    pdf.set_font("Arial", "", 8)
+    pdf.multi_cell(0, CELL_HEIGHT, record.get("comment") or "")
+
+
+def build_report(record, reference_values=None):
+    """
+    Returns the PDF report of a result, rendering it only if a report with the same content
+    was not rendered before. The cache is shared by all pages and sessions of the process.
+
+    Args:
+        record (dict): The result, see `render_report`
+        reference_values (dict, optional): Cell type -> (low, high) reference range in percent.
+            Defaults to the ranges for the age and sex of each result.
+
+    Returns:
+        bytes: The PDF document
+    """
+    key = report_key(record, reference_values)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    pdf_bytes = render_report(record, reference_values)
+    with _lock:
+        _cache[key] = pdf_bytes
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return pdf_bytes
+
+
+def report_file_name(record, prefix="Zellbericht"):
+    """
+    Builds a file name for the report of a result from its patient ID and time.
+    """
+    safe_patient_id = re.sub(r'[^a-zA-Z0-9_-]', '_', str(record.get("patient_id") or "unbekannt"))
+    timestamp = pd.to_datetime(record.get("timestamp"), errors="coerce")
+    safe_timestamp = timestamp.strftime("%Y-%m-%d_%H-%M-%S") if not pd.isnull(timestamp) else "kein_Datum"
+    return f"{prefix}_{safe_patient_id}_{safe_timestamp}.pdf"
+
+
+def _render_batch(records, reference_values):
+    return [render_report(record, reference_values) for record in records]
+
+
+def _render_pages(records, reference_values):
+    """
+    Renders the reports into one document and returns the contents of the pages of each report.
+    """
+    pdf, pages = _ReportPDF(), []
+    for record in records:
+        first_page = pdf.page + 1
+        _add_report_page(pdf, record, reference_values)
+        pages.append([pdf.pages[page] for page in range(first_page, pdf.page + 1)])
+    return pages
+
+
+def _get_pool():
+    """
+    Returns the process pool for exports, which is started on first use and shared by all sessions.
+
+    The Streamlit server runs many threads, so the workers are not forked from it (a fork copies
+    locks that other threads hold at that moment). They are started by a fork server instead,
+    or spawned where fork servers are not available.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _discard_pool(pool):
+    """
+    Drops a pool whose worker died, so the next export starts a new one.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _iter_rendered(render_batch, records, reference_values, batch_size):
+    """
+    Yields the results of `render_batch` for the records in order. Small exports are rendered in the
+    current process, where starting the pool would take longer than rendering.
+    """
+    if len(records) <= 2 * batch_size:
+        for record in records:
+            yield from render_batch([record], reference_values)
+        return
+
+    batches = [records[start:start + batch_size] for start in range(0, len(records), batch_size)]
+    pool = _get_pool()
+    try:
+        for batch in pool.map(render_batch, batches, repeat(reference_values)):
+            yield from batch
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+
+
+def iter_reports(records, reference_values=None, batch_size=8):
+    """
+    Renders the reports of many results in the shared process pool and yields them in order as they are done.
+
+    Reports that are in the cache are not rendered again. Small exports are rendered in the current
+    process, where starting the pool would take longer than rendering.
+
+    Args:
+        records (list): The results, see `render_report`
+        reference_values (dict, optional): Cell type -> (low, high) reference range in percent.
+            Defaults to the ranges for the age and sex of each result.
+        batch_size (int, optional): Number of reports rendered per task. Defaults to 8.
+
+    Yields:
+        tuple: The record and the bytes of its PDF report
+    """
+    with _lock:
+        cached = [_cache.get(report_key(record, reference_values)) for record in records]
+    missing = [record for record, pdf_bytes in zip(records, cached) if pdf_bytes is None]
+
+    rendered = _iter_rendered(_render_batch, missing, reference_values, batch_size)
+    for record, pdf_bytes in zip(records, cached):
+        yield record, pdf_bytes if pdf_bytes is not None else next(rendered)
+
+
+def export_zip(records, file, reference_values=None, progress=None):
+    """
+    Exports the reports of many results as ZIP archive with one PDF per result.
+
+    Each report is written to the archive as soon as it is rendered, so only the reports that are
+    being rendered are held in memory.
+
+    Args:
+        records (list): The results, see `render_report`
+        file (BinaryIO): Writable file the archive is written to, e.g. a temporary file
+        reference_values (dict, optional): Cell type -> (low, high) reference range in percent.
+            Defaults to the ranges for the age and sex of each result.
+        progress (callable, optional): Called with the number of finished and of all reports
+    """
+    file_names = set()
+    with zipfile.ZipFile(file, "w", zipfile.ZIP_DEFLATED) as archive:
+        for done, (record, pdf_bytes) in enumerate(iter_reports(records, reference_values), start=1):
+            file_name = report_file_name(record)
+            stem, number = file_name[:-4], 2
+            while file_name in file_names:
+                file_name, number = f"{stem}_{number}.pdf", number + 1
+            file_names.add(file_name)
+            archive.writestr(file_name, pdf_bytes)
+            if progress is not None:
+                progress(done, len(records))
+
+
+def export_pdf(records, reference_values=None, progress=None, batch_size=8):
+    """
+    Exports the reports of many results as one PDF document with one page per result.
+
+    The pages are rendered in the shared process pool like the reports of `iter_reports` and
+    inserted into the document in order.
+
+    Args:
+        records (list): The results, see `render_report`
+        reference_values (dict, optional): Cell type -> (low, high) reference range in percent.
+            Defaults to the ranges for the age and sex of each result.
+        progress (callable, optional): Called with the number of finished and of all reports
+        batch_size (int, optional): Number of reports rendered per task. Defaults to 8.
+
+    Returns:
+        bytes: The PDF document
+    """
+    pdf = _ReportPDF()
+    for done, pages in enumerate(_iter_rendered(_render_pages, records, reference_values, batch_size), start=1):
+        for content in pages:
+            pdf.insert_page(content)
+        if progress is not None:
+            progress(done, len(records))
+    return pdf.output(dest='S').encode('latin-1', 'replace')
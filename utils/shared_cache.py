@@ -0,0 +1,76 @@
+import sys, threading
+from collections import OrderedDict
+import pandas as pd
+
+
+class SharedCache:
+    """
+    A size-bounded in-memory cache for values that are shared by all sessions of the process.
+
+    Every value is stored with a version (e.g. modification time or ETag of the file it was loaded
+    from). A lookup with a different version loads the value again, so changed files are picked up.
+    The least recently used values are dropped once the cache exceeds `max_bytes`.
+
+    Cached values are shared, callers must treat them as read-only.
+
+        >>> cache = SharedCache(max_bytes=50 * 1024 * 1024)
+        >>> df = cache.get("data.csv", version, lambda: data_handler.load("data.csv"))
+
+    Attributes:
+        max_bytes (int): Size limit of all cached values
+    """
+
+    def __init__(self, max_bytes):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_bytes (int): Size limit of all cached values
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (version, value, size)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def size_of(value):
+        """
+        Estimates the memory used by a value.
+        """
+        if isinstance(value, (bytes, bytearray)):
+            return len(value)
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return int(value.memory_usage(deep=True).sum())
+        return sys.getsizeof(value)
+
+    def get(self, key, version, load):
+        """
+        Get a value, loading it if it is not cached in this version.
+
+        Args:
+            key: Identifies the value, e.g. the file path
+            version: Version of the value; a cached value with another version is replaced
+            load (callable): Function without arguments that loads the value
+
+        Returns:
+            The cached or newly loaded value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = load()
+        size = self.size_of(value)
+        with self._lock:
+            self._entries[key] = (version, value, size)
+            self._entries.move_to_end(key)
+            total = sum(entry[2] for entry in self._entries.values())
+            while total > self.max_bytes and len(self._entries) > 1:
+                _, (_, _, dropped_size) = self._entries.popitem(last=False)
+                total -= dropped_size
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
@@ -0,0 +1,123 @@
+import threading, time
+from collections import deque
+
+
+class WriteQueue:
+    """
+    A write-behind queue that runs write operations in a background thread.
+
+    Writes are executed one after another in the order they were submitted, so a later write
+    always sees the effect of the earlier ones. Consecutive writes with the same key are
+    coalesced: if the last queued write has the same key, it is replaced by the new one. Writes
+    submitted with `coalesce=False` (e.g. appending a record) are never replaced and never replace
+    another write.
+    Failing writes are retried with exponential backoff; writes that still fail are kept in
+    `errors`. The worker thread is started on demand and exits once the queue is empty.
+
+    A write may consist of several steps (e.g. append a record, then compact). Each step is
+    retried on its own, so a failing later step does not run the earlier, already completed
+    steps again; if a step still fails after all retries, the remaining steps are skipped.
+
+        >>> queue = WriteQueue()
+        >>> queue.submit("data.csv", lambda: data_handler.save("data.csv", df))
+        >>> queue.pending_count
+        1
+        >>> queue.flush(timeout=10)
+        True
+
+    Attributes:
+        max_retries (int): Number of retries of a failing write
+        retry_delay (float): Delay in seconds before the first retry, doubled for every further retry
+        errors (list): (key, exception) tuples of writes that failed after all retries
+    """
+
+    def __init__(self, max_retries=3, retry_delay=0.5):
+        """
+        Initialize an empty write queue.
+
+        Args:
+            max_retries (int, optional): Number of retries of a failing write. Defaults to 3.
+            retry_delay (float, optional): Delay before the first retry in seconds. Defaults to 0.5.
+        """
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.errors = []
+        self._queue = deque()  # [key, write_fn, coalesce] in submit order
+        self._running = 0
+        self._worker = None
+        self._condition = threading.Condition()
+
+    def submit(self, key, write_fn, coalesce=True):
+        """
+        Queue a write operation.
+
+        Args:
+            key (str): Identifies the written target, e.g. the file path
+            write_fn (callable or list): Function without arguments that performs the write,
+                or a list of such functions that are run as consecutive steps
+            coalesce (bool, optional): Replace the last queued write if it has the same key and was submitted
+                with `coalesce=True` as well. Defaults to True.
+        """
+        with self._condition:
+            if coalesce and self._queue and self._queue[-1][0] == key and self._queue[-1][2]:
+                self._queue[-1][1] = write_fn
+            else:
+                self._queue.append([key, write_fn, coalesce])
+
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='WriteQueue', daemon=True)
+                self._worker.start()
+
+    @property
+    def pending_count(self):
+        """
+        Number of writes that are queued or currently running.
+        """
+        with self._condition:
+            return len(self._queue) + self._running
+
+    def flush(self, timeout=None):
+        """
+        Wait until all queued writes are done.
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds. Defaults to None (wait forever).
+
+        Returns:
+            bool: True if all writes are done, False if the timeout expired
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._queue and not self._running, timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._queue:
+                    self._worker = None
+                    self._condition.notify_all()
+                    return
+                key, write_fn, _ = self._queue.popleft()
+                self._running = 1
+
+            self._execute(key, write_fn)
+
+            with self._condition:
+                self._running = 0
+                self._condition.notify_all()
+
+    def _execute(self, key, write_fn):
+        """
+        Runs the steps of a write and retries a failing step with exponential backoff.
+        """
+        steps = write_fn if isinstance(write_fn, (list, tuple)) else [write_fn]
+        for step in steps:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    step()
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        with self._condition:
+                            self.errors.append((key, e))
+                        return
+                    time.sleep(self.retry_delay * 2 ** attempt)